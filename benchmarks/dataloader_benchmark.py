@@ -0,0 +1,231 @@
+"""
+Throughput benchmark of the data loading path.
+
+Builds a synthetic dataset in the format of `ExampleDataset` on disk and measures `ExampleDataset.get()`,
+`Dataloader.combine_batch()`, `Dataloader` and `PreprocessedDataloader` over a sweep of `batch_size` and `num_works`.
+The report is printed (or written) as JSON so that runs of different releases or loader modes can be compared.
+Every case runs in a fresh process, since the peak memory is a high-water mark of the whole process.
+
+Usage (from the root of the repository):
+    python -m benchmarks.dataloader_benchmark --num-items 2048 --shape 3,32,32 --batch-sizes 16,64 --num-works 1,2,4
+"""
+from gc import collect as _collect
+from os import mkdir as _mkdir
+from time import perf_counter as _perf_counter
+from json import dumps as _dumps
+from platform import platform as _platform
+from tempfile import mkdtemp as _mkdtemp
+from shutil import rmtree as _rmtree
+from argparse import ArgumentParser as _ArgumentParser
+from resource import getrusage as _getrusage, RUSAGE_SELF as _RUSAGE_SELF, RUSAGE_CHILDREN as _RUSAGE_CHILDREN
+from multiprocessing import get_context as _get_context
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from typing import Callable, Union
+
+import numpy as _np
+import torch as _torch
+
+from papercandy import network as _network, dataloader as _dataloader, version as _version
+
+
+class FlipPreprocessedDataloader(_dataloader.PreprocessedDataloader):
+    """
+    Doubles the dataset with a mirrored copy of each item.
+    """
+    def preprocess(self, original_data: _network.DataCompound) -> list[_network.DataCompound]:
+        return [original_data, _network.DataCompound(original_data.data, original_data.target.flip(-1))]
+
+
+def make_dataset(root: str, num_items: int, shape: tuple[int, ...], seed: int = 0) -> str:
+    """
+    Write a synthetic dataset in the format of `ExampleDataset`.
+    :param root: the parent directory
+    :param num_items: the number of items
+    :param shape: the shape of each target
+    :param seed: the random seed
+    :return: the dataset directory
+    """
+    src = f"{root}/data"
+    _mkdir(src)
+    rng = _np.random.default_rng(seed)
+    for i in range(1, num_items + 1):
+        with open(f"{src}/{i}.txt", "w") as f:
+            f.write(repr(rng.random(shape).round(4).tolist()))
+    return src
+
+
+def peak_rss() -> dict:
+    """
+    :return: the peak resident set sizes so far in KiB (Linux), including what the process inherited when forked
+    """
+    return {
+        "self_kib": _getrusage(_RUSAGE_SELF).ru_maxrss,
+        "children_kib": _getrusage(_RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def _measure(fn: Callable[..., dict], *args) -> dict:
+    before = _getrusage(_RUSAGE_SELF).ru_maxrss
+    result = fn(*args)
+    # the high-water mark survives fork and exec, so the growth is what the case itself takes
+    result["peak_rss"]["self_before_kib"] = before
+    result["peak_rss"]["self_growth_kib"] = result["peak_rss"]["self_kib"] - before
+    # release the semaphores of the stopped workers before the process exits
+    _collect()
+    return result
+
+
+def run_case(fn: Callable[..., dict], *args) -> dict:
+    """
+    Run a case in a fresh process, so that its peak memory isn't that of an earlier case.
+    :param fn: the benchmark function
+    :param args: the arguments
+    :return: the summary
+    """
+    with _ProcessPoolExecutor(1, mp_context=_get_context("spawn")) as executor:
+        return executor.submit(_measure, fn, *args).result()
+
+
+def summarize(latencies: list[float], num_samples: int, total: float) -> dict:
+    """
+    :param latencies: the latency of each call in seconds
+    :param num_samples: the number of samples loaded
+    :param total: the total time in seconds
+    :return: throughput, latency percentiles in milliseconds and peak memory
+    """
+    ms = _np.asarray(latencies) * 1000
+    return {
+        "samples_per_sec": num_samples / total if total > 0 else None,
+        "num_samples": num_samples,
+        "total_sec": total,
+        "latency_ms": {
+            "mean": float(ms.mean()),
+            "p50": float(_np.percentile(ms, 50)),
+            "p90": float(_np.percentile(ms, 90)),
+            "p99": float(_np.percentile(ms, 99)),
+            "max": float(ms.max()),
+        },
+        "peak_rss": peak_rss(),
+    }
+
+
+def time_calls(call: Callable[[], int], num_calls: int) -> dict:
+    """
+    :param call: a function that returns the number of samples it loaded
+    :param num_calls: the number of calls
+    :return: the summary
+    """
+    latencies = []
+    num_samples = 0
+    start = _perf_counter()
+    for _ in range(num_calls):
+        t = _perf_counter()
+        num_samples += call()
+        latencies.append(_perf_counter() - t)
+    return summarize(latencies, num_samples, _perf_counter() - start)
+
+
+def time_iteration(dataloader: _dataloader.Dataloader, num_batches: int) -> dict:
+    """
+    :param dataloader: the dataloader
+    :param num_batches: the maximum number of batches
+    :return: the summary
+    """
+    latencies = []
+    num_samples = 0
+    iterator = iter(dataloader)
+    start = _perf_counter()
+    for _ in range(num_batches):
+        t = _perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            break
+        latencies.append(_perf_counter() - t)
+        num_samples += len(batch.data)
+    return summarize(latencies, num_samples, _perf_counter() - start)
+
+
+def bench_example_dataset(dataset: _dataloader.ExampleDataset, num_items: int) -> dict:
+    indices = iter(range(num_items))
+
+    def call() -> int:
+        dataset.get(next(indices))
+        return 1
+    return time_calls(call, num_items)
+
+
+def bench_combine_batch(dataset: _dataloader.ExampleDataset, batch_size: int, repeats: int) -> dict:
+    items = [dataset.get(i % len(dataset)) for i in range(batch_size)]
+    return time_calls(lambda: len(_dataloader.Dataloader.combine_batch(items).data), repeats)
+
+
+def bench_dataloader(cls: type, dataset: _dataloader.ExampleDataset, batch_size: int, num_works: int,
+                     num_batches: int) -> dict:
+    with cls(dataset, batch_size=batch_size, num_works=num_works) as dataloader:
+        # the first batch starts the workers
+        next(iter(dataloader))
+        return time_iteration(dataloader, num_batches)
+
+
+def run(num_items: int, shape: tuple[int, ...], batch_sizes: list[int], num_works_list: list[int], modes: list[str],
+        num_batches: int, repeats: int, root: Union[str, None] = None) -> dict:
+    tmp = _mkdtemp() if root is None else root
+    try:
+        dataset = _dataloader.ExampleDataset(make_dataset(tmp, num_items, shape))
+        results = []
+        if "example_dataset" in modes:
+            results.append({"mode": "example_dataset", **run_case(bench_example_dataset, dataset, num_items)})
+        for batch_size in batch_sizes:
+            if batch_size > num_items:
+                continue
+            if "combine_batch" in modes:
+                results.append({"mode": "combine_batch", "batch_size": batch_size,
+                                **run_case(bench_combine_batch, dataset, batch_size, repeats)})
+            for num_works in num_works_list:
+                if num_works > batch_size:
+                    continue
+                for mode, cls in (("dataloader", _dataloader.Dataloader),
+                                  ("preprocessed_dataloader", FlipPreprocessedDataloader)):
+                    if mode in modes:
+                        results.append({"mode": mode, "batch_size": batch_size, "num_works": num_works,
+                                        **run_case(bench_dataloader, cls, dataset, batch_size, num_works,
+                                                   num_batches)})
+        return {
+            "version": _version.__version__,
+            "torch": _torch.__version__,
+            "platform": _platform(),
+            "num_items": num_items,
+            "shape": list(shape),
+            "results": results,
+        }
+    finally:
+        if root is None:
+            _rmtree(tmp)
+
+
+def main():
+    parser = _ArgumentParser(description="Benchmark the data loading path of PaperCandy.")
+    parser.add_argument("--num-items", type=int, default=1024, help="the number of items in the synthetic dataset")
+    parser.add_argument("--shape", default="16", help="the shape of each item, such as 3,32,32")
+    parser.add_argument("--batch-sizes", default="1,16,64", help="comma-separated batch sizes")
+    parser.add_argument("--num-works", default="1,2,4", help="comma-separated numbers of processes")
+    parser.add_argument("--modes", default="example_dataset,combine_batch,dataloader,preprocessed_dataloader",
+                        help="comma-separated modes to run")
+    parser.add_argument("--num-batches", type=int, default=64, help="the maximum number of batches per case")
+    parser.add_argument("--repeats", type=int, default=64, help="the number of calls to `combine_batch()` per case")
+    parser.add_argument("--root", default=None, help="where to write the dataset, a temporary directory by default")
+    parser.add_argument("--output", default=None, help="the JSON file to write, stdout by default")
+    args = parser.parse_args()
+    report = run(args.num_items, tuple(int(x) for x in args.shape.split(",")),
+                 [int(x) for x in args.batch_sizes.split(",")], [int(x) for x in args.num_works.split(",")],
+                 args.modes.split(","), args.num_batches, args.repeats, args.root)
+    if args.output is None:
+        print(_dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            f.write(_dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 from papercandy.test import *
+from papercandy.metrics import *
 from papercandy.train import *
+from papercandy.analytics import *
+from papercandy.checkpoint import *
+from papercandy.distributed import *
 from papercandy.config import *
 from papercandy.drawing import *
 from papercandy.network import *
+from papercandy.sampler import *
 from papercandy.version import *
 from papercandy.dataloader import *
 
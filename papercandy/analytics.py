@@ -0,0 +1,3 @@
+from papercandy.core import analytics as _analytics
+
+LossTracker = _analytics.LossTracker
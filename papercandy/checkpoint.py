@@ -0,0 +1,20 @@
+from os import PathLike
+from typing import Union
+from torch import save as _save, load as _load
+
+from papercandy.core import checkpoint as _checkpoint
+
+CheckpointMonitor = _checkpoint.CheckpointMonitor
+
+
+def load_checkpoint(filename: Union[str, PathLike]) -> dict:
+    # the loss history is a numpy array, which the restricted unpickler refuses
+    return _load(filename, map_location="cpu", weights_only=False)
+
+
+class CheckpointManager(_checkpoint.CheckpointManager):
+    def dump(self, state: dict, filename: Union[str, PathLike]):
+        _save(state, filename)
+
+    def load(self, filename: Union[str, PathLike]) -> dict:
+        return load_checkpoint(filename)
@@ -5,8 +5,11 @@ from torch.cuda import is_available as _is_available
 from papercandy.core import config as _config
 
 Config = _config.Config
+ConfigSnapshot = _config.ConfigSnapshot
 Bool = _config.Bool
 CONFIG = _config.CONFIG
+declare = _config.declare
+current_snapshot = _config.current_snapshot
 
 
 def new_config(filename: Union[str, PathLike]) -> Config:
@@ -0,0 +1,250 @@
+import numpy as _np
+from math import sqrt as _sqrt, inf as _inf
+from typing import Union, Iterable
+from typing_extensions import Self
+
+
+def as_array(losses: Union[Iterable[float], _np.ndarray]) -> _np.ndarray:
+    """
+    :param losses: losses, such as a list or a `LossHistory`
+    :return: the losses as a float64 array
+    """
+    if isinstance(losses, _np.ndarray):
+        return losses.astype(_np.float64, copy=False)
+    to_numpy = getattr(losses, "to_numpy", None)
+    if to_numpy is not None:
+        return to_numpy()
+    return _np.fromiter(losses, dtype=_np.float64)
+
+
+def vibration(losses: Union[Iterable[float], _np.ndarray]) -> bool:
+    """
+    Halve the series by averaging adjacent pairs until it's strictly decreasing (no vibration) or only 2 are left,
+        in which case it vibrates if the second is bigger.
+    :param losses: losses
+    :return: whether the losses go up at some scale
+    """
+    losses = as_array(losses)
+    while len(losses) > 2:
+        if (losses[1:] < losses[:-1]).all():
+            return False
+        if len(losses) % 2 == 1:
+            # the last one is paired with itself
+            losses = _np.append(losses, losses[-1])
+        losses = losses.reshape(-1, 2).mean(axis=1)
+    return len(losses) == 2 and bool(losses[1] > losses[0])
+
+
+def ema(losses: Union[Iterable[float], _np.ndarray], decay: float = 0.99) -> _np.ndarray:
+    """
+    :param losses: losses
+    :param decay: the weight of the previous average
+    :return: the exponential moving average at each step, starting from the first loss
+    """
+    if not 0 <= decay < 1:
+        raise ValueError("`decay` must be in [0, 1).")
+    losses = as_array(losses)
+    if decay == 0 or len(losses) == 0:
+        return losses.copy()
+    out = _np.empty_like(losses)
+    # computed in chunks so that dividing by the powers of `decay` doesn't lose precision
+    chunk = max(1, int(-10 / _np.log(decay)))
+    previous = losses[0]
+    for start in range(0, len(losses), chunk):
+        x = losses[start: start + chunk]
+        powers = decay ** _np.arange(1, len(x) + 1)
+        # avg[i] = decay^(i+1) * previous + (1 - decay) * sum_j<=i decay^(i-j) * x[j]
+        out[start: start + len(x)] = powers * previous + (1 - decay) * powers * _np.cumsum(x / powers)
+        previous = out[start + len(x) - 1]
+    return out
+
+
+def slope(losses: Union[Iterable[float], _np.ndarray]) -> float:
+    """
+    :param losses: losses
+    :return: the least-squares slope of the losses over the steps, 0 for fewer than 2 losses
+    """
+    losses = as_array(losses)
+    n = len(losses)
+    if n < 2:
+        return 0
+    x = _np.arange(n, dtype=_np.float64)
+    x -= x.mean()
+    return float((x * (losses - losses.mean())).sum() / (x * x).sum())
+
+
+def downsample(losses: Union[Iterable[float], _np.ndarray], num_points: int) -> tuple[_np.ndarray, _np.ndarray]:
+    """
+    Reduce the losses to at most `num_points` by averaging consecutive groups of about the same size, such as for
+        drawing millions of steps.
+    :param losses: losses
+    :param num_points: the maximum number of points
+    :return: the center step and the average loss of each group
+    """
+    if num_points < 1:
+        raise ValueError("`num_points` must be at least 1.")
+    losses = as_array(losses)
+    n = len(losses)
+    if n <= num_points:
+        return _np.arange(n, dtype=_np.float64), losses.copy()
+    starts = (_np.arange(num_points, dtype=_np.int64) * n) // num_points
+    sizes = _np.diff(_np.append(starts, n))
+    return starts + (sizes - 1) / 2, _np.add.reduceat(losses, starts) / sizes
+
+
+def stride(n: int, num_kept: int) -> _np.ndarray:
+    """
+    :param n: the number of items
+    :param num_kept: the number of items to keep
+    :return: the indexes of `num_kept` items spread evenly, including the first and the last
+    """
+    if num_kept <= 0:
+        return _np.empty(0, dtype=_np.int64)
+    if num_kept == 1:
+        return _np.zeros(1, dtype=_np.int64)
+    return _np.round(_np.linspace(0, n - 1, min(num_kept, n))).astype(_np.int64)
+
+
+class LossTracker(object):
+    """
+    Streaming statistics of the losses, each update costing O(1) time and memory regardless of the number of steps:
+        the count, min, max, mean and variance (Welford's algorithm), an exponential moving average and the trend
+        (least-squares slope) over a sliding window of the latest losses.
+    Call `update()` from a monitor on every step, or `extend()` with the losses of `on_losses_synchronized()`.
+    """
+    def __init__(self, decay: float = 0.99, window: int = 100):
+        """
+        :param decay: the weight of the previous average in the EMA
+        :param window: the number of latest losses the trend is calculated over
+        """
+        if not 0 <= decay < 1:
+            raise ValueError("`decay` must be in [0, 1).")
+        if window < 2:
+            raise ValueError("`window` must be at least 2.")
+        self._decay: float = decay
+        self.count: int = 0
+        self.min: float = _inf
+        self.max: float = -_inf
+        self.mean: float = 0
+        # the sum of squared differences from the mean
+        self._m2: float = 0
+        self.ema: Union[float, None] = None
+        self._window: _np.ndarray = _np.zeros(window, dtype=_np.float64)
+        self._window_len: int = 0
+        # the position of the oldest loss in the window
+        self._window_start: int = 0
+        # sum(y) and sum(x * y) over the window with x counted from the oldest
+        self._sum_y: float = 0
+        self._sum_xy: float = 0
+        self._num_slides: int = 0
+
+    def update(self, loss: float) -> Self:
+        loss = float(loss)
+        self.count += 1
+        if loss < self.min:
+            self.min = loss
+        if loss > self.max:
+            self.max = loss
+        delta = loss - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (loss - self.mean)
+        self.ema = loss if self.ema is None else self._decay * self.ema + (1 - self._decay) * loss
+        self._slide(loss)
+        return self
+
+    def _slide(self, loss: float):
+        size = len(self._window)
+        if self._window_len < size:
+            self._window[(self._window_start + self._window_len) % size] = loss
+            self._sum_xy += self._window_len * loss
+            self._sum_y += loss
+            self._window_len += 1
+            return
+        oldest = self._window[self._window_start]
+        self._window[self._window_start] = loss
+        self._window_start = (self._window_start + 1) % size
+        # every loss moves one step closer to the oldest
+        self._sum_xy += (size - 1) * loss - self._sum_y + oldest
+        self._sum_y += loss - oldest
+        self._num_slides += 1
+        if self._num_slides % size == 0:
+            # recalculate once in a while so that the rounding errors don't pile up
+            y = self._ordered_window()
+            self._sum_y = float(y.sum())
+            self._sum_xy = float((_np.arange(size) * y).sum())
+
+    def _ordered_window(self) -> _np.ndarray:
+        return _np.roll(self._window, -self._window_start)[:self._window_len]
+
+    def extend(self, losses: Union[Iterable[float], _np.ndarray]) -> Self:
+        """
+        Update with many losses at once, which is vectorized except for the window.
+        :param losses: losses
+        :return: self
+        """
+        losses = as_array(losses)
+        n = len(losses)
+        if n == 0:
+            return self
+        # merge the statistics of the two parts (Chan et al.)
+        mean = float(losses.mean())
+        m2 = float(((losses - mean) ** 2).sum())
+        count = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / count
+        self._m2 += m2 + delta * delta * self.count * n / count
+        self.count = count
+        self.min = min(self.min, float(losses.min()))
+        self.max = max(self.max, float(losses.max()))
+        if self.ema is None:
+            self.ema = float(losses[0])
+            losses_for_ema = losses[1:]
+        else:
+            losses_for_ema = losses
+        if len(losses_for_ema) > 0:
+            weights = self._decay ** _np.arange(len(losses_for_ema) - 1, -1, -1, dtype=_np.float64)
+            self.ema = float(self._decay ** len(losses_for_ema) * self.ema +
+                             (1 - self._decay) * (weights * losses_for_ema).sum())
+        for loss in losses[-len(self._window):].tolist():
+            self._slide(loss)
+        return self
+
+    def variance(self) -> float:
+        return self._m2 / self.count if self.count > 0 else 0
+
+    def std(self) -> float:
+        return _sqrt(self.variance())
+
+    def slope(self) -> float:
+        """
+        :return: the least-squares slope of the latest losses in the window, negative while the loss is going down
+        """
+        n = self._window_len
+        if n < 2:
+            return 0
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self._sum_xy - sum_x * self._sum_y) / (n * sum_xx - sum_x * sum_x)
+
+    def trend(self, tolerance: float = 1e-3) -> str:
+        """
+        :param tolerance: the relative change over the window under which the loss is considered flat
+        :return: "decreasing", "increasing" or "flat"
+        """
+        change = self.slope() * max(self._window_len - 1, 1)
+        scale = max(abs(self.ema), 1e-12) if self.ema is not None else 1
+        if abs(change) <= tolerance * scale:
+            return "flat"
+        return "decreasing" if change < 0 else "increasing"
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "min_loss": self.min if self.count > 0 else None,
+            "max_loss": self.max if self.count > 0 else None,
+            "average_loss": self.mean if self.count > 0 else None,
+            "std": self.std(),
+            "ema": self.ema,
+            "slope": self.slope(),
+            "trend": self.trend(),
+        }
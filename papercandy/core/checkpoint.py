@@ -0,0 +1,162 @@
+from os import PathLike, getpid as _getpid, makedirs as _makedirs, replace as _replace, remove as _remove, \
+    listdir as _listdir
+from os.path import join as _join
+from typing import Union
+from typing_extensions import Self
+from abc import abstractmethod, ABCMeta
+from collections import deque as _deque
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor, Future as _Future
+
+from papercandy.core import train as _train
+
+
+class CheckpointManager(object, metaclass=ABCMeta):
+    """
+    Write the states of a trainer as checkpoints in the background and keep only the latest ones.
+    The state is copied on the calling thread, so the training can go on while it's being serialized. Checkpoints
+        are written one after another by a single thread, each into a temporary file renamed into place at last,
+        so a checkpoint file is either complete or absent.
+    """
+    def __init__(self, directory: Union[str, PathLike], keep_last: int = 3, max_pending: int = 1,
+                 prefix: str = "checkpoint"):
+        """
+        :param directory: where to put the checkpoints
+        :param keep_last: the number of latest checkpoints to keep, 0 for all
+        :param max_pending: the maximum number of checkpoints waiting to be written, beyond which `save()` waits for
+            the oldest, since each of them holds a copy of the state in memory
+        :param prefix: the prefix of the filenames
+        """
+        if keep_last < 0:
+            raise ValueError("`keep_last` cannot be negative.")
+        if max_pending < 1:
+            raise ValueError("`max_pending` must be at least 1.")
+        _makedirs(directory, exist_ok=True)
+        self._directory: Union[str, PathLike] = directory
+        self._keep_last: int = keep_last
+        self._max_pending: int = max_pending
+        self._prefix: str = prefix
+        self._executor: _ThreadPoolExecutor = _ThreadPoolExecutor(1)
+        self._pending: _deque[_Future] = _deque()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_directory(self) -> Union[str, PathLike]:
+        return self._directory
+
+    def filename(self, epoch: int) -> str:
+        """
+        :param epoch: global epoch of the trainer
+        :return: the path of the checkpoint
+        """
+        # zero-padded so that the names sort by epoch
+        return _join(self._directory, f"{self._prefix}-{epoch:012d}.ckpt")
+
+    def list(self) -> list[str]:
+        """
+        :return: the paths of the complete checkpoints from the oldest to the latest
+        """
+        return [_join(self._directory, name) for name in sorted(_listdir(self._directory))
+                if name.startswith(f"{self._prefix}-") and name.endswith(".ckpt")]
+
+    def latest(self) -> Union[str, None]:
+        """
+        :return: the path of the latest complete checkpoint or None if there isn't any
+        """
+        checkpoints = self.list()
+        return checkpoints[-1] if len(checkpoints) > 0 else None
+
+    def _reap(self, block: bool):
+        while len(self._pending) > 0 and (block or self._pending[0].done()):
+            # raise the errors of the background writes
+            self._pending.popleft().result()
+
+    def save(self, trainer: _train.Trainer, block: bool = False) -> _Future:
+        """
+        Take a checkpoint of the trainer.
+        :param trainer: the trainer
+        :param block: whether to wait until the checkpoint is written
+        :return: a future of the path of the checkpoint
+        """
+        self._reap(False)
+        while len(self._pending) >= self._max_pending:
+            self._pending.popleft().result()
+        state = trainer.state()
+        future = self._executor.submit(self._write, state, self.filename(state["epoch"]))
+        self._pending.append(future)
+        if block:
+            self._reap(True)
+        return future
+
+    def _write(self, state: dict, filename: str) -> str:
+        tmp_filename = f"{filename}.{_getpid()}.tmp"
+        self.dump(state, tmp_filename)
+        _replace(tmp_filename, filename)
+        if self._keep_last > 0:
+            for old in self.list()[:-self._keep_last]:
+                _remove(old)
+        return filename
+
+    def wait(self):
+        """
+        Wait until all the pending checkpoints are written.
+        """
+        self._reap(True)
+
+    def close(self):
+        """
+        Write the pending checkpoints and stop the background thread.
+        """
+        try:
+            self._reap(True)
+        finally:
+            self._executor.shutdown()
+
+    @abstractmethod
+    def dump(self, state: dict, filename: Union[str, PathLike]):
+        """
+        Serialize a state.
+        :param state: the state of a trainer
+        :param filename: filename
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, filename: Union[str, PathLike]) -> dict:
+        """
+        Deserialize a state.
+        :param filename: filename
+        :return: the state of a trainer
+        """
+        raise NotImplementedError
+
+
+class CheckpointMonitor(_train.TrainingMonitor):
+    """
+    Take a checkpoint every `interval` optimizer steps and another one when the training finishes. Checkpoints are
+        only taken right after optimizer steps, when there are no accumulated gradients to lose.
+    """
+    def __init__(self, manager: CheckpointManager, interval: int = 1000):
+        if interval < 1:
+            raise ValueError("`interval` must be at least 1.")
+        self._manager: CheckpointManager = manager
+        self._interval: int = interval
+        self._last_epoch: Union[int, None] = None
+
+    def get_manager(self) -> CheckpointManager:
+        return self._manager
+
+    def on_optimizer_step(self, trainer: _train.Trainer, epoch: int, step: int):
+        if step % self._interval == 0:
+            self._manager.save(trainer)
+            self._last_epoch = trainer.get_epoch()
+
+    def on_finished(self, trainer: _train.Trainer, epoch: int):
+        if self._last_epoch != trainer.get_epoch():
+            self._manager.save(trainer)
+            self._last_epoch = trainer.get_epoch()
+        self._manager.wait()
+
@@ -1,5 +1,5 @@
 from os import PathLike
-from typing import Union, Any
+from typing import Union, Any, Callable
 from typing_extensions import Self
 
 
@@ -14,11 +14,56 @@ _required_configs: dict = {
     "gpu_acceleration": ("False", Bool),
     "device": ("0", int),
 }
+_schema_version: int = 0
+
+
+def declare(key: str, default_val: str, required_type: Callable[[str], Any] = str):
+    """
+    Declare a predefined configuration, which is then filled by `Config.check_required_configs()` and parsed into
+        every snapshot.
+    :param key: the key, which must be an identifier
+    :param default_val: the default value as it would be written in the configuration file
+    :param required_type: the type (or an alternative method such as `Bool`) that converts the value
+    """
+    global _schema_version
+    if not key.isidentifier():
+        raise ValueError(f"\"{key}\" is not an identifier.")
+    _required_configs[key] = (default_val, required_type)
+    _schema_version += 1
+
+
+class ConfigSnapshot(object):
+    """
+    A frozen copy of a configuration in which every predefined value has already been converted to its required type,
+        so that reading it on the hot path is a plain attribute access.
+    """
+    def __init__(self, values: dict):
+        self.__dict__.update(values)
+
+    def __setattr__(self, key: str, value: Any):
+        raise AttributeError("ConfigSnapshot is frozen.")
+
+    def __delattr__(self, key: str):
+        raise AttributeError("ConfigSnapshot is frozen.")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__dict__
+
+    def __repr__(self) -> str:
+        return f"ConfigSnapshot({self.__dict__})"
+
+    def get(self, key: str, default_val: Any = None) -> Any:
+        return self.__dict__.get(key, default_val)
+
+    def to_dict(self) -> dict:
+        return self.__dict__.copy()
 
 
 class Config(object):
     def __init__(self):
         self._config: dict = {}
+        self._snapshot: Union[ConfigSnapshot, None] = None
+        self._snapshot_version: int = -1
 
     def __contains__(self, key: str) -> bool:
         return key in self._config.keys()
@@ -28,6 +73,7 @@ class Config(object):
             raise KeyError(f"{key} is used.")
         setattr(self, key, value)
         self._config[key] = value
+        self._snapshot = None
 
     def check_required_configs(self, must_exist: bool = False) -> Self:
         """
@@ -107,6 +153,21 @@ class Config(object):
             required_type = _required_configs[key][1]
         return self.get(key, True, required_type)
 
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        Parse all the predefined configurations once. The snapshot is cached until the configuration is changed by
+            `set()` or a new key is declared, so calling this repeatedly is cheap.
+        NOTICE: Missing predefined configurations take their default values.
+        :return: the snapshot
+        """
+        if self._snapshot is None or self._snapshot_version != _schema_version:
+            values = self._config.copy()
+            for key, (default_val, required_type) in _required_configs.items():
+                val = self._config.get(key, default_val)
+                values[key] = val if required_type == str else required_type(val)
+            self._snapshot, self._snapshot_version = ConfigSnapshot(values), _schema_version
+        return self._snapshot
+
 
 def new_config(filename: Union[str, PathLike]) -> Config:
     return Config().load(filename).check_required_configs()
@@ -117,3 +178,10 @@ class CONFIG(object):
     def __init__(self):
         self.DEFAULT: Config = Config().loads([""]).check_required_configs()
         self.CURRENT: Config = Config().loads([""]).check_required_configs()
+
+
+def current_snapshot() -> ConfigSnapshot:
+    """
+    :return: the snapshot of the current configuration
+    """
+    return CONFIG().CURRENT.snapshot()
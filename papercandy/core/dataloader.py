@@ -1,11 +1,23 @@
+import numpy as _np
+import asyncio as _asyncio
+from uuid import uuid4 as _uuid4
+from time import sleep as _sleep
+from sys import maxsize as _maxsize
+from random import seed as _seed
 from copy import copy as _copy
 from math import ceil as _ceil
+from os import getpid as _getpid, makedirs as _makedirs, replace as _replace, PathLike
+from os.path import join as _join, exists as _exists
 from typing_extensions import Self
-from typing import Iterator, Union, Any
+from typing import Iterator, Union, Any, Sequence, Callable
 from abc import abstractmethod, ABCMeta
 from multiprocessing import Pool as _Pool
+from collections import deque as _deque, OrderedDict as _OrderedDict
+from threading import Lock as _Lock, Thread as _Thread, get_ident as _get_ident
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor, Future as _Future
+from weakref import WeakValueDictionary as _WeakValueDictionary
 
-from papercandy.core import network as _network
+from papercandy.core import network as _network, sampler as _sampler
 from papercandy.core.optional_modules import _coota, coota_is_available as _coota_is_available
 
 
@@ -47,12 +59,492 @@ class Dataset(object, metaclass=ABCMeta):
         """
         raise NotImplementedError
 
+    async def aget(self, i: int) -> _network.DataCompound:
+        """
+        Get a certain item asynchronously. Override this for I/O-bound datasets. By default, `get()` runs in the
+            default executor of the event loop.
+        :param i: the index of the item
+        :return: a data compound of the item
+        """
+        return await _asyncio.get_running_loop().run_in_executor(None, self.get, i)
+
     def __getitem__(self, item: Union[int, slice]) -> Union[_network.DataCompound, Self]:
         if isinstance(item, int):
             return self.get(item)
         if isinstance(item, slice):
             return self.cut(item)
 
+    def __add__(self, other: Any) -> "ConcatDataset":
+        if not isinstance(other, Dataset):
+            raise TypeError("Dataset can only be added to another Dataset.")
+        return ConcatDataset(self, other)
+
+    def subset(self, indices: Union[Sequence[int], _np.ndarray]) -> "DatasetView":
+        """
+        :param indices: item indexes
+        :return: a view of the items at the indexes
+        """
+        return DatasetView(self, _np.asarray(indices, dtype=_np.int64))
+
+    def shard(self, rank: int, world_size: int) -> "DatasetView":
+        """
+        :param rank: the shard number
+        :param world_size: the number of shards
+        :return: a view of every `world_size`-th item starting from `rank`
+        """
+        if not 0 <= rank < world_size:
+            raise ValueError("`rank` must be in [0, `world_size`).")
+        return DatasetView(self, range(rank, len(self), world_size))
+
+    def split(self, *lengths: Union[int, float]) -> list["DatasetView"]:
+        """
+        Split the dataset into consecutive views, such as train, validation and test sets.
+        :param lengths: int for the number of items, float for a ratio
+        :return: a list of views
+        """
+        views = []
+        start = 0
+        for length in lengths:
+            stop = start + (length if isinstance(length, int) else round(length * len(self)))
+            if stop > len(self):
+                raise ValueError("`lengths` add up to more than the length of the dataset.")
+            views.append(DatasetView(self, range(start, stop)))
+            start = stop
+        return views
+
+
+def _compose(outer: Union[range, _np.ndarray], inner: Union[range, _np.ndarray]) -> Union[range, _np.ndarray]:
+    """
+    :param outer: the index mapping of the base view
+    :param inner: the index mapping applied on top of it
+    :return: `outer[inner]` without materializing the ranges
+    """
+    if isinstance(outer, range):
+        if isinstance(inner, range):
+            return range(outer.start + inner.start * outer.step, outer.start + inner.stop * outer.step,
+                         outer.step * inner.step)
+        # like indexing an array, negative indexes count from the end
+        inner = _np.where(inner < 0, inner + len(outer), inner)
+        if len(inner) > 0 and (inner.min() < 0 or inner.max() >= len(outer)):
+            raise IndexError("Index out of range.")
+        return outer.start + inner * outer.step
+    if isinstance(inner, range):
+        # a slice of an array is a view
+        return outer[inner.start: None if inner.stop < 0 else inner.stop: inner.step]
+    return outer[inner]
+
+
+class DatasetView(Dataset):
+    """
+    A lazy view of another dataset through an index mapping. Views of views compose the mappings, which are ranges
+        whenever possible, so cutting or sharding a dataset takes O(1) time and memory and touches no data.
+    """
+    def __init__(self, dataset: Dataset, indices: Union[range, _np.ndarray, None] = None):
+        """
+        :param dataset: the dataset to view
+        :param indices: item indexes of the dataset, None for all the items
+        """
+        if indices is None:
+            indices = range(len(dataset))
+        if isinstance(dataset, DatasetView):
+            indices = _compose(dataset._indices, indices)
+            dataset = dataset.dataset
+        self.dataset: Dataset = dataset
+        self._indices: Union[range, _np.ndarray] = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def get_indices(self) -> Union[range, _np.ndarray]:
+        return self._indices
+
+    def cut(self, i: slice) -> Self:
+        return DatasetView(self.dataset, self._indices[i])
+
+    def get(self, i: int) -> _network.DataCompound:
+        return self.dataset.get(int(self._indices[i]))
+
+    async def aget(self, i: int) -> _network.DataCompound:
+        return await self.dataset.aget(int(self._indices[i]))
+
+
+class ConcatDataset(Dataset):
+    def __init__(self, *datasets: Dataset):
+        if len(datasets) < 1:
+            raise ValueError("There must be at least one dataset.")
+        self.datasets: tuple[Dataset, ...] = datasets
+        # the index after the last item of each dataset
+        self._ends: _np.ndarray = _np.cumsum([len(dataset) for dataset in datasets])
+
+    def __len__(self) -> int:
+        return int(self._ends[-1])
+
+    def _locate(self, i: int) -> tuple[Dataset, int]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Index out of range.")
+        k = int(_np.searchsorted(self._ends, i, side="right"))
+        return self.datasets[k], i - (int(self._ends[k - 1]) if k > 0 else 0)
+
+    def cut(self, i: slice) -> Self:
+        return DatasetView(self, range(len(self))[i])
+
+    def get(self, i: int) -> _network.DataCompound:
+        dataset, i = self._locate(i)
+        return dataset.get(i)
+
+    async def aget(self, i: int) -> _network.DataCompound:
+        dataset, i = self._locate(i)
+        return await dataset.aget(i)
+
+
+class LatencyDataset(Dataset):
+    """
+    A local stand-in for datasets on slow storage, which adds a fixed latency to every read of another dataset.
+    """
+    def __init__(self, dataset: Dataset, latency: float):
+        """
+        :param dataset: the dataset to read
+        :param latency: the latency of each read in seconds
+        """
+        self.dataset: Dataset = dataset
+        self._latency: float = latency
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def cut(self, i: slice) -> Self:
+        return LatencyDataset(self.dataset.cut(i), self._latency)
+
+    def get(self, i: int) -> _network.DataCompound:
+        _sleep(self._latency)
+        return self.dataset.get(i)
+
+    async def aget(self, i: int) -> _network.DataCompound:
+        await _asyncio.sleep(self._latency)
+        return self.dataset.get(i)
+
+
+class _MemoryTier(object):
+    """
+    An LRU cache bounded by bytes. There is one for each cached dataset in each process.
+    """
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.size: int = 0
+        self.items: _OrderedDict[int, tuple[_network.DataCompound, int]] = _OrderedDict()
+        self.lock: _Lock = _Lock()
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    def get(self, i: int) -> Union[_network.DataCompound, None]:
+        with self.lock:
+            if i not in self.items:
+                return None
+            self.items.move_to_end(i)
+            self.hits += 1
+            return self.items[i][0]
+
+    def put(self, i: int, item: _network.DataCompound, size: int):
+        if size > self.capacity:
+            return
+        with self.lock:
+            if i in self.items:
+                self.size -= self.items.pop(i)[1]
+            self.items[i] = (item, size)
+            self.size += size
+            while self.size > self.capacity:
+                self.size -= self.items.popitem(last=False)[1][1]
+
+
+# the memory tiers in the processes that created the datasets, each held by its datasets and released with them
+_memory_tiers: _WeakValueDictionary[str, _MemoryTier] = _WeakValueDictionary()
+# the memory tiers in worker processes, which receive a new copy of the dataset for every batch, so they're kept until
+#   the workers exit
+_worker_memory_tiers: dict[str, _MemoryTier] = {}
+_memory_tiers_lock: _Lock = _Lock()
+
+
+class CachedDataset(Dataset, metaclass=ABCMeta):
+    """
+    Cache the items of another dataset in an in-memory LRU tier bounded by bytes, and optionally spill them to an
+        on-disk tier keyed by the identity of the dataset and the index.
+    The memory tier lives in each process separately, so every worker process keeps its own tier (and counters)
+        across batches. The disk tier is shared by all the processes and written with atomic renames.
+    """
+    def __init__(self, dataset: Dataset, capacity: int = 1 << 30, cache_dir: Union[str, PathLike, None] = None,
+                 identity: Union[str, None] = None):
+        """
+        :param dataset: the dataset to cache
+        :param capacity: the maximum number of bytes in the memory tier of each process
+        :param cache_dir: the directory of the disk tier, None for no disk tier
+        :param identity: a name for the dataset that is stable across runs, which makes the disk tier reusable,
+            None for a random one
+        """
+        if capacity < 0:
+            raise ValueError("`capacity` cannot be negative.")
+        self.dataset: Dataset = dataset
+        self._capacity: int = capacity
+        self._cache_dir: Union[str, PathLike, None] = cache_dir
+        self._identity: str = _uuid4().hex if identity is None else identity
+        self._owner_pid: int = _getpid()
+        self._memory_tier: Union[_MemoryTier, None] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_memory_tier"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def get_identity(self) -> str:
+        return self._identity
+
+    def _tier(self) -> _MemoryTier:
+        tier = self._memory_tier
+        if tier is None:
+            tiers = _memory_tiers if _getpid() == self._owner_pid else _worker_memory_tiers
+            with _memory_tiers_lock:
+                tier = tiers.get(self._identity)
+                if tier is None:
+                    tier = tiers[self._identity] = _MemoryTier(self._capacity)
+            self._memory_tier = tier
+        return tier
+
+    def _disk_path(self, i: int) -> str:
+        return _join(self._cache_dir, self._identity, f"{i}.cache")
+
+    def cut(self, i: slice) -> Self:
+        # the view shares the cache
+        return DatasetView(self, range(len(self))[i])
+
+    def get(self, i: int) -> _network.DataCompound:
+        tier = self._tier()
+        item = tier.get(i)
+        if item is not None:
+            return item
+        if self._cache_dir is not None:
+            path = self._disk_path(i)
+            if _exists(path):
+                item = self.load(path)
+                with tier.lock:
+                    tier.disk_hits += 1
+                tier.put(i, item, self.sizeof(item))
+                return item
+        item = self.dataset.get(i)
+        with tier.lock:
+            tier.misses += 1
+        tier.put(i, item, self.sizeof(item))
+        if self._cache_dir is not None:
+            path = self._disk_path(i)
+            _makedirs(_join(self._cache_dir, self._identity), exist_ok=True)
+            # unique among processes and threads so that the rename is the only visible step
+            tmp_path = f"{path}.{_getpid()}.{_get_ident()}.tmp"
+            self.dump(item, tmp_path)
+            _replace(tmp_path, path)
+        return item
+
+    def stats(self) -> dict:
+        """
+        :return: the counters of the memory tier in the current process
+        """
+        tier = self._tier()
+        return {
+            "hits": tier.hits,
+            "disk_hits": tier.disk_hits,
+            "misses": tier.misses,
+            "items": len(tier.items),
+            "bytes": tier.size,
+        }
+
+    def clear(self):
+        """
+        Empty the memory tier in the current process.
+        """
+        tier = self._tier()
+        with tier.lock:
+            tier.items.clear()
+            tier.size = 0
+            tier.hits, tier.disk_hits, tier.misses = 0, 0, 0
+
+    @abstractmethod
+    def sizeof(self, item: _network.DataCompound) -> int:
+        """
+        :param item: a single item
+        :return: the number of bytes the item takes
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def dump(self, item: _network.DataCompound, filename: Union[str, PathLike]):
+        """
+        Write an item into the disk tier.
+        :param item: a single item
+        :param filename: filename
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, filename: Union[str, PathLike]) -> _network.DataCompound:
+        """
+        Read an item from the disk tier.
+        :param filename: filename
+        :return: the item
+        """
+        raise NotImplementedError
+
+
+class WorkerPool(object):
+    """
+    A long-lived process pool that is started lazily on the first request and shared by a dataloader and all its
+        copies, so that the workers are spawned once per run instead of once per batch.
+    The workers are stopped by `close()`, at the end of a `with` block, or when the pool is garbage-collected after
+        the dataloader and all its copies are.
+    """
+    def __init__(self, num_works: int, initializer: Union[Callable[[], None], None] = None):
+        """
+        :param num_works: the number of processes
+        :param initializer: a function called once in each worker process when it starts
+        """
+        if num_works < 1:
+            raise ValueError("`num_works` must be at least 1.")
+        self._num_works: int = num_works
+        self._initializer: Union[Callable[[], None], None] = initializer
+        self._pool: Union[_Pool, None] = None
+        self._lock: _Lock = _Lock()
+
+    def __getstate__(self):
+        raise TypeError("A worker pool cannot be passed to another process.")
+
+    def __del__(self):
+        if getattr(self, "_pool", None) is not None:
+            self._pool.terminate()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_num_works(self) -> int:
+        return self._num_works
+
+    def is_started(self) -> bool:
+        return self._pool is not None
+
+    def get(self) -> _Pool:
+        """
+        Get the underlying pool, starting the workers if they haven't been started.
+        :return: the process pool
+        """
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:    # double check
+                    self._pool = _Pool(self._num_works, self._initializer)
+        return self._pool
+
+    def close(self):
+        """
+        Stop the workers. The pool will be restarted if it is requested again.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+class EventLoopThread(object):
+    """
+    An event loop running in a background thread, which is started lazily and shared by a dataloader and all its
+        copies. At most `concurrency` reads are outstanding at once.
+    The loop is stopped by `close()`, at the end of a `with` block, or when this is garbage-collected after the
+        dataloader and all its copies are.
+    """
+    def __init__(self, concurrency: int):
+        if concurrency < 1:
+            raise ValueError("`concurrency` must be at least 1.")
+        self._concurrency: int = concurrency
+        self._loop: Union[_asyncio.AbstractEventLoop, None] = None
+        self._thread: Union[_Thread, None] = None
+        self._semaphore: Union[_asyncio.Semaphore, None] = None
+        self._lock: _Lock = _Lock()
+
+    def __getstate__(self):
+        raise TypeError("An event loop cannot be passed to another process.")
+
+    def __del__(self):
+        loop = getattr(self, "_loop", None)
+        if loop is not None:
+            try:
+                # the thread only holds the loop, so it would run forever
+                loop.call_soon_threadsafe(loop.stop)
+            except RuntimeError:
+                # already closed
+                pass
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _run(loop: _asyncio.AbstractEventLoop):
+        try:
+            loop.run_forever()
+        finally:
+            # which also shuts down the default executor
+            loop.close()
+
+    def get_concurrency(self) -> int:
+        return self._concurrency
+
+    def _start(self) -> _asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:    # double check
+                    loop = _asyncio.new_event_loop()
+                    # `Dataset.aget()` runs `get()` in the default executor by default
+                    loop.set_default_executor(_ThreadPoolExecutor(self._concurrency))
+                    self._thread = _Thread(target=self._run, args=(loop,), daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    async def _limited(self, coroutine) -> Any:
+        if self._semaphore is None:
+            # created in the loop
+            self._semaphore = _asyncio.Semaphore(self._concurrency)
+        async with self._semaphore:
+            return await coroutine
+
+    async def _gather(self, coroutines: list) -> list:
+        return list(await _asyncio.gather(*(self._limited(coroutine) for coroutine in coroutines)))
+
+    def run_all(self, coroutines: list) -> list:
+        """
+        Run the coroutines concurrently on the loop and wait for all of them.
+        :param coroutines: coroutines
+        :return: the results in the same order
+        """
+        return _asyncio.run_coroutine_threadsafe(self._gather(coroutines), self._start()).result()
+
+    def close(self):
+        """
+        Stop the loop. It will be restarted if it is requested again.
+        """
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop = None
+                self._thread = None
+                self._semaphore = None
+
 
 class UniversalDataloader(object, metaclass=ABCMeta):
     def __init__(self, dataset: Dataset):
@@ -87,46 +579,230 @@ class UniversalDataloader(object, metaclass=ABCMeta):
     def load_batch(self, start: int, stop: int) -> _network.DataCompound:
         raise NotImplementedError
 
+    def set_epoch(self, epoch: int) -> Self:
+        """
+        Called by the trainer before every pass, so that randomized orders differ from pass to pass.
+        :param epoch: the number of the pass
+        :return: self
+        """
+        return self
+
+    def state(self) -> dict:
+        """
+        :return: what's needed to load the batches in the same orders again, such as the seed
+        """
+        return {}
+
+    def load_state(self, state: dict) -> Self:
+        """
+        :param state: a state taken by `state()`
+        :return: self
+        """
+        return self
+
+
+class StreamingDataset(Dataset, metaclass=ABCMeta):
+    """
+    An unbounded source of data, such as a generator of synthetic data. Instead of an index, `get()` takes the number
+        of items to draw and returns them as a batch.
+    """
+    def __len__(self) -> int:
+        # unbounded
+        return _maxsize
+
+    def cut(self, i: slice) -> Self:
+        # a part of an unbounded stream is the same stream
+        return self
+
+    @abstractmethod
+    def get(self, size: int) -> _network.DataCompound:
+        """
+        Draw a batch of new data.
+        :param size: the number of items
+        :return: a data compound of the batch of data
+        """
+        raise NotImplementedError
+
+
+class StreamingDataloader(UniversalDataloader):
+    """
+    Draw batches from a streaming dataset in background workers into a bounded queue, so that the generation overlaps
+        with the training. It stops after `num_batches` batches, or never if that's None, in which case the consumer,
+        such as `Trainer.train()`, decides how many batches to take.
+    """
+    def __init__(self, dataset: StreamingDataset, batch_size: int = 1, num_works: int = 1, prefetch_batches: int = 2,
+                 num_batches: Union[int, None] = None):
+        """
+        :param dataset: the streaming dataset
+        :param batch_size: batch size
+        :param num_works: the number of processes, 1 for generating on a background thread
+        :param prefetch_batches: the number of batches waiting in the queue besides the current one, 0 for generating
+            synchronously when `num_works` is 1
+        :param num_batches: the number of batches in an iteration, None for unbounded
+        """
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be at least 1.")
+        if num_works < 1:
+            raise ValueError("`num_works` must be at least 1.")
+        if prefetch_batches < 0:
+            raise ValueError("`prefetch_batches` cannot be negative.")
+        if num_batches is not None and num_batches < 0:
+            raise ValueError("`num_batches` cannot be negative.")
+        super(StreamingDataloader, self).__init__(dataset)
+        self._batch_size: int = batch_size
+        self._num_works: int = num_works
+        self._prefetch_batches: int = prefetch_batches
+        self._num_batches: Union[int, None] = num_batches
+        self._iter_pointer: int = 0
+        # shared by all the copies, started on the first batch
+        self._pool: Union[WorkerPool, None] = None if num_works < 2 else WorkerPool(num_works, self.seed_worker)
+        # owned by a single copy, see `__copy__`
+        self._executor: Union[_ThreadPoolExecutor, None] = None
+        self._queue: Union[_deque, None] = None
+
+    def __copy__(self) -> Self:
+        o = self.__class__.__new__(self.__class__)
+        o.__dict__.update(self.__dict__)
+        o._executor = None
+        o._queue = None
+        return o
+
+    def __del__(self):
+        # a consumer that stops early, such as `Trainer.train()`, simply drops its iterator
+        if getattr(self, "_queue", None) is not None:
+            self.stop_generating()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __next__(self) -> _network.DataCompound:
+        if self._num_batches is not None and self._iter_pointer >= self._num_batches:
+            self.stop_generating()
+            raise StopIteration
+        if self._num_works == 1 and self._prefetch_batches == 0:
+            try:
+                return self.load_batch(0, self._batch_size)
+            finally:
+                self._iter_pointer += 1
+        if self._queue is None:
+            if self._pool is None:
+                self._executor = _ThreadPoolExecutor(1)
+            self._queue = _deque()
+        # the current batch and `prefetch_batches` more, at least one for each worker
+        depth = max(self._prefetch_batches + 1, self._num_works)
+        if self._num_batches is not None:
+            depth = min(depth, self._num_batches - self._iter_pointer)
+        while len(self._queue) < depth:
+            if self._pool is None:
+                # a copy, so that the pending batches don't keep this alive
+                self._queue.append(self._executor.submit(self._pass_self().load_batch, 0, self._batch_size))
+            else:
+                self._queue.append(self._pool.get().apply_async(self._generate,
+                                                                args=(self._pass_self(), self._batch_size)))
+        res = self._queue.popleft()
+        try:
+            return res.get() if self._pool is not None else res.result()
+        finally:
+            self._iter_pointer += 1
+
+    def _pass_self(self) -> Self:
+        s = _copy(self)
+        s._pool = None
+        return s
+
+    @staticmethod
+    def _generate(self: Any, size: int) -> _network.DataCompound:
+        return self.dataset.get(size)
+
+    @staticmethod
+    def seed_worker():
+        """
+        Reseed the random generators in a new worker process so that the workers don't draw the same data.
+        """
+        _seed()
+        _np.random.seed()
+
+    def num_batches(self) -> Union[int, None]:
+        return self._num_batches
+
+    def move_iter_pointer(self, n: int) -> Self:
+        self._iter_pointer += n
+        return self
+
+    def load_batch(self, start: int, stop: int) -> _network.DataCompound:
+        """
+        :param start: item index, only used to calculate the size
+        :param stop: item index, only used to calculate the size
+        :return: a data compound of a new batch of data
+        """
+        return self.dataset.get(stop - start)
+
+    def stop_generating(self):
+        """
+        Cancel the pending batches. Generation restarts on the next batch. This is called when the iteration ends and
+            when the dataloader is garbage-collected, so an iterator left before its end stops generating.
+        NOTICE: Batches that have been sent to the worker processes are still generated, but they are discarded.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._queue = None
+
+    def close(self):
+        """
+        Stop the worker processes. This affects all the copies of this dataloader since they share the same pool.
+        """
+        self.stop_generating()
+        if self._pool is not None:
+            self._pool.close()
+
 
 if _coota_is_available():
     class PCGenerator(_coota.Generator, metaclass=ABCMeta):
         def generate(self, size: int, *args, parse: bool = True) -> _network.DataCompound:
-            return super(PCGenerator, self).generate(size, *args, parse)
+            return super(PCGenerator, self).generate(size, *args, parse=parse)
 
-    class COOTADataset(Dataset):
+    class COOTADataset(StreamingDataset):
         def __init__(self, generator: PCGenerator):
             self.generator: PCGenerator = generator
 
-        def __len__(self) -> int:
-            return int("inf")
-
-        def cut(self, i: slice) -> Self:
-            pass
-
         def get(self, size: int) -> _network.DataCompound:
             return self.generator.generate(size)
 
-    class COOTADataloader(UniversalDataloader):
-        def __init__(self, dataset: COOTADataset, batch_size: int = 1):
-            super(COOTADataloader, self).__init__(dataset)
-            self._batch_size: int = batch_size
-            self._iter_pointer: int = 0
-
-        def __next__(self) -> _network.DataCompound:
-            return self.load_batch(self._iter_pointer * self._batch_size,
-                                   self._iter_pointer * self._batch_size + self._batch_size)
-
-        def load_batch(self, start: int, stop: int) -> _network.DataCompound:
-            return self.dataset.get(stop - start)
+    class COOTADataloader(StreamingDataloader):
+        pass
 
 
 class Dataloader(UniversalDataloader, metaclass=ABCMeta):
-    def __init__(self, dataset: Dataset, batch_size: int = 1, num_works: int = 1):
+    def __init__(self, dataset: Dataset, batch_size: int = 1, num_works: int = 1, prefetch_batches: int = 0,
+                 shared_memory: bool = False, sampler: Union[_sampler.Sampler, None] = None, concurrency: int = 0):
+        """
+        :param dataset: the dataset
+        :param batch_size: batch size
+        :param num_works: the number of processes
+        :param prefetch_batches: the number of upcoming batches to load in the background while the current one is
+            being consumed, 0 for loading synchronously
+        :param shared_memory: whether the workers write the items straight into a shared batch instead of sending
+            them back, which only takes effect when `num_works` is bigger than 1
+            NOTICE: All the items must have the same structure and shapes.
+        :param sampler: the sampler that decides the order of the items, None for the sequential order
+        :param concurrency: the maximum number of outstanding `Dataset.aget()` reads on a background event loop, 0 for
+            not loading asynchronously, which cannot be used together with multiple processes
+        """
         if batch_size < 1:
             raise ValueError("`batch_size` must be at least 1.")
         if num_works < 1:
             raise ValueError("`num_works` must be at least 1.")
-        if batch_size > len(dataset):
+        if prefetch_batches < 0:
+            raise ValueError("`prefetch_batches` cannot be negative.")
+        if concurrency < 0:
+            raise ValueError("`concurrency` cannot be negative.")
+        if concurrency > 0 and num_works > 1:
+            raise ValueError("`concurrency` and `num_works` cannot be used together.")
+        if batch_size > (len(dataset) if sampler is None else len(sampler)):
             raise ValueError("`batch_size` cannot be bigger than the length of `dataset`.")
         if num_works > batch_size:
             raise ValueError("`num_works` cannot be bigger than `batch_size`.")
@@ -134,14 +810,54 @@ class Dataloader(UniversalDataloader, metaclass=ABCMeta):
         super(Dataloader, self).__init__(dataset)
         self._batch_size: int = batch_size
         self._num_works: int = num_works
+        self._sampler: Union[_sampler.Sampler, None] = sampler
         self._iter_pointer: int = 0
-        self._pool: Union[_Pool, None] = None if num_works < 2 else _Pool(num_works)
+        # shared by all the copies, started on the first batch that needs it
+        self._pool: Union[WorkerPool, None] = None if num_works < 2 else WorkerPool(num_works)
+        self._prefetch_batches: int = prefetch_batches
+        # owned by a single copy, see `__copy__`
+        self._prefetch_executor: Union[_ThreadPoolExecutor, None] = None
+        self._prefetch_queue: Union[_deque[tuple[int, _Future]], None] = None
+        self._shared_memory: bool = shared_memory
+        # a sample item telling the structure of the shared batches
+        self._shared_template: Union[_network.DataCompound, None] = None
+        # shared by all the copies
+        self._event_loop: Union[EventLoopThread, None] = None if concurrency < 1 else EventLoopThread(concurrency)
+
+    def __copy__(self) -> Self:
+        o = self.__class__.__new__(self.__class__)
+        o.__dict__.update(self.__dict__)
+        o._prefetch_executor = None
+        o._prefetch_queue = None
+        return o
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # the pool and the event loop can't be passed, so the other process starts its own if needed
+        state["_pool"] = None if self._pool is None else self._pool.get_num_works()
+        state["_event_loop"] = None if self._event_loop is None else self._event_loop.get_concurrency()
+        state["_prefetch_executor"] = None
+        state["_prefetch_queue"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self._pool is not None:
+            self._pool = WorkerPool(self._pool)
+        if self._event_loop is not None:
+            self._event_loop = EventLoopThread(self._event_loop)
 
     def __iter__(self) -> Iterator:
         return _copy(self)
 
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def __len__(self) -> int:
-        return len(self.dataset)
+        return len(self.dataset) if self._sampler is None else len(self._sampler)
 
     def __getitem__(self, item: Union[int, slice]) -> Union[list[_network.DataCompound], Self]:
         """
@@ -150,28 +866,124 @@ class Dataloader(UniversalDataloader, metaclass=ABCMeta):
         :return: a data compound(batched) or another edited object
         """
         if isinstance(item, int):
-            return self._load_batch(self, self._batch_size, self._batch_size * item)
+            bounds = self._batch_bounds(item)
+            if bounds is None:
+                raise IndexError("Batch index out of range.")
+            return self._load_batch(self, self._indices(*bounds))
         if isinstance(item, slice):
             item = self._multiply_slice(item)
-            return super(Dataloader, self).__getitem__(item)
+            if self._sampler is None:
+                return super(Dataloader, self).__getitem__(item)
+            o = _copy(self)
+            o._sampler = self._sampler[item]
+            return o
 
     def __next__(self) -> _network.DataCompound:
-        rest = len(self) - self._iter_pointer * self._batch_size
+        if self._prefetch_batches > 0:
+            return self._next_prefetched()
+        bounds = self._batch_bounds(self._iter_pointer)
+        if bounds is None:
+            raise StopIteration
+        try:
+            return self.load_batch(*bounds)
+        finally:
+            self._iter_pointer += 1
+
+    def _batch_bounds(self, i: int) -> Union[tuple[int, int], None]:
+        """
+        Convert the batch index to item indexes.
+        :param i: batch index
+        :return: start, stop (item indexes) or None if the batch is out of range
+        """
+        start = i * self._batch_size
+        rest = len(self) - start
         if rest <= 0:
+            return None
+        return start, start + (self._batch_size if rest > self._batch_size else rest)
+
+    def _next_prefetched(self) -> _network.DataCompound:
+        if self._prefetch_queue is None or (len(self._prefetch_queue) > 0 and
+                                            self._prefetch_queue[0][0] != self._iter_pointer):
+            # the first call or the pointer has been moved
+            self.stop_prefetching()
+            # batches are loaded one after another by a single thread unless the loading happens in the worker
+            #   processes, in which case the threads only wait
+            self._prefetch_executor = _ThreadPoolExecutor(self._prefetch_batches if self._num_works > 1 else 1)
+            self._prefetch_queue = _deque()
+        queue = self._prefetch_queue
+        i = queue[-1][0] + 1 if len(queue) > 0 else self._iter_pointer
+        # the current batch and `prefetch_batches` more
+        while len(queue) <= self._prefetch_batches:
+            bounds = self._batch_bounds(i)
+            if bounds is None:
+                break
+            queue.append((i, self._prefetch_executor.submit(self.load_batch, *bounds)))
+            i += 1
+        if len(queue) == 0:
+            self.stop_prefetching()
             raise StopIteration
-        batch_size = self._batch_size if rest > self._batch_size else rest
         try:
-            # convert index from batch to item
-            return self.load_batch(self._iter_pointer * self._batch_size,
-                                   self._iter_pointer * self._batch_size + batch_size)
+            return queue.popleft()[1].result()
         finally:
             self._iter_pointer += 1
 
+    def stop_prefetching(self):
+        """
+        Cancel the pending batches and stop the background thread. Prefetching restarts on the next batch.
+        """
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self._prefetch_executor = None
+        self._prefetch_queue = None
+
     def _pass_self(self) -> Self:
         s = _copy(self)
         s._pool = None
+        s._event_loop = None
+        # the workers receive resolved indexes
+        s._sampler = None
         return s
 
+    def get_sampler(self) -> Union[_sampler.Sampler, None]:
+        return self._sampler
+
+    def set_epoch(self, epoch: int) -> Self:
+        if self._sampler is not None:
+            self._sampler.set_epoch(epoch)
+        return self
+
+    def state(self) -> dict:
+        return {} if self._sampler is None else {"sampler": self._sampler.state()}
+
+    def load_state(self, state: dict) -> Self:
+        if self._sampler is not None and "sampler" in state:
+            self._sampler.load_state(state["sampler"])
+        return self
+
+    def shard(self, rank: int, world_size: int, even: bool = True) -> Self:
+        """
+        Take every `world_size`-th item starting from `rank` (in the order of the sampler if there is one).
+        :param rank: the shard number
+        :param world_size: the number of shards
+        :param even: whether to drop the tail so that every shard has the same number of batches, which keeps the
+            processes of data-parallel training in step
+        :return: another edited object
+        """
+        o = _copy(self)
+        sampler = _sampler.SequentialSampler(len(self.dataset)) if self._sampler is None else self._sampler
+        o._sampler = _sampler.ShardedSampler(sampler, rank, world_size, even)
+        return o
+
+    def close(self):
+        """
+        Stop the worker processes. This affects all the copies of this dataloader since they share the same pool.
+        """
+        self.stop_prefetching()
+        if self._pool is not None:
+            self._pool.close()
+        if self._event_loop is not None:
+            self._event_loop.close()
+
     def num_batches(self) -> int:
         return _ceil(len(self) / self._batch_size)
 
@@ -200,33 +1012,121 @@ class Dataloader(UniversalDataloader, metaclass=ABCMeta):
         :param stop: item index instead of batch index
         :return: a data compound of the batch of data
         """
+        indices = self._indices(start, stop)
+        if self._shared_memory and self._num_works > 1 and len(indices) > 1:
+            return self._load_shared_batch(indices)
+        return self.combine_batch(self._load_items(indices))
+
+    def _load_items(self, indices: Sequence[int]) -> list[_network.DataCompound]:
+        """
+        Load the items in the worker processes if there are any.
+        :param indices: the dataset indexes
+        :return: a list of single items
+        """
+        if self._event_loop is not None:
+            return self._transform_items(self._event_loop.run_all([self.dataset.aget(int(i)) for i in indices]))
+        if self._num_works == 1 or len(indices) < 2:
+            return self._load_batch(self, indices)
+        pool = self._pool.get()
+        passed_self = self._pass_self()
+        work_res_list = []
+        for base, end in self._split(len(indices)):
+            work_res_list.append(pool.apply_async(self._load_batch, args=(passed_self, indices[base: end])))
         res_list = []
-        size = stop - start
-        if self._num_works == 1:
-            res_list += self._load_batch(self, size, start)
-        else:
-            self._pool = _Pool(self._num_works)
-            spw = size // self._num_works
-            rest = size % self._num_works
-            rest = spw if rest == 0 else rest
-            work_res_list = []
-            for i in range(self._num_works - 1):
-                work_res_list.append(
-                    self._pool.apply_async(self._load_batch, args=(self._pass_self(), spw, start + i * spw)))
-            work_res_list.append(
-                self._pool.apply_async(self._load_batch, args=(self._pass_self(), rest, start + size - rest)))
-            self._pool.close()
-            self._pool.join()
-            for work_res in work_res_list:
-                res_list += work_res.get()
-        return self.combine_batch(res_list)
+        for work_res in work_res_list:
+            res_list += work_res.get()
+        return res_list
+
+    def _indices(self, start: int, stop: int) -> Sequence[int]:
+        """
+        Resolve the positions into the indexes of the dataset.
+        :param start: item index instead of batch index
+        :param stop: item index instead of batch index
+        :return: the dataset indexes
+        """
+        return range(start, stop) if self._sampler is None else self._sampler.indices(start, stop)
+
+    def _load_shared_batch(self, indices: Sequence[int]) -> _network.DataCompound:
+        if self._shared_template is None:
+            self._shared_template = self._load_batch(self, indices[:1])[0]
+        expansion = self._expansion()
+        buffer = self.allocate_shared_batch(self._shared_template, len(indices) * expansion)
+        pool = self._pool.get()
+        passed_self = self._pass_self()
+        work_res_list = []
+        for base, end in self._split(len(indices)):
+            work_res_list.append(pool.apply_async(self._load_into, args=(passed_self, buffer, indices[base: end],
+                                                                         base * expansion)))
+        for work_res in work_res_list:
+            work_res.get()
+        return self.wrap_shared_batch(buffer)
+
+    def _split(self, size: int) -> list[tuple[int, int]]:
+        """
+        Split the dataset indexes as evenly as possible among the workers.
+        :param size: the number of dataset indexes
+        :return: a list of non-empty [start, stop) pairs
+        """
+        bounds = [size * i // self._num_works for i in range(self._num_works + 1)]
+        return [(bounds[i], bounds[i + 1]) for i in range(self._num_works) if bounds[i + 1] > bounds[i]]
+
+    def _expansion(self) -> int:
+        """
+        :return: the number of items loaded from each item of the dataset
+        """
+        return 1
 
     @staticmethod
-    def _load_batch(self: Any, size: int, base: int = 0) -> list[_network.DataCompound]:
+    def _load_into(self: Any, buffer: Any, indices: Sequence[int], offset: int):
+        """
+        Load the items and write them into the shared batch. This runs in the worker processes.
+        :param buffer: the shared batch
+        :param indices: the dataset indexes
+        :param offset: the position of the first item in the shared batch
+        """
+        for i, item in enumerate(self._load_batch(self, indices)):
+            self.write_shared_sample(buffer, offset + i, item)
+
+    def allocate_shared_batch(self, template: _network.DataCompound, size: int) -> Any:
+        """
+        Allocate an uninitialized batch in the shared memory which can be passed to the worker processes without
+            copying the content.
+        :param template: a single item showing the structure of the batch
+        :param size: the number of items
+        :return: the shared batch
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def write_shared_sample(buffer: Any, i: int, sample: _network.DataCompound):
+        """
+        :param buffer: the shared batch
+        :param i: the position in the batch
+        :param sample: a single item
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def wrap_shared_batch(buffer: Any) -> _network.DataCompound:
+        """
+        :param buffer: the shared batch that has been filled
+        :return: a data compound of the batch of data without copying
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _load_batch(self: Any, indices: Sequence[int]) -> list[_network.DataCompound]:
         res_list = []
-        for i in range(size):
-            res_list.append(self.dataset[base + i])
-        return res_list
+        for i in indices:
+            res_list.append(self.dataset[int(i)])
+        return self._transform_items(res_list)
+
+    def _transform_items(self, items: list[_network.DataCompound]) -> list[_network.DataCompound]:
+        """
+        :param items: the items read from the dataset
+        :return: the items to combine into the batch
+        """
+        return items
 
     @staticmethod
     @abstractmethod
@@ -238,24 +1138,84 @@ class PreprocessedDataloader(Dataloader, metaclass=ABCMeta):
     """
     All the indexes and sizes are multiplied by a proportion that how much the preprocessing extend the data.
     """
-    def __init__(self, dataset: Dataset, batch_size: int = 1, num_works: int = 1):
-        super(PreprocessedDataloader, self).__init__(dataset, batch_size, num_works)
+    def __init__(self, dataset: Dataset, batch_size: int = 1, num_works: int = 1, prefetch_batches: int = 0,
+                 shared_memory: bool = False, sampler: Union[_sampler.Sampler, None] = None, concurrency: int = 0,
+                 proportion: Union[int, None] = None, materialize: bool = False):
+        """
+        :param proportion: how many items the preprocessing makes out of each original item, None for finding out by
+            preprocessing the first item
+        :param materialize: whether to keep the preprocessed items in memory and reuse them in later epochs
+            NOTICE: Only enable this when the preprocessing is deterministic. The memory is not bounded.
+        See `Dataloader` for the other parameters.
+        """
+        super(PreprocessedDataloader, self).__init__(dataset, batch_size, num_works, prefetch_batches, shared_memory,
+                                                     sampler, concurrency)
         # preprocessed: original(which is 1)
-        self._proportion: int = len(self.preprocess(self.dataset[0]))
+        self._proportion: int = len(self.preprocess(self.dataset[0])) if proportion is None else proportion
+        if self._proportion < 1:
+            raise ValueError("`proportion` must be at least 1.")
         self._batch_size: int = self._batch_size * self._proportion
+        # original index: preprocessed items, shared by all the copies
+        self._materialized: Union[dict[int, list[_network.DataCompound]], None] = {} if materialize else None
 
     def __len__(self) -> int:
         return super(PreprocessedDataloader, self).__len__() * self._proportion
 
-    @staticmethod
-    def _load_batch(self: Any, size: int, base: int = 0) -> list[_network.DataCompound]:
+    def _indices(self, start: int, stop: int) -> Sequence[int]:
         # change back to the same scale as naive Dataloader
-        size = int(size / self._proportion)
-        base = int(base / self._proportion)
+        return super(PreprocessedDataloader, self)._indices(start // self._proportion, stop // self._proportion)
+
+    def _expansion(self) -> int:
+        return self._proportion
+
+    def _pass_self(self) -> Self:
+        s = super(PreprocessedDataloader, self)._pass_self()
+        s._materialized = None
+        return s
+
+    def load_batch(self, start: int, stop: int) -> _network.DataCompound:
+        if self._materialized is None:
+            return super(PreprocessedDataloader, self).load_batch(start, stop)
+        # the materialized items are already in the parent process, so there is nothing to share
+        return self.combine_batch(self._load_items(self._indices(start, stop)))
+
+    def _load_items(self, indices: Sequence[int]) -> list[_network.DataCompound]:
+        if self._materialized is None:
+            return super(PreprocessedDataloader, self)._load_items(indices)
+        missing = [int(i) for i in indices if int(i) not in self._materialized]
+        if len(missing) > 0:
+            res_list = super(PreprocessedDataloader, self)._load_items(missing)
+            for j, i in enumerate(missing):
+                self._materialized[i] = res_list[j * self._proportion: (j + 1) * self._proportion]
+        res_list = []
+        for i in indices:
+            res_list += self._materialized[int(i)]
+        return res_list
+
+    def clear_materialized(self):
+        """
+        Drop the preprocessed items kept by `materialize`.
+        """
+        if self._materialized is not None:
+            self._materialized.clear()
+
+    def _transform_items(self, items: list[_network.DataCompound]) -> list[_network.DataCompound]:
+        res_list = self.preprocess_batch(items)
+        if len(res_list) != len(items) * self._proportion:
+            raise ValueError(f"The preprocessing made {len(res_list)} items out of {len(items)} instead of "
+                             f"{len(items) * self._proportion}.")
+        return res_list
 
+    def preprocess_batch(self, original_data: list[_network.DataCompound]) -> list[_network.DataCompound]:
+        """
+        Preprocess a stack of data at once. Override this to vectorize the preprocessing over the batch.
+        NOTICE: The preprocessed items of each original item must stay together and in the original order.
+        :param original_data: a list of single data items (not batch)
+        :return: a list of preprocessed data
+        """
         res_list = []
-        for i in range(size):
-            res_list += self.preprocess(self.dataset[base + i])
+        for data in original_data:
+            res_list += self.preprocess(data)
         return res_list
 
     @abstractmethod
@@ -267,3 +1227,141 @@ class PreprocessedDataloader(Dataloader, metaclass=ABCMeta):
         :return: a list of preprocessed data
         """
         raise NotImplementedError
+
+
+class BucketingDataloader(Dataloader, metaclass=ABCMeta):
+    """
+    Group items of similar lengths and form batches up to a budget of padded elements instead of a fixed number of
+        items, so that each batch only needs padding to the longest item in it.
+    """
+    def __init__(self, dataset: Dataset, lengths: Union[Sequence[int], _np.ndarray, Callable[[int], int]],
+                 max_tokens: int, batch_size: Union[int, None] = None, num_works: int = 1, prefetch_batches: int = 0,
+                 bucket_width: int = 1, shuffle: bool = False, seed: Union[int, None] = None):
+        """
+        :param dataset: the dataset
+        :param lengths: the length of each item, or a function that returns the length of the item at an index
+        :param max_tokens: the maximum number of elements in a batch after padding, which is the longest length in the
+            batch times the number of items
+            NOTICE: An item longer than this forms a batch on its own.
+        :param batch_size: the maximum number of items in a batch, None for no limit
+        :param num_works: the number of processes
+        :param prefetch_batches: see `Dataloader`
+        :param bucket_width: items whose lengths fall in the same multiple of this are treated as equally long when
+            shuffling, which trades padding for randomness
+        :param shuffle: whether to shuffle the items inside each bucket and the order of the batches
+        :param seed: the random seed
+        """
+        if max_tokens < 1:
+            raise ValueError("`max_tokens` must be at least 1.")
+        if bucket_width < 1:
+            raise ValueError("`bucket_width` must be at least 1.")
+        if callable(lengths):
+            lengths = _np.fromiter((lengths(i) for i in range(len(dataset))), dtype=_np.int64, count=len(dataset))
+        else:
+            lengths = _np.asarray(lengths, dtype=_np.int64)
+        if len(lengths) != len(dataset):
+            raise ValueError("`lengths` must have the same length as `dataset`.")
+        self._max_tokens: int = max_tokens
+        self._max_batch_size: int = len(dataset) if batch_size is None else batch_size
+        self._shuffle: bool = shuffle
+        self._seed: int = _np.random.SeedSequence().entropy if seed is None else seed
+        rng = _np.random.default_rng(self._seed)
+        order = rng.permutation(len(lengths)) if shuffle else _np.arange(len(lengths))
+        # the stable sort keeps the shuffled order inside each bucket
+        order = order[_np.argsort(lengths[order] // bucket_width, kind="stable")]
+        self._bounds: _np.ndarray = self._pack(lengths[order].tolist(), max_tokens, self._max_batch_size)
+        super(BucketingDataloader, self).__init__(dataset, self._max_batch_size, num_works, prefetch_batches,
+                                                  sampler=_sampler.IndexSampler(order, len(dataset)))
+        self._batch_order: _np.ndarray = _np.arange(len(self._bounds) - 1)
+        # the slices and shards taken so far, in order, which are applied again to every new batch order
+        self._selections: tuple[Union[slice, tuple[int, int, bool]], ...] = ()
+        self.set_epoch(0)
+
+    @staticmethod
+    def _pack(lengths: list[int], max_tokens: int, max_batch_size: int) -> _np.ndarray:
+        """
+        :param lengths: the lengths in the order of loading
+        :param max_tokens: the maximum number of padded elements in a batch
+        :param max_batch_size: the maximum number of items in a batch
+        :return: the position where each batch starts, followed by the total length
+        """
+        bounds = [0]
+        longest = 0
+        for i, length in enumerate(lengths):
+            count = i - bounds[-1]
+            longest_if_added = length if length > longest else longest
+            if count > 0 and (longest_if_added * (count + 1) > max_tokens or count >= max_batch_size):
+                bounds.append(i)
+                longest_if_added = length
+            longest = longest_if_added
+        bounds.append(len(lengths))
+        return _np.asarray(bounds, dtype=_np.int64)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[list[_network.DataCompound], Self]:
+        """
+        In this method, all indexes are batch index instead of item indexes.
+        :param item: int for a data compound(batched), slice for selecting batches
+        :return: a data compound(batched) or another edited object
+        """
+        if isinstance(item, slice):
+            o = _copy(self)
+            o._selections = self._selections + (item,)
+            o._batch_order = self._batch_order[item]
+            return o
+        return super(BucketingDataloader, self).__getitem__(item)
+
+    def set_epoch(self, epoch: int) -> Self:
+        """
+        Draw the order of the batches for the epoch if shuffling.
+        :param epoch: epoch number
+        :return: self
+        """
+        if self._shuffle:
+            batch_order = _np.random.default_rng([self._seed, epoch]).permutation(len(self._bounds) - 1)
+            for selection in self._selections:
+                if isinstance(selection, slice):
+                    batch_order = batch_order[selection]
+                else:
+                    batch_order = self._shard_batches(batch_order, *selection)
+            self._batch_order = batch_order
+        return self
+
+    def state(self) -> dict:
+        return {"seed": self._seed}
+
+    def load_state(self, state: dict) -> Self:
+        # the batches are packed with the seed when constructed
+        if self._shuffle and state.get("seed", self._seed) != self._seed:
+            raise ValueError(f"The state was taken with the seed {state['seed']}, pass it as `seed`.")
+        return self
+
+    @staticmethod
+    def _shard_batches(batch_order: _np.ndarray, rank: int, world_size: int, even: bool) -> _np.ndarray:
+        shard = batch_order[rank::world_size]
+        return shard[:len(batch_order) // world_size] if even else shard
+
+    def shard(self, rank: int, world_size: int, even: bool = True) -> Self:
+        """
+        Batches are sharded instead of items, since they have different sizes.
+        :param rank: the shard number
+        :param world_size: the number of shards
+        :param even: whether to drop the tail so that every shard has the same number of batches
+        :return: another edited object
+        """
+        if world_size < 1:
+            raise ValueError("`world_size` must be at least 1.")
+        if not 0 <= rank < world_size:
+            raise ValueError("`rank` must be in [0, `world_size`).")
+        o = _copy(self)
+        o._selections = self._selections + ((rank, world_size, even),)
+        o._batch_order = self._shard_batches(self._batch_order, rank, world_size, even)
+        return o
+
+    def num_batches(self) -> int:
+        return len(self._batch_order)
+
+    def _batch_bounds(self, i: int) -> Union[tuple[int, int], None]:
+        if not 0 <= i < len(self._batch_order):
+            return None
+        b = self._batch_order[i]
+        return int(self._bounds[b]), int(self._bounds[b + 1])
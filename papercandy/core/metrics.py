@@ -0,0 +1,87 @@
+from typing import Any, Union
+from typing_extensions import Self
+from abc import abstractmethod, ABCMeta
+
+
+class Metric(object, metaclass=ABCMeta):
+    """
+    A reducer updated batch by batch that keeps only what it needs to produce the result instead of the outputs, so
+        its memory doesn't depend on the number of batches. Metrics of the same kind calculated over different parts
+        of the data can be merged into the metric of the whole.
+    """
+    def __init__(self, name: str):
+        self._name: str = name
+
+    def get_name(self) -> str:
+        return self._name
+
+    @abstractmethod
+    def update(self, output: Any, target: Any) -> Self:
+        """
+        :param output: network output of a batch
+        :param target: target of the batch
+        :return: self
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge(self, other: Self) -> Self:
+        """
+        :param other: another metric of the same kind
+        :return: self
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def result(self) -> Any:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reset(self) -> Self:
+        raise NotImplementedError
+
+
+class AverageMetric(Metric, metaclass=ABCMeta):
+    """
+    A metric that is the average of a value over all the samples or elements.
+    """
+    def __init__(self, name: str):
+        super(AverageMetric, self).__init__(name)
+        self._sum: float = 0
+        self._count: int = 0
+
+    def update(self, output: Any, target: Any) -> Self:
+        s, count = self._sum_and_count(output, target)
+        self._sum += s
+        self._count += count
+        return self
+
+    def merge(self, other: Self) -> Self:
+        if not isinstance(other, self.__class__):
+            raise TypeError(f"Only a {self.__class__.__name__} can be merged.")
+        self._sum += other._sum
+        self._count += other._count
+        return self
+
+    def result(self) -> Union[float, None]:
+        """
+        :return: the average or None if there's no sample
+        """
+        return self._sum / self._count if self._count > 0 else None
+
+    def reset(self) -> Self:
+        self._sum = 0
+        self._count = 0
+        return self
+
+    def get_count(self) -> int:
+        return self._count
+
+    @abstractmethod
+    def _sum_and_count(self, output: Any, target: Any) -> tuple[float, int]:
+        """
+        :param output: network output of a batch
+        :param target: target of the batch
+        :return: the sum of the values in the batch, the number of values
+        """
+        raise NotImplementedError
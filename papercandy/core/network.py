@@ -20,6 +20,12 @@ class DataCompound(object, metaclass=ABCMeta):
     def cpu(self) -> Self:
         raise NotImplementedError
 
+    def detach(self) -> Self:
+        """
+        :return: a copy on the CPU that shares nothing with the original one
+        """
+        raise NotImplementedError
+
     def unpack(self) -> [Any, Any]:
         return self.data, self.target
 
@@ -37,6 +43,12 @@ class ResultCompound(object, metaclass=ABCMeta):
     def cpu(self) -> Self:
         raise NotImplementedError
 
+    def detach(self) -> Self:
+        """
+        :return: a copy on the CPU that shares nothing with the original one
+        """
+        raise NotImplementedError
+
     def unpack(self) -> [DataCompound, Any]:
         return self.input_data, self.output
 
@@ -148,6 +160,19 @@ class Container(object, metaclass=ABCMeta):
     def load(self, filename: Union[str, PathLike]) -> Self:
         raise NotImplementedError
 
+    def state(self) -> Any:
+        """
+        :return: a copy of the state, which is not affected by further changes of the object
+        """
+        raise NotImplementedError
+
+    def load_state(self, state: Any) -> Self:
+        """
+        :param state: a state returned by `state()`
+        :return: self
+        """
+        raise NotImplementedError
+
 
 class NetworkC(Container, metaclass=ABCMeta):
     def __len__(self) -> int:
@@ -0,0 +1,261 @@
+import numpy as _np
+from typing import Union, Iterator
+from typing_extensions import Self
+from abc import abstractmethod, ABCMeta
+
+
+def compact_dtype(length: int) -> _np.dtype:
+    """
+    :param length: the number of items
+    :return: the smallest unsigned integer type that can hold every index
+    """
+    return _np.min_scalar_type(max(length - 1, 0))
+
+
+class Sampler(object, metaclass=ABCMeta):
+    """
+    A sampler decides which item of the dataset is at each position of an epoch. All the indexes are stored in
+        compact arrays instead of Python lists.
+    """
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        :return: the number of positions in an epoch
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        """
+        :param positions: positions in the epoch
+        :return: the dataset indexes at the positions
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, item: slice) -> Self:
+        if not isinstance(item, slice):
+            raise TypeError("`item` must be a slice.")
+        return SlicedSampler(self, range(len(self))[item])
+
+    def __iter__(self) -> Iterator[int]:
+        chunk = 65536
+        for start in range(0, len(self), chunk):
+            yield from self.indices(start, min(start + chunk, len(self))).tolist()
+
+    def indices(self, start: int, stop: int) -> _np.ndarray:
+        """
+        :param start: the first position
+        :param stop: the position after the last one
+        :return: the dataset indexes at the positions
+        """
+        return self.take(_np.arange(start, stop, dtype=_np.int64))
+
+    def set_epoch(self, epoch: int) -> Self:
+        """
+        Randomized samplers draw a different order for each epoch.
+        :param epoch: epoch number
+        :return: self
+        """
+        return self
+
+    def state(self) -> dict:
+        """
+        :return: what's needed to draw the same orders again, such as the seed
+        """
+        return {}
+
+    def load_state(self, state: dict) -> Self:
+        """
+        :param state: a state taken by `state()`
+        :return: self
+        """
+        return self
+
+
+class SequentialSampler(Sampler):
+    def __init__(self, length: int):
+        self._length: int = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        return positions
+
+
+class RandomSampler(Sampler):
+    """
+    A seeded random permutation, which is drawn lazily and differs from epoch to epoch.
+    """
+    def __init__(self, length: int, seed: Union[int, None] = None):
+        self._length: int = length
+        self._seed: int = _np.random.SeedSequence().entropy if seed is None else seed
+        self._epoch: int = 0
+        self._permutation: Union[_np.ndarray, None] = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_permutation"] = None
+        return state
+
+    def set_epoch(self, epoch: int) -> Self:
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self._permutation = None
+        return self
+
+    def state(self) -> dict:
+        return {"seed": self._seed}
+
+    def load_state(self, state: dict) -> Self:
+        self._seed = state["seed"]
+        self._permutation = None
+        return self
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        if self._permutation is None:
+            permutation = _np.arange(self._length, dtype=compact_dtype(self._length))
+            _np.random.default_rng([self._seed, self._epoch]).shuffle(permutation)
+            self._permutation = permutation
+        return self._permutation[positions]
+
+
+class WeightedSampler(Sampler):
+    """
+    Draw `num_samples` items, each with a probability proportional to its weight.
+    """
+    def __init__(self, weights: Union[list[float], _np.ndarray], num_samples: Union[int, None] = None,
+                 replacement: bool = True, seed: Union[int, None] = None):
+        weights = _np.asarray(weights, dtype=_np.float64)
+        if weights.ndim != 1 or len(weights) < 1:
+            raise ValueError("`weights` must be a non-empty 1-D sequence.")
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("`weights` cannot be negative and must not sum to 0.")
+        self._probabilities: _np.ndarray = weights / weights.sum()
+        self._num_samples: int = len(weights) if num_samples is None else num_samples
+        if not replacement and self._num_samples > _np.count_nonzero(weights):
+            raise ValueError("`num_samples` cannot be bigger than the number of non-zero weights without replacement.")
+        self._replacement: bool = replacement
+        self._seed: int = _np.random.SeedSequence().entropy if seed is None else seed
+        self._epoch: int = 0
+        self._samples: Union[_np.ndarray, None] = None
+
+    def __len__(self) -> int:
+        return self._num_samples
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_samples"] = None
+        return state
+
+    def set_epoch(self, epoch: int) -> Self:
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self._samples = None
+        return self
+
+    def state(self) -> dict:
+        return {"seed": self._seed}
+
+    def load_state(self, state: dict) -> Self:
+        self._seed = state["seed"]
+        self._samples = None
+        return self
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        if self._samples is None:
+            length = len(self._probabilities)
+            self._samples = _np.random.default_rng([self._seed, self._epoch]).choice(
+                length, self._num_samples, replace=self._replacement, p=self._probabilities
+            ).astype(compact_dtype(length))
+        return self._samples[positions]
+
+
+class ShardedSampler(Sampler):
+    """
+    Take every `world_size`-th position of another sampler starting from `rank`.
+    """
+    def __init__(self, sampler: Sampler, rank: int, world_size: int, even: bool = True):
+        """
+        :param sampler: the sampler to shard
+        :param rank: the shard number
+        :param world_size: the number of shards
+        :param even: whether to drop the tail so that every shard has the same length
+        """
+        if world_size < 1:
+            raise ValueError("`world_size` must be at least 1.")
+        if not 0 <= rank < world_size:
+            raise ValueError("`rank` must be in [0, `world_size`).")
+        self._sampler: Sampler = sampler
+        self._rank: int = rank
+        self._world_size: int = world_size
+        self._length: int = len(sampler) // world_size if even else len(range(rank, len(sampler), world_size))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def set_epoch(self, epoch: int) -> Self:
+        self._sampler.set_epoch(epoch)
+        return self
+
+    def state(self) -> dict:
+        return self._sampler.state()
+
+    def load_state(self, state: dict) -> Self:
+        self._sampler.load_state(state)
+        return self
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        return self._sampler.take(self._rank + positions * self._world_size)
+
+
+class SlicedSampler(Sampler):
+    def __init__(self, sampler: Sampler, r: range):
+        if isinstance(sampler, SlicedSampler):
+            # compose the ranges instead of stacking the samplers
+            outer = sampler._range
+            sampler = sampler._sampler
+            r = range(outer.start + r.start * outer.step, outer.start + r.stop * outer.step, outer.step * r.step)
+        self._sampler: Sampler = sampler
+        self._range: range = r
+
+    def __len__(self) -> int:
+        return len(self._range)
+
+    def set_epoch(self, epoch: int) -> Self:
+        self._sampler.set_epoch(epoch)
+        return self
+
+    def state(self) -> dict:
+        return self._sampler.state()
+
+    def load_state(self, state: dict) -> Self:
+        self._sampler.load_state(state)
+        return self
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        return self._sampler.take(self._range.start + positions * self._range.step)
+
+
+class IndexSampler(Sampler):
+    """
+    Walk through a fixed array of dataset indexes.
+    """
+    def __init__(self, indices: Union[list[int], _np.ndarray], length: Union[int, None] = None):
+        """
+        :param indices: dataset indexes
+        :param length: the length of the dataset, which decides the storage type, None for the maximum index + 1
+        """
+        indices = _np.asarray(indices)
+        if length is None:
+            length = int(indices.max()) + 1 if len(indices) > 0 else 0
+        self._indices: _np.ndarray = indices.astype(compact_dtype(length))
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def take(self, positions: _np.ndarray) -> _np.ndarray:
+        return self._indices[positions]
@@ -1,17 +1,24 @@
-from typing import Union, Any
+from sys import maxsize as _maxsize
+from copy import deepcopy as _deepcopy
+from queue import Empty as _Empty
+from typing import Union, Any, Iterator, Sequence
 from abc import abstractmethod, ABCMeta
+from multiprocessing import get_context as _get_context
+from multiprocessing.reduction import ForkingPickler as _ForkingPickler
 
 
 from papercandy import network as _network
-from papercandy.core import dataloader as _dl, config as _cfg
+from papercandy.core import dataloader as _dl, config as _cfg, timing as _timing, metrics as _metrics
 
 
 class Tester(object, metaclass=ABCMeta):
     def __init__(self, dataloader: _dl.Dataloader):
         self._nc: Union[_network.NetworkC, None] = None
         self._config: _cfg.Config = _cfg.CONFIG().CURRENT
+        self._snapshot: _cfg.ConfigSnapshot = self._config.snapshot()
         self._dataloader: _dl.Dataloader = dataloader
         self._epoch: int = 0
+        self._timer: _timing.PhaseTimer = _timing.PhaseTimer()
 
     def _check_requirements(self) -> bool:
         return self._config is not None and self._dataloader is not None and self._nc is not None
@@ -23,14 +30,33 @@ class Tester(object, metaclass=ABCMeta):
     def get_config(self) -> _cfg.Config:
         return self._config
 
+    def refresh_config(self) -> _cfg.ConfigSnapshot:
+        """
+        Take a new snapshot of the configuration. Call this after the configuration is changed in the middle of
+            testing, otherwise the change only takes effect the next time `test()` is called.
+        :return: the new snapshot
+        """
+        self._snapshot = self._config.snapshot()
+        return self._snapshot
+
     def get_dataloader(self) -> _dl.Dataloader:
         return self._dataloader
 
     def get_epoch(self) -> int:
         return self._epoch
 
+    def get_timer(self) -> _timing.PhaseTimer:
+        return self._timer
+
+    def timing_summary(self) -> dict[str, dict[str, Union[int, float]]]:
+        """
+        :return: the statistics of the time spent in each phase ("data", "transfer" and "forward") of the batches,
+            see `PhaseTimer.summary()`
+        """
+        return self._timer.summary()
+
     def set_network(self, nc: _network.NetworkC):
-        if self._config.get_predefined("gpu_acceleration"):
+        if self.refresh_config().gpu_acceleration:
             nc = nc.gpu()
         self._nc = nc
 
@@ -38,19 +64,121 @@ class Tester(object, metaclass=ABCMeta):
         return self._nc
 
     def test(self, num_batches: int) -> list[_network.ResultCompound]:
+        """
+        NOTICE: All the results are kept in memory, consider `stream()` or `evaluate()` for large datasets.
+        :param num_batches: the maximum number of batches
+        :return: the result of each batch
+        """
+        return list(self.stream(num_batches))
+
+    def stream(self, num_batches: int) -> Iterator[_network.ResultCompound]:
+        """
+        Test batch by batch lazily, so that each result can be released before the next one is calculated.
+        :param num_batches: the maximum number of batches
+        :return: an iterator of the result of each batch
+        """
         self._check_requirements_and_raise_exception()
-        res_list = []
+        self.refresh_config()
+        return self._stream(num_batches)
+
+    def _stream(self, num_batches: int) -> Iterator[_network.ResultCompound]:
         local_epoch = 0
+        timer = self._timer
+        timer.restart()
         for data in self._dataloader:
             if local_epoch >= num_batches:
                 break
-            if self._config.get_predefined("gpu_acceleration"):
+            timer.lap("data")
+            if self._snapshot.gpu_acceleration:
                 data = data.gpu()
+                timer.lap("transfer")
             o = self._test_one_batch(self._epoch, self._nc.get(), data)
-            res_list.append(_network.ResultCompound(data, o))
+            timer.lap("forward")
+            timer.commit()
             local_epoch += 1
             self._epoch += 1
-        return res_list
+            yield _network.ResultCompound(data, o)
+            # the time the consumer takes is not the time of the next batch
+            timer.restart()
+
+    def evaluate(self, metrics: Sequence[_metrics.Metric], num_batches: int) -> dict[str, Any]:
+        """
+        Update the metrics with the results batch by batch without keeping them, so the memory doesn't grow with
+            the size of the dataset.
+        :param metrics: metrics, which are not reset before
+        :param num_batches: the maximum number of batches
+        :return: the name and the result of each metric
+        """
+        for result in self.stream(num_batches):
+            for metric in metrics:
+                metric.update(result.output, result.input_data.target)
+        return {metric.get_name(): metric.result() for metric in metrics}
+
+    def evaluate_parallel(self, metrics: Sequence[_metrics.Metric], num_processes: int,
+                          num_batches: int = _maxsize) -> dict[str, Any]:
+        """
+        Evaluate in `num_processes` processes, each on its own shard of the dataloader, and merge the metrics of the
+            processes into `metrics` in order of the shards. The network is shared with the processes (see
+            `_share_network()`) instead of being copied into each of them, and it's only read.
+        NOTICE: The processes are spawned, so the tester, the dataloader and the network must be picklable with
+            their classes defined at the top level of a module, and the call must be guarded by
+            `if __name__ == "__main__"`.
+        :param metrics: metrics, which are not reset before
+        :param num_processes: the number of processes
+        :param num_batches: the maximum number of batches of each process
+        :return: the name and the result of each metric
+        """
+        if num_processes < 1:
+            raise ValueError("`num_processes` must be at least 1.")
+        self._check_requirements_and_raise_exception()
+        self.refresh_config()
+        self._share_network()
+        context = _get_context("spawn")
+        queue = context.Queue()
+        # the processes wait until everything is received, since what they send may refer to their memory
+        received = context.Event()
+        processes = [context.Process(target=_evaluate_shard, args=(
+            self, rank, num_processes, [_deepcopy(metric).reset() for metric in metrics], num_batches, queue, received
+        )) for rank in range(num_processes)]
+        for process in processes:
+            process.start()
+        try:
+            parts = {}
+            while len(parts) < num_processes:
+                try:
+                    rank, part = _ForkingPickler.loads(queue.get(timeout=1))
+                except _Empty:
+                    for rank, process in enumerate(processes):
+                        if rank not in parts and not process.is_alive():
+                            raise RuntimeError(f"Process {rank} exited with code {process.exitcode}.")
+                    continue
+                if isinstance(part, BaseException):
+                    raise RuntimeError(f"Process {rank} failed.") from part
+                parts[rank] = part
+        finally:
+            received.set()
+            for process in processes:
+                process.join()
+            queue.close()
+        for rank in range(num_processes):
+            shard_metrics, shard_epoch = parts[rank]
+            for metric, shard_metric in zip(metrics, shard_metrics):
+                metric.merge(shard_metric)
+            self._epoch += shard_epoch
+        return {metric.get_name(): metric.result() for metric in metrics}
+
+    def _share_network(self):
+        """
+        Prepare the network to be passed to other processes.
+        """
+        pass
+
+    def _prepare_process(self, num_processes: int):
+        """
+        Called in each process of `evaluate_parallel()` before evaluating.
+        :param num_processes: the number of processes
+        """
+        pass
 
     @abstractmethod
     def _test_one_batch(self, epoch: int, network: Any, data: _network.DataCompound) -> Any:
@@ -61,3 +189,21 @@ class Tester(object, metaclass=ABCMeta):
         :return: network output
         """
         raise NotImplementedError
+
+
+def _evaluate_shard(tester: Tester, rank: int, num_processes: int, metrics: list[_metrics.Metric], num_batches: int,
+                    queue: Any, received: Any):
+    try:
+        tester._prepare_process(num_processes)
+        tester._dataloader = tester.get_dataloader().shard(rank, num_processes, False)
+        start_epoch = tester.get_epoch()
+        tester.evaluate(metrics, num_batches)
+        # pickled here so that an error is reported instead of being lost in the feeder thread of the queue
+        message = _ForkingPickler.dumps((rank, (metrics, tester.get_epoch() - start_epoch)))
+    except BaseException as e:
+        try:
+            message = _ForkingPickler.dumps((rank, e))
+        except Exception:
+            message = _ForkingPickler.dumps((rank, RuntimeError(repr(e))))
+    queue.put(bytes(message))
+    received.wait()
@@ -0,0 +1,124 @@
+import numpy as _np
+from array import array as _array
+from time import perf_counter as _perf_counter
+from typing import Union
+
+
+class _PhaseStats(object):
+    """
+    Cumulative counters, a ring buffer of the latest durations and a histogram with power-of-2 microsecond buckets.
+    """
+    def __init__(self, window: int):
+        self.count: int = 0
+        self.total: float = 0
+        self.last: float = 0
+        self.window: _array = _array("d", [0]) * window
+        self.buckets: list[int] = [0] * 64
+
+    def record(self, duration: float):
+        self.window[self.count % len(self.window)] = duration
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        self.buckets[min(int(duration * 1e6).bit_length(), 63)] += 1
+
+    def latest(self) -> _np.ndarray:
+        return _np.array(self.window[:min(self.count, len(self.window))], dtype=_np.float64)
+
+
+class PhaseTimer(object):
+    """
+    Time the consecutive phases of each batch with a single clock reading per phase: `lap(phase)` charges the time
+        since the previous lap to `phase`, and `commit()` records the phases of the batch.
+    The statistics are only computed when asked for, so the hot path costs a clock reading and a few dict and array
+        operations per phase.
+    NOTICE: Operations on GPUs are asynchronous, so without synchronization their time is charged to the phase that
+        waits for them.
+    """
+    def __init__(self, window: int = 1024, enabled: bool = True):
+        """
+        :param window: the number of latest batches the percentiles are calculated over
+        :param enabled: whether to measure
+        """
+        if window < 1:
+            raise ValueError("`window` must be at least 1.")
+        self._window: int = window
+        self._enabled: bool = enabled
+        self._stats: dict[str, _PhaseStats] = {}
+        self._current: dict[str, float] = {}
+        self._last_time: float = _perf_counter()
+
+    def is_enabled(self) -> bool:
+        return self._enabled
+
+    def set_enabled(self, enabled: bool):
+        self._enabled = enabled
+        self.restart()
+
+    def restart(self):
+        """
+        Restart the clock and discard the phases that haven't been committed.
+        """
+        self._current = {}
+        self._last_time = _perf_counter()
+
+    def lap(self, phase: str):
+        """
+        :param phase: the phase that ends now
+        """
+        if not self._enabled:
+            return
+        now = _perf_counter()
+        self._current[phase] = self._current.get(phase, 0) + now - self._last_time
+        self._last_time = now
+
+    def commit(self) -> dict[str, float]:
+        """
+        Record the phases since the last commit as one batch.
+        :return: the seconds spent in each phase
+        """
+        current, self._current = self._current, {}
+        for phase, duration in current.items():
+            stats = self._stats.get(phase)
+            if stats is None:
+                stats = self._stats[phase] = _PhaseStats(self._window)
+            stats.record(duration)
+        return current
+
+    def phases(self) -> list[str]:
+        return list(self._stats.keys())
+
+    def summary(self) -> dict[str, dict[str, Union[int, float]]]:
+        """
+        :return: for each phase, the number of batches, the total and mean seconds of all of them, the seconds of the
+            last one and the percentiles of the latest `window` ones
+        """
+        summary = {}
+        for phase, stats in self._stats.items():
+            latest = stats.latest()
+            p50, p90, p99 = _np.percentile(latest, (50, 90, 99)).tolist()
+            summary[phase] = {
+                "count": stats.count,
+                "total": stats.total,
+                "mean": stats.total / stats.count,
+                "last": stats.last,
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "max": float(latest.max()),
+            }
+        return summary
+
+    def histogram(self, phase: str) -> list[tuple[float, int]]:
+        """
+        :param phase: the phase
+        :return: the upper bound in seconds and the number of batches of each non-empty bucket since the beginning
+        """
+        stats = self._stats.get(phase)
+        if stats is None:
+            return []
+        return [((1 << i) / 1e6, count) for i, count in enumerate(stats.buckets) if count > 0]
+
+    def clear(self):
+        self._stats = {}
+        self.restart()
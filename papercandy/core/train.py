@@ -1,22 +1,44 @@
-from typing import Union, Any
+import numpy as _np
+from array import array as _array
+from itertools import chain as _chain
+from os import PathLike
+from typing import Union, Any, Iterable, Iterator
+from typing_extensions import Self
 from copy import copy as _copy
 from abc import abstractmethod, ABCMeta
+from collections import deque as _deque
+from threading import Thread as _Thread, Condition as _Condition
 
 from papercandy import network as _network
-from papercandy.core import dataloader as _dl, config as _cfg
+from papercandy.core import dataloader as _dl, config as _cfg, timing as _timing, analytics as _analytics
 
 
 class TrainingMonitor(object):
+    # whether `on_updated()` needs the result compound when dispatched by an `AsyncMonitor`
+    requires_result: bool = False
+
     def on_updated(self, trainer, epoch: int, loss: float, result: _network.ResultCompound):
         """
         :param trainer: trainer object
         :type trainer: Trainer
         :param epoch: epoch number
         :param loss: loss value
+            NOTICE: When the trainer's `loss_sync_interval` is bigger than 1, this is the loss that hasn't been
+                synchronized (such as a tensor), converting which to a float forces a synchronization.
         :param result: result compound
         """
         pass
 
+    def on_losses_synchronized(self, trainer, epoch: int, losses: list[float]):
+        """
+        Called every time the pending losses are synchronized into the loss history.
+        :param trainer: trainer object
+        :type trainer: Trainer
+        :param epoch: epoch number of the last loss
+        :param losses: the losses just synchronized
+        """
+        pass
+
     def on_batch_finished(self, trainer, epoch: int):
         """
         :param trainer: trainer object
@@ -25,6 +47,29 @@ class TrainingMonitor(object):
         """
         pass
 
+    def on_optimizer_step(self, trainer, epoch: int, step: int):
+        """
+        Called after each optimizer step, which follows every batch unless the gradients are accumulated.
+        :param trainer: trainer object
+        :type trainer: Trainer
+        :param epoch: epoch number of the last (micro-)batch
+        :param step: the number of optimizer steps so far
+        """
+        pass
+
+    def on_timing(self, trainer, epoch: int, timings: dict[str, float]):
+        """
+        Called after each batch with the seconds spent in each phase of it, such as "data", "transfer", "forward",
+            "loss", "backward", "sync" (of the losses), "optimizer" and "monitor". Phases that didn't happen in the
+            batch are absent.
+        NOTICE: The time of this call is charged to the "monitor" phase of the next batch.
+        :param trainer: trainer object
+        :type trainer: Trainer
+        :param epoch: epoch number
+        :param timings: phase names and seconds
+        """
+        pass
+
     def on_finished(self, trainer, epoch: int):
         """
         :param trainer: trainer object
@@ -34,15 +79,293 @@ class TrainingMonitor(object):
         pass
 
 
+class AsyncMonitor(TrainingMonitor):
+    """
+    Dispatch the events to another monitor on a background thread through a bounded queue, so that slow monitors,
+        such as those writing files or drawing, don't stall the training.
+    The result compound is only passed (as a detached copy on the CPU) if the monitor sets `requires_result`,
+        otherwise None is passed.
+    When the queue is full, `policy` decides what happens to a per-batch event ("on_updated", "on_batch_finished",
+        "on_optimizer_step" or "on_timing"):
+        "block": wait until there's room;
+        "drop": drop the new event;
+        "coalesce": drop the oldest queued event of the same kind, so that the monitor catches up with the latest,
+            or the new event if there's none.
+    Unless the policy is "block", the losses of "on_losses_synchronized" are merged into the one queued instead of
+        waiting, so none of them is lost and the training isn't held up either.
+    Other events are never dropped, and `on_finished()` returns after the monitor has handled all the events.
+    NOTICE: The trainer keeps changing while the monitor reads it, so don't wrap monitors that need a consistent view
+        of it, such as `CheckpointMonitor`.
+    """
+    _droppable: frozenset[str] = frozenset(("on_updated", "on_batch_finished", "on_optimizer_step", "on_timing"))
+
+    def __init__(self, monitor: TrainingMonitor, max_size: int = 64, policy: str = "block"):
+        """
+        :param monitor: the monitor to dispatch the events to
+        :param max_size: the maximum number of events in the queue
+        :param policy: "block", "drop" or "coalesce"
+        """
+        if max_size < 1:
+            raise ValueError("`max_size` must be at least 1.")
+        if policy not in ("block", "drop", "coalesce"):
+            raise ValueError("`policy` must be one of \"block\", \"drop\" and \"coalesce\".")
+        self._monitor: TrainingMonitor = monitor
+        self._max_size: int = max_size
+        self._policy: str = policy
+        self._queue: _deque[tuple[Union[str, None], tuple]] = _deque()
+        self._condition: _Condition = _Condition()
+        self._thread: Union[_Thread, None] = None
+        self._busy: bool = False
+        self._error: Union[BaseException, None] = None
+        self._num_dropped: int = 0
+
+    def get_monitor(self) -> TrainingMonitor:
+        return self._monitor
+
+    def get_num_dropped(self) -> int:
+        """
+        :return: the number of events dropped or coalesced
+        """
+        return self._num_dropped
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _coalesce(self, name: str) -> bool:
+        for i, event in enumerate(self._queue):
+            if event[0] == name:
+                del self._queue[i]
+                self._num_dropped += 1
+                return True
+        return False
+
+    def _merge_losses(self, args: tuple) -> tuple:
+        """
+        :param args: the arguments of a new "on_losses_synchronized"
+        :return: the arguments with the losses of the latest queued one before them, which is removed from the queue
+        """
+        for i in range(len(self._queue) - 1, -1, -1):
+            event = self._queue[i]
+            if event[0] == "on_losses_synchronized":
+                del self._queue[i]
+                trainer, epoch, losses = args
+                return trainer, epoch, list(_chain(event[1][2], losses))
+        return args
+
+    def _put(self, name: str, args: tuple):
+        with self._condition:
+            self._raise_error()
+            if self._thread is None:
+                self._thread = _Thread(target=self._work, daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self._max_size and name == "on_losses_synchronized" and self._policy != "block":
+                # the latest position keeps the order of the events, and at most one of them exceeds `max_size`
+                self._queue.append((name, self._merge_losses(args)))
+                self._condition.notify_all()
+                return
+            while len(self._queue) >= self._max_size:
+                if name in self._droppable and self._policy == "drop":
+                    self._num_dropped += 1
+                    return
+                if name in self._droppable and self._policy == "coalesce":
+                    if self._coalesce(name):
+                        break
+                    self._num_dropped += 1
+                    return
+                self._condition.wait()
+            self._queue.append((name, args))
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while len(self._queue) == 0:
+                    self._condition.wait()
+                name, args = self._queue.popleft()
+                self._busy = name is not None
+                self._condition.notify_all()
+            if name is None:
+                return
+            try:
+                getattr(self._monitor, name)(*args)
+            except BaseException as e:
+                with self._condition:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def flush(self):
+        """
+        Wait until the monitor has handled all the events, and raise the first error it raised if any.
+        """
+        with self._condition:
+            while len(self._queue) > 0 or self._busy:
+                self._condition.wait()
+            self._raise_error()
+
+    def close(self):
+        """
+        Handle the rest of the events and stop the background thread. It restarts on the next event.
+        """
+        with self._condition:
+            if self._thread is None:
+                return
+            thread, self._thread = self._thread, None
+            # the sentinel is never dropped
+            self._queue.append((None, ()))
+            self._condition.notify_all()
+        thread.join()
+        with self._condition:
+            self._raise_error()
+
+    def on_updated(self, trainer, epoch: int, loss: float, result: _network.ResultCompound):
+        self._put("on_updated", (trainer, epoch, loss, result.detach() if self._monitor.requires_result else None))
+
+    def on_losses_synchronized(self, trainer, epoch: int, losses: list[float]):
+        self._put("on_losses_synchronized", (trainer, epoch, losses))
+
+    def on_batch_finished(self, trainer, epoch: int):
+        self._put("on_batch_finished", (trainer, epoch))
+
+    def on_optimizer_step(self, trainer, epoch: int, step: int):
+        self._put("on_optimizer_step", (trainer, epoch, step))
+
+    def on_timing(self, trainer, epoch: int, timings: dict[str, float]):
+        self._put("on_timing", (trainer, epoch, timings))
+
+    def on_finished(self, trainer, epoch: int):
+        self._put("on_finished", (trainer, epoch))
+        self.flush()
+
+
+class LossHistory(object):
+    """
+    A compact history of losses stored in an array of doubles instead of a list of floats. When `max_len` is given,
+        only the latest `max_len` losses are kept in a ring buffer, so the memory stays flat however long it runs.
+    """
+    def __init__(self, losses: Iterable[float] = (), max_len: Union[int, None] = None):
+        """
+        :param losses: initial losses
+        :param max_len: the maximum number of losses to keep, None for unbounded
+        """
+        if max_len is not None and max_len < 1:
+            raise ValueError("`max_len` must be at least 1.")
+        self._losses: _array = _array("d")
+        self._max_len: Union[int, None] = max_len
+        # the physical position of the oldest loss in the ring buffer
+        self._start: int = 0
+        self._num_seen: int = 0
+        self.extend(losses)
+
+    def __len__(self) -> int:
+        return len(self._losses)
+
+    def __iter__(self) -> Iterator[float]:
+        if self._start == 0:
+            return iter(self._losses)
+        return _chain(self._losses[self._start:], self._losses[:self._start])
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, list[float]]:
+        if isinstance(item, slice):
+            return self._ordered()[item].tolist()
+        length = len(self._losses)
+        if not -length <= item < length:
+            raise IndexError("Index out of range.")
+        return self._losses[(self._start + item % length) % length]
+
+    def __repr__(self) -> str:
+        return f"LossHistory({self.tolist()}, max_len={self._max_len})"
+
+    def _ordered(self) -> _array:
+        return self._losses if self._start == 0 else self._losses[self._start:] + self._losses[:self._start]
+
+    def append(self, loss: float):
+        if self._max_len is None or len(self._losses) < self._max_len:
+            self._losses.append(loss)
+        else:
+            self._losses[self._start] = loss
+            self._start = (self._start + 1) % self._max_len
+        self._num_seen += 1
+
+    def extend(self, losses: Iterable[float]):
+        if self._max_len is None:
+            length = len(self._losses)
+            self._losses.extend(losses)
+            self._num_seen += len(self._losses) - length
+            return
+        for loss in losses:
+            self.append(loss)
+
+    def clear(self):
+        self._losses = _array("d")
+        self._start = 0
+        self._num_seen = 0
+
+    def get_max_len(self) -> Union[int, None]:
+        return self._max_len
+
+    def get_num_seen(self) -> int:
+        """
+        :return: the number of losses ever appended, including those that have been dropped from the ring buffer
+        """
+        return self._num_seen
+
+    def tolist(self) -> list[float]:
+        return self._ordered().tolist()
+
+    def to_numpy(self) -> _np.ndarray:
+        """
+        :return: a copy of the losses from the oldest to the latest
+        """
+        return _np.array(self._ordered(), dtype=_np.float64)
+
+    def state(self) -> dict:
+        return {"losses": self.to_numpy(), "max_len": self._max_len, "num_seen": self._num_seen}
+
+    def load_state(self, state: dict) -> Self:
+        self._max_len = state["max_len"]
+        self.clear()
+        self.extend(state["losses"].tolist())
+        self._num_seen = state["num_seen"]
+        return self
+
+
 class Trainer(object, metaclass=ABCMeta):
-    def __init__(self, dataloader: _dl.Dataloader):
+    def __init__(self, dataloader: _dl.Dataloader, loss_sync_interval: int = 1, max_losses: Union[int, None] = None):
+        """
+        :param dataloader: dataloader
+        :param loss_sync_interval: the number of batches whose losses are synchronized together, bigger values avoid
+            the synchronization point on every batch at the cost of monitors getting unsynchronized losses
+        :param max_losses: the maximum number of losses to keep in the history, None for unbounded
+        """
+        if loss_sync_interval < 1:
+            raise ValueError("`loss_sync_interval` must be at least 1.")
         self._nc: Union[_network.NetworkC, None] = None
         self._lfc: Union[_network.LossFunctionC, None] = None
         self._oc: Union[_network.OptimizerC, None] = None
         self._config: _cfg.Config = _cfg.CONFIG().CURRENT
+        self._snapshot: _cfg.ConfigSnapshot = self._config.snapshot()
         self._dataloader: _dl.Dataloader = dataloader
         self._epoch: int = 0
-        self.losses: list[float] = []
+        self._step: int = 0
+        # the number of passes over the dataloader started, by which randomized samplers draw a new order
+        self._num_passes: int = 0
+        # the number of batches taken from the dataloader in the current pass
+        self._position: int = 0
+        # whether a call of `train()` is running, which is continued when resumed from a state taken meanwhile
+        self._in_progress: bool = False
+        self._resuming: bool = False
+        self._loss_sync_interval: int = loss_sync_interval
+        self._pending_losses: list[Any] = []
+        # the epoch of the last pending loss
+        self._pending_epoch: int = 0
+        self.losses: LossHistory = LossHistory(max_len=max_losses)
+        self._timer: _timing.PhaseTimer = _timing.PhaseTimer()
 
     def _check_requirements(self) -> bool:
         return self._config is not None and self._dataloader is not None and self._nc is not None \
@@ -56,14 +379,68 @@ class Trainer(object, metaclass=ABCMeta):
     def get_config(self) -> _cfg.Config:
         return self._config
 
+    def refresh_config(self) -> _cfg.ConfigSnapshot:
+        """
+        Take a new snapshot of the configuration. Call this after the configuration is changed in the middle of
+            training, otherwise the change only takes effect the next time `train()` is called.
+        :return: the new snapshot
+        """
+        self._snapshot = self._config.snapshot()
+        return self._snapshot
+
     def get_dataloader(self) -> _dl.Dataloader:
         return self._dataloader
 
     def get_epoch(self) -> int:
         return self._epoch
 
+    def get_step(self) -> int:
+        """
+        :return: the number of optimizer steps so far
+        """
+        return self._step
+
+    def get_num_passes(self) -> int:
+        """
+        :return: the number of passes over the dataloader started, each by a call of `train()` unless it resumes one
+        """
+        return self._num_passes
+
+    def get_position(self) -> int:
+        """
+        :return: the number of batches taken from the dataloader in the current (or last) call of `train()`
+        """
+        return self._position
+
+    def get_loss_sync_interval(self) -> int:
+        return self._loss_sync_interval
+
+    def get_timer(self) -> _timing.PhaseTimer:
+        return self._timer
+
+    def timing_summary(self) -> dict[str, dict[str, Union[int, float]]]:
+        """
+        :return: the statistics of the time spent in each phase of the batches, see `PhaseTimer.summary()`
+        """
+        return self._timer.summary()
+
+    def synchronize_losses(self, monitor: Union[TrainingMonitor, None] = None) -> list[float]:
+        """
+        Synchronize the pending losses into the loss history.
+        :param monitor: training monitor to notify
+        :return: the losses just synchronized
+        """
+        if len(self._pending_losses) < 1:
+            return []
+        losses = self._to_floats(self._pending_losses)
+        self._pending_losses = []
+        self.losses.extend(losses)
+        if monitor is not None:
+            monitor.on_losses_synchronized(self, self._pending_epoch, losses)
+        return losses
+
     def set_network(self, nc: _network.NetworkC):
-        if self._config.get_predefined("gpu_acceleration"):
+        if self.refresh_config().gpu_acceleration:
             nc = nc.gpu()
         self._nc = nc
 
@@ -71,7 +448,7 @@ class Trainer(object, metaclass=ABCMeta):
         return self._nc
 
     def set_loss_function(self, lfc: _network.LossFunctionC):
-        if self._config.get_predefined("gpu_acceleration"):
+        if self.refresh_config().gpu_acceleration:
             lfc = lfc.gpu()
         self._lfc = lfc
 
@@ -79,37 +456,152 @@ class Trainer(object, metaclass=ABCMeta):
         return self._lfc
 
     def set_optimizer(self, oc: _network.OptimizerC):
-        if self._config.get_predefined("gpu_acceleration"):
+        if self.refresh_config().gpu_acceleration:
             oc = oc.gpu()
         self._oc = oc
 
     def get_optimizer(self) -> Union[_network.OptimizerC, None]:
         return self._oc
 
-    def train(self, num_batches: int, monitor: TrainingMonitor = TrainingMonitor()):
+    def train(self, num_batches: int, monitor: TrainingMonitor = TrainingMonitor(), accumulation_steps: int = 1):
         """
         Train the network by traversing the dataloader until epoch reaches either `num_batches` or the length of the
             dataloader. Fill `num_batches` with an integer that is larger than the length of the dataloader if you want
             to go through the whole dataset.
-        NOTICE: When every time this method being called it'll start from the beginning of the dataloader.
+        NOTICE: When every time this method being called it'll start from the beginning of the dataloader, unless
+            the trainer has just been resumed from a checkpoint taken in the middle of a call.
         :param num_batches: the maximum number of batches
         :param monitor: training monitor
+        :param accumulation_steps: the number of (micro-)batches whose gradients are accumulated before each optimizer
+            step, which makes an effective batch `accumulation_steps` times larger without raising the peak memory
         """
+        if accumulation_steps < 1:
+            raise ValueError("`accumulation_steps` must be at least 1.")
         self._check_requirements_or_raise_err()
+        self.refresh_config()
+        if not self._resuming:
+            self._position = 0
+            self._num_passes += 1
+        self._resuming = False
+        self._in_progress = True
+        self._dataloader.set_epoch(self._num_passes - 1)
+        dataloader = iter(self._dataloader)
+        if self._position > 0:
+            dataloader.move_iter_pointer(self._position)
         local_epoch = 0
-        for data in self._dataloader:
+        timer = self._timer
+        timer.restart()
+        for data in dataloader:
             if local_epoch >= num_batches:
                 break
-            if self._config.get_predefined("gpu_acceleration"):
+            timer.lap("data")
+            if self._snapshot.gpu_acceleration:
                 data = data.gpu()
-            o, loss = self._train_one_batch(self._epoch, self._nc.get(), self._lfc.get(), self._oc.get(), data)
-            self.losses.append(loss)
+                timer.lap("transfer")
+            if accumulation_steps == 1:
+                o, loss = self._train_one_batch(self._epoch, self._nc.get(), self._lfc.get(), self._oc.get(), data)
+                # the implementation laps the phases before, if it does
+                timer.lap("optimizer")
+            else:
+                o, loss = self._accumulate_one_batch(self._epoch, self._nc.get(), self._lfc.get(), self._oc.get(),
+                                                     data, local_epoch % accumulation_steps == 0, accumulation_steps)
+                timer.lap("backward")
+            self._pending_losses.append(loss)
+            self._pending_epoch = self._epoch
+            if len(self._pending_losses) >= self._loss_sync_interval:
+                losses = self.synchronize_losses(monitor)
+                if self._loss_sync_interval == 1:
+                    loss = losses[0]
+                timer.lap("sync")
             monitor.on_updated(self, self._epoch, loss, _network.ResultCompound(data, o))
             monitor.on_batch_finished(self, self._epoch)
+            timer.lap("monitor")
             local_epoch += 1
             self._epoch += 1
+            self._position += 1
+            if accumulation_steps > 1 and local_epoch % accumulation_steps == 0:
+                self._step_optimizer(self._epoch - 1, self._nc.get(), self._oc.get(), accumulation_steps,
+                                     accumulation_steps)
+                timer.lap("optimizer")
+            if local_epoch % accumulation_steps == 0:
+                self._step += 1
+                monitor.on_optimizer_step(self, self._epoch - 1, self._step)
+                timer.lap("monitor")
+            if timer.is_enabled():
+                monitor.on_timing(self, self._epoch - 1, timer.commit())
+                timer.lap("monitor")
+        if local_epoch % accumulation_steps != 0:
+            # the rest of the micro-batches
+            self._step_optimizer(self._epoch - 1, self._nc.get(), self._oc.get(), local_epoch % accumulation_steps,
+                                 accumulation_steps)
+            self._step += 1
+            monitor.on_optimizer_step(self, self._epoch - 1, self._step)
+        self.synchronize_losses(monitor)
+        self._in_progress = False
         monitor.on_finished(self, self._epoch)
 
+    def state(self) -> dict:
+        """
+        Take a copy of everything needed to resume the training, which is not affected by further training.
+        NOTICE: Accumulated gradients are not included, so take it right after an optimizer step.
+        :return: the state
+        """
+        self._check_requirements_or_raise_err()
+        return {
+            "epoch": self._epoch,
+            "step": self._step,
+            "num_passes": self._num_passes,
+            "position": self._position,
+            "in_progress": self._in_progress,
+            # the seed of a randomized sampler, without which a resumed pass would go in another order
+            "dataloader": self._dataloader.state(),
+            "losses": self.losses.state(),
+            # synchronized without being moved into the history so that no monitor misses them
+            "pending_losses": self._to_floats(self._pending_losses) if len(self._pending_losses) > 0 else [],
+            "network": self._nc.state(),
+            "optimizer": self._oc.state(),
+        }
+
+    def load_state(self, state: dict) -> Self:
+        """
+        Restore a state taken by `state()`. If it was taken in the middle of a call of `train()`, the next call
+            continues from where it was taken, otherwise it starts from the beginning of the dataloader as the next
+            call would have done without the interruption.
+        :param state: the state
+        :return: self
+        """
+        self._check_requirements_or_raise_err()
+        self._nc.load_state(state["network"])
+        self._oc.load_state(state["optimizer"])
+        self._epoch = state["epoch"]
+        self._step = state["step"]
+        self._num_passes = state.get("num_passes", 1)
+        self._position = state["position"]
+        self._dataloader.load_state(state.get("dataloader", {}))
+        num_batches = self._dataloader.num_batches()
+        # a pass that has ended starts over anyway
+        self._resuming = state.get("in_progress", True) and (num_batches is None or self._position < num_batches)
+        self.losses.load_state(state["losses"])
+        self.losses.extend(state["pending_losses"])
+        self._pending_losses = []
+        return self
+
+    def resume(self, filename: Union[str, PathLike]) -> Self:
+        """
+        Restore the trainer from a checkpoint written by a checkpoint manager.
+        NOTICE: The network, the loss function and the optimizer must be set before.
+        :param filename: the checkpoint
+        :return: self
+        """
+        return self.load_state(self._read_checkpoint(filename))
+
+    def _read_checkpoint(self, filename: Union[str, PathLike]) -> dict:
+        """
+        :param filename: the checkpoint
+        :return: the state
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def _train_one_batch(self, epoch: int, network: Any, loss_function: Any, optimizer: Any,
                          data: _network.DataCompound) -> [Any, float]:
@@ -119,47 +611,92 @@ class Trainer(object, metaclass=ABCMeta):
         :param loss_function: loss function (not container)
         :param optimizer: optimizer (not container)
         :param data: data batch
-        :return: {network output, loss}
+        :return: {network output, loss (a float or anything `_to_floats()` accepts)}
+        """
+        raise NotImplementedError
+
+    def _to_floats(self, losses: list[Any]) -> list[float]:
+        """
+        Convert the losses returned by `_train_one_batch()` into floats. Override this to synchronize them at once.
+        :param losses: losses
+        :return: losses as floats
+        """
+        return [float(loss) for loss in losses]
+
+    def _accumulate_one_batch(self, epoch: int, network: Any, loss_function: Any, optimizer: Any,
+                              data: _network.DataCompound, first: bool, accumulation_steps: int) -> [Any, float]:
+        """
+        Calculate the gradients of a micro-batch and add them to the accumulated gradients without stepping.
+        :param epoch: global epoch
+        :param network: network (not container)
+        :param loss_function: loss function (not container)
+        :param optimizer: optimizer (not container)
+        :param data: data batch
+        :param first: whether this is the first micro-batch after an optimizer step, which clears the gradients
+        :param accumulation_steps: the number of micro-batches per optimizer step, by which the loss is divided
+        :return: {network output, loss (not divided)}
+        """
+        raise NotImplementedError
+
+    def _step_optimizer(self, epoch: int, network: Any, optimizer: Any, num_micro_batches: int,
+                        accumulation_steps: int):
+        """
+        Step the optimizer with the accumulated gradients.
+        :param epoch: global epoch of the last micro-batch
+        :param network: network (not container)
+        :param optimizer: optimizer (not container)
+        :param num_micro_batches: the number of micro-batches accumulated, which is smaller than `accumulation_steps`
+            only for the rest at the end of training
+        :param accumulation_steps: the number of micro-batches per optimizer step
         """
         raise NotImplementedError
 
 
 class TrainerDataUtils(object, metaclass=ABCMeta):
     @staticmethod
-    def vibration(losses: list) -> bool:
-        if len(losses) == 2:
-            return losses[1] > losses[0]
-        if all(x > y for x, y in zip(losses, losses[1:])):
-            return False
-        new_losses = []
-        for i in range(0, len(losses), 2):
-            new_losses.append(0.5 * sum(losses[i: i + 2]))
-        return TrainerDataUtils.vibration(new_losses)
+    def vibration(losses: Union[list[float], LossHistory, _np.ndarray]) -> bool:
+        return _analytics.vibration(losses)
 
     @staticmethod
-    def analyse(trainer: Trainer) -> dict:
-        length = len(trainer.losses)
-        if length < 20:
-            raise RuntimeError("Samples not enough to analyse.")
-        min_loss = min(trainer.losses)
-        max_loss = max(trainer.losses)
-        average_loss = sum(trainer.losses) / length
-        vibration = TrainerDataUtils.vibration(trainer.losses[:round(length * 0.1)])
+    def analyse(trainer: Trainer, window: int = 100) -> dict:
+        """
+        :param trainer: the trainer
+        :param window: the number of latest losses the trend is calculated over
+        :return: the statistics of the losses
+        """
+        losses = _analytics.as_array(trainer.losses)
+        length = len(losses)
+        if length < 1:
+            raise RuntimeError("No loss to analyse.")
+        min_loss = float(losses.min())
+        max_loss = float(losses.max())
+        average_loss = float(losses.mean())
+        vibration = TrainerDataUtils.vibration(losses[:max(round(length * 0.1), 2)])
+        slope = _analytics.slope(losses[-window:])
         print(f"Loss: {round(min_loss, 2)}~{round(max_loss, 2)}({round(average_loss, 2)} on average)\n"
               f"Vibration: {vibration}")
         return {
             "min_loss": min_loss,
             "max_loss": max_loss,
             "average_loss": average_loss,
+            "std": float(losses.std()),
+            "ema": float(_analytics.ema(losses)[-1]),
+            "slope": slope,
             "vibration": vibration,
         }
 
     @staticmethod
-    def limit_losses(trainer: Trainer, n: float) -> Trainer:
+    def _with_losses(trainer: Trainer, losses: _np.ndarray) -> Trainer:
         trainer = _copy(trainer)
-        trainer.losses = [i for i in trainer.losses if i <= n]
+        max_len = trainer.losses.get_max_len() if isinstance(trainer.losses, LossHistory) else None
+        trainer.losses = LossHistory(losses.tolist(), max_len)
         return trainer
 
+    @staticmethod
+    def limit_losses(trainer: Trainer, n: float) -> Trainer:
+        losses = _analytics.as_array(trainer.losses)
+        return TrainerDataUtils._with_losses(trainer, losses[losses <= n])
+
     @staticmethod
     def scale_losses(trainer: Trainer, ratio: float) -> Trainer:
         """
@@ -168,22 +705,13 @@ class TrainerDataUtils(object, metaclass=ABCMeta):
         :param ratio: the proportion
         :return: another edited object
         """
-        trainer = _copy(trainer)
         if ratio > 1:
             raise ValueError("Not expandable, which means `ratio` cannot be bigger than 1.")
         if ratio <= 0:
             raise ValueError("`ratio` cannot be negative.")
-        ratio = ratio * 2
-        if ratio < 1:
-            ratio = 1 / ratio
-        ratio = round(ratio)
-        g_size = ratio + 1
-        if ratio < 1:
-            for i in range(len(trainer.losses) // g_size):
-                trainer.losses.pop(ratio - i + i * g_size)
-        else:
-            trainer.losses = trainer.losses[::g_size]
-        return trainer
+        losses = _analytics.as_array(trainer.losses)
+        return TrainerDataUtils._with_losses(trainer, losses[_analytics.stride(len(losses),
+                                                                               round(len(losses) * (1 - ratio)))])
 
     @staticmethod
     def remove_losses(trainer: Trainer, n: int) -> Trainer:
@@ -194,3 +722,13 @@ class TrainerDataUtils(object, metaclass=ABCMeta):
         :return: another edited object
         """
         return TrainerDataUtils.scale_losses(trainer, n / len(trainer.losses))
+
+    @staticmethod
+    def downsample(trainer: Trainer, num_points: int) -> Trainer:
+        """
+        Replace the losses with the averages of at most `num_points` groups of consecutive losses.
+        :param trainer: the object to be operated
+        :param num_points: the maximum number of losses left
+        :return: another edited object
+        """
+        return TrainerDataUtils._with_losses(trainer, _analytics.downsample(trainer.losses, num_points)[1])
@@ -1,8 +1,16 @@
-from typing import Union
+import torch as _torch
+import numpy as _np
 from abc import ABCMeta
+from copy import copy as _copy
+from json import dumps as _dumps, loads as _loads
 from typing_extensions import Self
-from torch import Tensor as _Tensor
-from os import listdir as _listdir, PathLike
+from typing import Union, Any, Sequence
+from mmap import mmap as _mmap, ACCESS_COPY as _ACCESS_COPY
+from os import listdir as _listdir, replace as _replace, PathLike
+from torch import Tensor as _Tensor, stack as _stack, empty as _empty, full as _full, as_tensor as _as_tensor, \
+    save as _save, load as _load, seed as _seed
+# registers the reductions that pass shared tensors to other processes by handle
+from torch import multiprocessing as _multiprocessing
 
 
 from papercandy import network as _network
@@ -10,25 +18,202 @@ from papercandy.core import dataloader as _dataloader
 
 
 Dataset = _dataloader.Dataset
+StreamingDataset = _dataloader.StreamingDataset
+LatencyDataset = _dataloader.LatencyDataset
+DatasetView = _dataloader.DatasetView
+ConcatDataset = _dataloader.ConcatDataset
+
+
+def collate(samples: Sequence[Any], out: Any = None) -> Any:
+    """
+    Stack the samples into a batch along a new first dimension. Tensors are copied straight into the output buffer
+        with their dtypes kept. Tuples (including named tuples), lists and dicts are collated element-wise, and Python
+        numbers become a 1-D tensor.
+    :param samples: samples that share the same structure
+    :param out: a preallocated batch of the same structure to write into, None for a new one
+    :return: the batch
+    """
+    if len(samples) < 1:
+        raise ValueError("There must be at least one sample.")
+    first = samples[0]
+    if isinstance(first, _Tensor):
+        return _stack(samples) if out is None else _stack(samples, out=out)
+    if isinstance(first, dict):
+        return {key: collate([sample[key] for sample in samples], None if out is None else out[key])
+                for key in first}
+    if isinstance(first, tuple) and hasattr(first, "_fields"):
+        return first.__class__(*(collate([sample[i] for sample in samples], None if out is None else out[i])
+                                 for i in range(len(first))))
+    if isinstance(first, (tuple, list)):
+        return first.__class__(collate([sample[i] for sample in samples], None if out is None else out[i])
+                               for i in range(len(first)))
+    if isinstance(first, (bool, int, float)):
+        return _as_tensor(samples) if out is None else out.copy_(_as_tensor(samples))
+    raise TypeError(f"No known case for type {type(first)}.")
+
+
+def pad_collate(samples: Sequence[Any], padding_value: Union[int, float] = 0) -> Any:
+    """
+    Stack the samples into a batch like `collate()`, but tensors of different shapes are padded at the end of each
+        dimension to the largest size in the batch.
+    :param samples: samples that share the same structure
+    :param padding_value: the value to pad with
+    :return: the batch
+    """
+    if len(samples) < 1:
+        raise ValueError("There must be at least one sample.")
+    first = samples[0]
+    if isinstance(first, _Tensor):
+        shape = tuple(max(sizes) for sizes in zip(*(sample.shape for sample in samples)))
+        if all(sample.shape == shape for sample in samples):
+            return _stack(samples)
+        out = _full((len(samples), *shape), padding_value, dtype=first.dtype, device=first.device)
+        for i, sample in enumerate(samples):
+            out[(i, *(slice(0, size) for size in sample.shape))] = sample
+        return out
+    if isinstance(first, dict):
+        return {key: pad_collate([sample[key] for sample in samples], padding_value) for key in first}
+    if isinstance(first, tuple) and hasattr(first, "_fields"):
+        return first.__class__(*(pad_collate([sample[i] for sample in samples], padding_value)
+                                 for i in range(len(first))))
+    if isinstance(first, (tuple, list)):
+        return first.__class__(pad_collate([sample[i] for sample in samples], padding_value)
+                               for i in range(len(first)))
+    return collate(samples)
+
+
+def allocate(template: Any, size: int, shared: bool = False) -> Any:
+    """
+    Allocate an uninitialized batch for samples that have the same structure as the template.
+    :param template: a single sample
+    :param size: the number of samples
+    :param shared: whether to allocate the tensors in the shared memory
+    :return: the batch
+    """
+    if isinstance(template, _Tensor):
+        buffer = _empty((size, *template.shape), dtype=template.dtype)
+        return buffer.share_memory_() if shared else buffer
+    if isinstance(template, dict):
+        return {key: allocate(val, size, shared) for key, val in template.items()}
+    if isinstance(template, tuple) and hasattr(template, "_fields"):
+        return template.__class__(*(allocate(val, size, shared) for val in template))
+    if isinstance(template, (tuple, list)):
+        return template.__class__(allocate(val, size, shared) for val in template)
+    if isinstance(template, (bool, int, float)):
+        return allocate(_as_tensor(template), size, shared)
+    raise TypeError(f"No known case for type {type(template)}.")
+
+
+def write(buffer: Any, i: int, sample: Any):
+    """
+    Write a sample into a batch allocated by `allocate()`.
+    :param buffer: the batch
+    :param i: the position in the batch
+    :param sample: the sample
+    """
+    if isinstance(buffer, dict):
+        for key, val in buffer.items():
+            write(val, i, sample[key])
+    elif isinstance(buffer, (tuple, list)):
+        for j, val in enumerate(buffer):
+            write(val, i, sample[j])
+    elif isinstance(sample, _Tensor):
+        buffer[i].copy_(sample)
+    else:
+        buffer[i] = sample
 
 
 class Dataloader(_dataloader.Dataloader):
     @staticmethod
     def combine_batch(data_batch: list[_network.DataCompound]) -> _network.DataCompound:
-        d_list, t_list = [], []
-        for dc in data_batch:
-            d, t = dc.unpack()
-            d, t = d.tolist(), t.tolist()
-            d_list.append(d)
-            t_list.append(t)
-        return _network.DataCompound(_Tensor(d_list), _Tensor(t_list))
+        return _network.DataCompound(collate([dc.data for dc in data_batch]),
+                                     collate([dc.target for dc in data_batch]))
+
+    def allocate_shared_batch(self, template: _network.DataCompound, size: int) -> _network.DataCompound:
+        return _network.DataCompound(allocate(template.data, size, True), allocate(template.target, size, True))
+
+    @staticmethod
+    def write_shared_sample(buffer: _network.DataCompound, i: int, sample: _network.DataCompound):
+        write(buffer.data, i, sample.data)
+        write(buffer.target, i, sample.target)
+
+    @staticmethod
+    def wrap_shared_batch(buffer: _network.DataCompound) -> _network.DataCompound:
+        return buffer
 
 
 class PreprocessedDataloader(_dataloader.PreprocessedDataloader, metaclass=ABCMeta):
+    """
+    To vectorize the preprocessing, override `preprocess_batch()`, stack the original items with `combine_batch()`,
+        work on the whole batch and turn the result back into single items with `split_batch()`.
+    """
     @staticmethod
     def combine_batch(data_batch: list[_network.DataCompound]) -> _network.DataCompound:
         return Dataloader.combine_batch(data_batch)
 
+    @staticmethod
+    def split_batch(batch: _network.DataCompound) -> list[_network.DataCompound]:
+        """
+        Split a batch into single items that view the batch without copying.
+        :param batch: a data compound of a batch of tensors
+        :return: a list of single items
+        """
+        return [_network.DataCompound(d, t) for d, t in zip(batch.data.unbind(), batch.target.unbind())]
+
+    def allocate_shared_batch(self, template: _network.DataCompound, size: int) -> _network.DataCompound:
+        return Dataloader.allocate_shared_batch(self, template, size)
+
+    @staticmethod
+    def write_shared_sample(buffer: _network.DataCompound, i: int, sample: _network.DataCompound):
+        Dataloader.write_shared_sample(buffer, i, sample)
+
+    @staticmethod
+    def wrap_shared_batch(buffer: _network.DataCompound) -> _network.DataCompound:
+        return Dataloader.wrap_shared_batch(buffer)
+
+
+def sizeof(obj: Any) -> int:
+    """
+    :param obj: a tensor or a structure of tensors
+    :return: the number of bytes the tensors take
+    """
+    if isinstance(obj, _Tensor):
+        return obj.element_size() * obj.nelement()
+    if isinstance(obj, dict):
+        return sum(sizeof(val) for val in obj.values())
+    if isinstance(obj, (tuple, list)):
+        return sum(sizeof(val) for val in obj)
+    return 0
+
+
+class CachedDataset(_dataloader.CachedDataset):
+    def sizeof(self, item: _network.DataCompound) -> int:
+        return sizeof(item.data) + sizeof(item.target)
+
+    def dump(self, item: _network.DataCompound, filename: Union[str, PathLike]):
+        _save((item.data, item.target), filename)
+
+    def load(self, filename: Union[str, PathLike]) -> _network.DataCompound:
+        return _network.DataCompound(*_load(filename))
+
+
+class BucketingDataloader(_dataloader.BucketingDataloader):
+    """
+    Items are padded with 0 inside each batch. Override `combine_batch()` with another `padding_value` of
+        `pad_collate()` if needed.
+    """
+    @staticmethod
+    def combine_batch(data_batch: list[_network.DataCompound]) -> _network.DataCompound:
+        return _network.DataCompound(pad_collate([dc.data for dc in data_batch]),
+                                     pad_collate([dc.target for dc in data_batch]))
+
+
+class StreamingDataloader(_dataloader.StreamingDataloader):
+    @staticmethod
+    def seed_worker():
+        _dataloader.StreamingDataloader.seed_worker()
+        _seed()
+
 
 class ExampleDataset(Dataset):
     def __init__(self, src: Union[str, PathLike]):
@@ -39,10 +224,125 @@ class ExampleDataset(Dataset):
         return len(self.file_list)
 
     def cut(self, i: slice) -> Self:
-        o = ExampleDataset(self.src)
-        o.file_list = self.file_list[i]
-        return o
+        return DatasetView(self, range(len(self))[i])
 
     def get(self, i: int) -> _network.DataCompound:
         with open("%s/%s" % (self.src, self.file_list[i]), "r") as f:
             return _network.DataCompound(_Tensor([int(self.file_list[i][:-4])]), _Tensor(eval(f.read())))
+
+
+class PackedDataset(Dataset):
+    """
+    A dataset packed into a binary data file "{filename}.bin" and an offset index "{filename}.idx" by
+        `pack_dataset()`. The data file is memory-mapped and every item is returned as tensors viewing the mapping
+        without copying, and cutting only narrows the range of indexes.
+    NOTICE: The mapping is copy-on-write, so writing to the returned tensors never changes the file.
+    """
+    def __init__(self, filename: Union[str, PathLike]):
+        self.filename: Union[str, PathLike] = filename
+        # opened lazily so that the dataset can be passed to the worker processes
+        self._index: Union[_np.ndarray, None] = None
+        self._mm: Union[_mmap, None] = None
+        with open(f"{filename}.bin", "rb") as f:
+            header = _loads(f.read(int.from_bytes(f.read(8), "little")))
+        self._data_dtype: _torch.dtype = getattr(_torch, header["data_dtype"])
+        self._target_dtype: _torch.dtype = getattr(_torch, header["target_dtype"])
+        self._data_ndim: int = header["data_ndim"]
+        self._range: range = range(len(self._get_index()))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_index"] = None
+        state["_mm"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self._range)
+
+    def _get_index(self) -> _np.ndarray:
+        if self._index is None:
+            self._index = _np.load(f"{self.filename}.idx", mmap_mode="r")
+        return self._index
+
+    def _get_mm(self) -> _mmap:
+        if self._mm is None:
+            with open(f"{self.filename}.bin", "rb") as f:
+                self._mm = _mmap(f.fileno(), 0, access=_ACCESS_COPY)
+        return self._mm
+
+    def _view(self, offset: int, shape: Sequence[int], dtype: _torch.dtype) -> _Tensor:
+        numel = int(_np.prod(shape))
+        if numel == 0:
+            return _empty(tuple(shape), dtype=dtype)
+        return _torch.frombuffer(self._get_mm(), dtype=dtype, count=numel, offset=offset).view(tuple(shape))
+
+    def cut(self, i: slice) -> Self:
+        o = _copy(self)
+        o._range = self._range[i]
+        return o
+
+    def get(self, i: int) -> _network.DataCompound:
+        # [data offset, target offset, *data shape, *target shape]
+        row = self._get_index()[self._range[i]].tolist()
+        shape_split = 2 + self._data_ndim
+        return _network.DataCompound(self._view(row[0], row[2: shape_split], self._data_dtype),
+                                     self._view(row[1], row[shape_split:], self._target_dtype))
+
+
+def pack_dataset(dataset: Dataset, filename: Union[str, PathLike], alignment: int = 64) -> PackedDataset:
+    """
+    Pack a dataset into the format of `PackedDataset`.
+    NOTICE: The data and the target of each item must be tensors, and their dtypes and numbers of dimensions must be
+        the same throughout the dataset.
+    :param dataset: the dataset
+    :param filename: the filename without extension
+    :param alignment: the byte alignment of each tensor in the data file
+    :return: the packed dataset
+    """
+    length = len(dataset)
+    if length < 1:
+        raise ValueError("`dataset` cannot be empty.")
+    first = dataset[0]
+    data_dtype, target_dtype = first.data.dtype, first.target.dtype
+    data_ndim, target_ndim = first.data.dim(), first.target.dim()
+    header = _dumps({
+        "data_dtype": str(data_dtype).split(".")[-1],
+        "target_dtype": str(target_dtype).split(".")[-1],
+        "data_ndim": data_ndim,
+        "target_ndim": target_ndim,
+    }).encode()
+    index = _np.empty((length, 2 + data_ndim + target_ndim), dtype=_np.int64)
+
+    def write_tensor(f, t: _Tensor) -> int:
+        offset = f.tell()
+        offset += -offset % alignment
+        f.seek(offset)
+        f.write(t.contiguous().reshape(-1).view(_torch.uint8).numpy().tobytes())
+        return offset
+
+    with open(f"{filename}.bin.tmp", "wb") as f:
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for i in range(length):
+            d, t = first.unpack() if i == 0 else dataset[i].unpack()
+            if d.dtype != data_dtype or t.dtype != target_dtype or d.dim() != data_ndim or t.dim() != target_ndim:
+                raise TypeError(f"Item {i} doesn't match the dtypes or the numbers of dimensions of item 0.")
+            index[i, 0] = write_tensor(f, d.cpu())
+            index[i, 1] = write_tensor(f, t.cpu())
+            index[i, 2: 2 + data_ndim] = d.shape
+            index[i, 2 + data_ndim:] = t.shape
+    with open(f"{filename}.idx.tmp", "wb") as f:
+        _np.save(f, index)
+    _replace(f"{filename}.bin.tmp", f"{filename}.bin")
+    _replace(f"{filename}.idx.tmp", f"{filename}.idx")
+    return PackedDataset(filename)
+
+
+def pack_directory(src: Union[str, PathLike], filename: Union[str, PathLike]) -> PackedDataset:
+    """
+    Convert a directory in the format of `ExampleDataset` into a packed dataset.
+    :param src: the directory
+    :param filename: the filename without extension
+    :return: the packed dataset
+    """
+    return pack_dataset(ExampleDataset(src), filename)
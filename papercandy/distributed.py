@@ -0,0 +1,152 @@
+from os import environ as _environ, cpu_count as _cpu_count
+from socket import socket as _socket
+from typing import Any, Union, Callable
+from typing_extensions import Self
+from torch import Tensor as _Tensor, stack as _stack, cat as _cat, zeros_like as _zeros_like, no_grad as _no_grad, \
+    set_num_threads as _set_num_threads
+from torch import distributed as _dist, multiprocessing as _multiprocessing
+from torch.nn import Module as _Module
+from torch.optim import Optimizer as _Optimizer
+
+from papercandy import network as _network, train as _train
+from papercandy.core import dataloader as _dl
+
+
+def _free_port() -> int:
+    with _socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run(rank: int, fn: Callable[..., Any], world_size: int, args: tuple, master_addr: str, master_port: int,
+         num_threads: int):
+    _environ["MASTER_ADDR"] = master_addr
+    _environ["MASTER_PORT"] = str(master_port)
+    _set_num_threads(num_threads)
+    _dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        _dist.destroy_process_group()
+
+
+def launch(fn: Callable[..., Any], world_size: int, *args, master_addr: str = "127.0.0.1",
+           master_port: Union[int, None] = None, num_threads: Union[int, None] = None):
+    """
+    Run `fn(rank, world_size, *args)` in `world_size` local processes joined in a gloo process group, and wait for
+        all of them. Everything, including the dataloader and the network, should be built inside `fn`.
+    NOTICE: `fn` must be defined at the top level of a module, and the call must be guarded by
+        `if __name__ == "__main__"` since the processes are spawned.
+    :param fn: the function to run
+    :param world_size: the number of processes
+    :param args: more arguments passed to `fn`
+    :param master_addr: the address of rank 0
+    :param master_port: the port of rank 0, None for a free one
+    :param num_threads: the number of intra-op threads of each process, None for the cores divided evenly
+    """
+    if world_size < 1:
+        raise ValueError("`world_size` must be at least 1.")
+    if master_port is None:
+        master_port = _free_port()
+    if num_threads is None:
+        num_threads = max(1, (_cpu_count() or 1) // world_size)
+    _multiprocessing.spawn(_run, (fn, world_size, args, master_addr, master_port, num_threads), nprocs=world_size)
+
+
+def get_rank() -> int:
+    return _dist.get_rank() if _dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    return _dist.get_world_size() if _dist.is_initialized() else 1
+
+
+class DataParallelTrainer(_train.Trainer):
+    """
+    Each process trains a replica of the network on its own shard of the dataloader. The gradients are averaged
+        among the processes before every optimizer step, so the replicas stay identical. The loss history is
+        averaged among the processes as well, and the monitor is only called in rank 0.
+    NOTICE: Create it inside the function passed to `launch()`.
+    """
+    def __init__(self, dataloader: _dl.Dataloader, loss_sync_interval: int = 1, max_losses: Union[int, None] = None,
+                 shard: bool = True):
+        """
+        :param dataloader: the whole dataloader, the same in all the processes
+        :param loss_sync_interval: see `Trainer`
+        :param max_losses: see `Trainer`
+        :param shard: whether to shard the dataloader by rank, False if it's been sharded
+        """
+        if not _dist.is_initialized():
+            raise RuntimeError("The process group hasn't been initialized, see `launch()`.")
+        self._rank: int = _dist.get_rank()
+        self._world_size: int = _dist.get_world_size()
+        if shard:
+            dataloader = dataloader.shard(self._rank, self._world_size)
+        super(DataParallelTrainer, self).__init__(dataloader, loss_sync_interval, max_losses)
+        # the all-reduces of the pending losses, which are issued without waiting
+        self._loss_works: list = []
+
+    def get_rank(self) -> int:
+        return self._rank
+
+    def get_world_size(self) -> int:
+        return self._world_size
+
+    def set_network(self, nc: _network.NetworkC):
+        super(DataParallelTrainer, self).set_network(nc)
+        # start from the same weights as rank 0
+        with _no_grad():
+            for tensor in list(self._nc.get().parameters()) + list(self._nc.get().buffers()):
+                _dist.broadcast(tensor, 0)
+
+    def train(self, num_batches: int, monitor: _train.TrainingMonitor = _train.TrainingMonitor(),
+              accumulation_steps: int = 1):
+        super(DataParallelTrainer, self).train(num_batches, monitor if self._rank == 0 else _train.TrainingMonitor(),
+                                               accumulation_steps)
+
+    def _accumulate_one_batch(self, epoch: int, network: _Module, loss_function: _Module, optimizer: _Optimizer,
+                              data: _network.DataCompound, first: bool, accumulation_steps: int) -> [Any, float]:
+        output, current_loss = super(DataParallelTrainer, self)._accumulate_one_batch(
+            epoch, network, loss_function, optimizer, data, first, accumulation_steps
+        )
+        current_loss = current_loss.clone()
+        self._loss_works.append(_dist.all_reduce(current_loss, async_op=True))
+        return output, current_loss
+
+    def _step_optimizer(self, epoch: int, network: _Module, optimizer: _Optimizer, num_micro_batches: int,
+                        accumulation_steps: int):
+        params = [param for group in optimizer.param_groups for param in group["params"] if param.requires_grad]
+        for param in params:
+            if param.grad is None:
+                param.grad = _zeros_like(param)
+        if len(params) > 0:
+            # a single all-reduce for all the gradients
+            flat = _cat([param.grad.reshape(-1) for param in params])
+            _dist.all_reduce(flat)
+            flat /= self._world_size
+            offset = 0
+            for param in params:
+                param.grad.copy_(flat[offset: offset + param.grad.numel()].view_as(param.grad))
+                offset += param.grad.numel()
+            self._timer.lap("all_reduce")
+        super(DataParallelTrainer, self)._step_optimizer(epoch, network, optimizer, num_micro_batches,
+                                                         accumulation_steps)
+
+    def _to_floats(self, losses: list[Any]) -> list[float]:
+        # only waits for the all-reduces issued, so this is safe to call in rank 0 alone
+        for work in self._loss_works:
+            work.wait()
+        self._loss_works = []
+        if all(isinstance(loss, _Tensor) for loss in losses):
+            return (_stack(losses) / self._world_size).cpu().tolist()
+        return super(DataParallelTrainer, self)._to_floats(losses)
+
+    def state(self) -> dict:
+        state = super(DataParallelTrainer, self).state()
+        state["world_size"] = self._world_size
+        return state
+
+    def load_state(self, state: dict) -> Self:
+        if state.get("world_size", self._world_size) != self._world_size:
+            raise ValueError("The checkpoint was taken with another world size, so the shards don't match.")
+        return super(DataParallelTrainer, self).load_state(state)
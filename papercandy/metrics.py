@@ -0,0 +1,125 @@
+from typing import Union
+from typing_extensions import Self
+from torch import Tensor as _Tensor, zeros as _zeros, bincount as _bincount, int64 as _int64, float64 as _float64
+
+from papercandy.core import metrics as _metrics
+
+Metric = _metrics.Metric
+AverageMetric = _metrics.AverageMetric
+
+
+def _predictions(output: _Tensor, threshold: float) -> _Tensor:
+    """
+    :param output: scores of shape (N, C), or (N,) and (N, 1) for binary classification
+    :param threshold: the threshold of the binary scores
+    :return: predicted classes of shape (N,)
+    """
+    if output.dim() == 1 or output.shape[-1] == 1:
+        return (output.reshape(-1) > threshold).long()
+    return output.argmax(dim=-1)
+
+
+def _labels(target: _Tensor, output: _Tensor) -> _Tensor:
+    """
+    :param target: classes of shape (N,) or (N, 1), or one-hot targets of the same shape as `output`
+    :param output: scores
+    :return: classes of shape (N,)
+    """
+    if target.dim() > 1 and target.shape == output.shape and target.shape[-1] > 1:
+        return target.argmax(dim=-1)
+    return target.reshape(-1).long()
+
+
+def _errors(output: _Tensor, target: _Tensor) -> _Tensor:
+    """
+    :param output: outputs
+    :param target: targets of the same shape or the same number of elements, such as (N,) for outputs of shape (N, 1)
+    :return: the differences in float64
+    """
+    if target.shape != output.shape:
+        if target.numel() != output.numel():
+            raise ValueError(f"The shape of the target {tuple(target.shape)} doesn't match that of the output "
+                             f"{tuple(output.shape)}.")
+        target = target.reshape(output.shape)
+    return output.to(_float64) - target.to(_float64)
+
+
+class Accuracy(AverageMetric):
+    def __init__(self, threshold: float = 0, name: str = "accuracy"):
+        """
+        :param threshold: the threshold of binary scores, 0 for logits and 0.5 for probabilities
+        :param name: the name of the metric
+        """
+        super(Accuracy, self).__init__(name)
+        self._threshold: float = threshold
+
+    def _sum_and_count(self, output: _Tensor, target: _Tensor) -> tuple[float, int]:
+        correct = _predictions(output, self._threshold) == _labels(target, output)
+        return int(correct.sum()), correct.numel()
+
+
+class TopKAccuracy(AverageMetric):
+    def __init__(self, k: int = 5, name: Union[str, None] = None):
+        if k < 1:
+            raise ValueError("`k` must be at least 1.")
+        super(TopKAccuracy, self).__init__(f"top_{k}_accuracy" if name is None else name)
+        self._k: int = k
+
+    def _sum_and_count(self, output: _Tensor, target: _Tensor) -> tuple[float, int]:
+        top_k = output.topk(min(self._k, output.shape[-1]), dim=-1).indices
+        correct = (top_k == _labels(target, output).unsqueeze(-1)).any(dim=-1)
+        return int(correct.sum()), correct.numel()
+
+
+class MeanSquaredError(AverageMetric):
+    def __init__(self, name: str = "mse"):
+        super(MeanSquaredError, self).__init__(name)
+
+    def _sum_and_count(self, output: _Tensor, target: _Tensor) -> tuple[float, int]:
+        return float(_errors(output, target).square().sum()), output.numel()
+
+
+class MeanAbsoluteError(AverageMetric):
+    def __init__(self, name: str = "mae"):
+        super(MeanAbsoluteError, self).__init__(name)
+
+    def _sum_and_count(self, output: _Tensor, target: _Tensor) -> tuple[float, int]:
+        return float(_errors(output, target).abs().sum()), output.numel()
+
+
+class ConfusionMatrix(Metric):
+    """
+    The result is a matrix of shape (num_classes, num_classes) on the CPU in which the element (i, j) is the number
+        of samples of class i predicted as class j.
+    """
+    def __init__(self, num_classes: int, threshold: float = 0, name: str = "confusion_matrix"):
+        """
+        :param num_classes: the number of classes, 2 for binary classification
+        :param threshold: the threshold of binary scores, 0 for logits and 0.5 for probabilities
+        :param name: the name of the metric
+        """
+        if num_classes < 2:
+            raise ValueError("`num_classes` must be at least 2.")
+        super(ConfusionMatrix, self).__init__(name)
+        self._num_classes: int = num_classes
+        self._threshold: float = threshold
+        self._matrix: _Tensor = _zeros(num_classes, num_classes, dtype=_int64)
+
+    def update(self, output: _Tensor, target: _Tensor) -> Self:
+        n = self._num_classes
+        counts = _bincount(_labels(target, output) * n + _predictions(output, self._threshold), minlength=n * n)
+        self._matrix += counts.cpu().reshape(n, n)
+        return self
+
+    def merge(self, other: Self) -> Self:
+        if not isinstance(other, ConfusionMatrix) or other._num_classes != self._num_classes:
+            raise TypeError("Only a ConfusionMatrix of the same number of classes can be merged.")
+        self._matrix += other._matrix
+        return self
+
+    def result(self) -> _Tensor:
+        return self._matrix.clone()
+
+    def reset(self) -> Self:
+        self._matrix.zero_()
+        return self
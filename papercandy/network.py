@@ -1,22 +1,41 @@
 from os import PathLike
-from typing import Union
-from copy import copy as _copy
+from io import BytesIO as _BytesIO
+from typing import Union, Any
+from copy import copy as _copy, deepcopy as _deepcopy
 from typing_extensions import Self
 from torch.nn import Module as _Module
 from torch.nn import modules as _modules
 from torch.optim import Optimizer as _Optimizer
-from torch import Tensor as _Tensor, save as _save, load as _load
+from torch import Tensor as _Tensor, save as _save, load as _load, dtype as _dtype, qint8 as _qint8, \
+    ScriptObject as _ScriptObject
+from torch.serialization import safe_globals as _safe_globals
 
 from papercandy.core import network as _network, config as _config
 
 
+def cpu_copy(obj: Any) -> Any:
+    """
+    Copy all the tensors in a (nested) structure of dicts, lists and tuples to the CPU.
+    :param obj: the structure, such as a state dict
+    :return: a copy that shares no tensor with the original one
+    """
+    if isinstance(obj, _Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return obj.__class__((key, cpu_copy(val)) for key, val in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return obj.__class__(cpu_copy(val) for val in obj)
+    return obj
+
+
 class DataCompound(_network.DataCompound):
     def __init__(self, data: _Tensor, target: _Tensor):
         super(DataCompound, self).__init__(data, target, d_type=_Tensor)
 
     def gpu(self) -> Self:
         o = _copy(self)
-        o.data, o.target = self.data.cuda(device=_config.CONFIG().CURRENT.get_predefined("device")), self.target.cuda(device=_config.CONFIG().CURRENT.get_predefined("device"))
+        device = _config.current_snapshot().device
+        o.data, o.target = self.data.cuda(device=device), self.target.cuda(device=device)
         return o
 
     def cpu(self) -> Self:
@@ -24,6 +43,11 @@ class DataCompound(_network.DataCompound):
         o.data, o.target = self.data.cpu(), self.target.cpu()
         return o
 
+    def detach(self) -> Self:
+        o = _copy(self)
+        o.data, o.target = cpu_copy(self.data), cpu_copy(self.target)
+        return o
+
     def unpack(self) -> [_Tensor, _Tensor]:
         return super(DataCompound, self).unpack()
 
@@ -34,7 +58,7 @@ class ResultCompound(_network.ResultCompound):
 
     def gpu(self) -> Self:
         o = _copy(self)
-        o.input_data, o.output = self.input_data.gpu(), self.output.cuda(device=_config.CONFIG().CURRENT.get_predefined("device"))
+        o.input_data, o.output = self.input_data.gpu(), self.output.cuda(device=_config.current_snapshot().device)
         return o
 
     def cpu(self) -> Self:
@@ -42,6 +66,11 @@ class ResultCompound(_network.ResultCompound):
         o.input_data, o.output = self.input_data.cpu(), self.output.cpu()
         return o
 
+    def detach(self) -> Self:
+        o = _copy(self)
+        o.input_data, o.output = self.input_data.detach(), cpu_copy(self.output)
+        return o
+
     def unpack(self) -> [_network.DataCompound, _Tensor]:
         return super(ResultCompound, self).unpack()
 
@@ -56,7 +85,7 @@ class NetworkC(_network.NetworkC):
 
     def gpu(self) -> Self:
         o = _copy(self)
-        o._network = self._network.cuda(device=_config.CONFIG().CURRENT.get_predefined("device"))
+        o._network = self._network.cuda(device=_config.current_snapshot().device)
         return o
 
     def cpu(self) -> Self:
@@ -74,6 +103,29 @@ class NetworkC(_network.NetworkC):
         self._network.load_state_dict(_load(filename))
         return self
 
+    def state(self) -> dict:
+        return cpu_copy(self._network.state_dict())
+
+    def load_state(self, state: dict) -> Self:
+        self._network.load_state_dict(state)
+        return self
+
+    def quantize(self, layers: tuple[type[_Module], ...] = (_modules.Linear, _modules.LSTM),
+                 dtype: _dtype = _qint8) -> "QuantizedNetworkC":
+        """
+        Make a copy for inference on the CPU in which the weights of `layers` are quantized ahead of time and the
+            activations are quantized dynamically. The network itself is left unchanged.
+        To load a saved quantized network, quantize a float network of the same structure first and load into the
+            result, such as `NetworkC(network).quantize().load(filename)`.
+        :param layers: the types of the layers to quantize
+        :param dtype: the type of the quantized weights, `torch.qint8` or `torch.float16`
+        :return: the quantized network
+        """
+        # deprecated in favor of torchao, so only imported when used
+        from torch.ao.quantization import quantize_dynamic as _quantize_dynamic
+        network = _deepcopy(self._network).cpu().eval()
+        return QuantizedNetworkC(_quantize_dynamic(network, set(layers), dtype))
+
     def structure(self) -> LayerInfoList:
         lil = LayerInfoList()
         for val in self._network.__dict__["_modules"].values():
@@ -116,13 +168,37 @@ class NetworkC(_network.NetworkC):
         return None
 
 
+class QuantizedNetworkC(NetworkC):
+    """
+    A network made by `NetworkC.quantize()`, which only runs on the CPU.
+    """
+    def gpu(self) -> Self:
+        raise RuntimeError("Quantized networks only run on the CPU.")
+
+    def __getstate__(self) -> dict:
+        # the packed weights can't be passed to other processes through shared memory, so they're copied as bytes,
+        #   which is cheap in int8
+        buffer = _BytesIO()
+        _save(self._network, buffer)
+        return {"_network": buffer.getvalue()}
+
+    def __setstate__(self, state: dict):
+        # written by `__getstate__()` of the same program
+        self._network = _load(_BytesIO(state["_network"]), weights_only=False)
+
+    def load(self, filename: Union[str, PathLike]) -> Self:
+        # the packed weights, such as those of LSTMs, are script objects, which aren't allowed by default
+        with _safe_globals([_ScriptObject]):
+            return super(QuantizedNetworkC, self).load(filename)
+
+
 class LossFunctionC(_network.LossFunctionC):
     def __init__(self, loss_function: _Module):
         self._loss_function: _Module = loss_function
 
     def gpu(self) -> Self:
         o = _copy(self)
-        o._loss_function = self._loss_function.cuda(device=_config.CONFIG().CURRENT.get_predefined("device"))
+        o._loss_function = self._loss_function.cuda(device=_config.current_snapshot().device)
         return o
 
     def cpu(self) -> Self:
@@ -153,3 +229,10 @@ class OptimizerC(_network.OptimizerC):
     def load(self, filename: Union[str, PathLike]) -> Self:
         self._optimizer.load_state_dict(_load(filename))
         return self
+
+    def state(self) -> dict:
+        return cpu_copy(self._optimizer.state_dict())
+
+    def load_state(self, state: dict) -> Self:
+        self._optimizer.load_state_dict(state)
+        return self
@@ -0,0 +1,10 @@
+from papercandy.core import sampler as _sampler
+
+
+Sampler = _sampler.Sampler
+SequentialSampler = _sampler.SequentialSampler
+RandomSampler = _sampler.RandomSampler
+WeightedSampler = _sampler.WeightedSampler
+ShardedSampler = _sampler.ShardedSampler
+SlicedSampler = _sampler.SlicedSampler
+IndexSampler = _sampler.IndexSampler
@@ -1,11 +1,201 @@
-from typing import Any
-from torch import no_grad as _no_grad
+from os import cpu_count as _cpu_count
+from time import perf_counter as _perf_counter
+from copy import deepcopy as _deepcopy
+from typing import Any, Union, Callable, Sequence
+from itertools import islice as _islice
+from torch import no_grad as _no_grad, inference_mode as _inference_mode, set_num_threads as _set_num_threads, \
+    jit as _jit, cuda as _cuda, Tensor as _Tensor
+# registers the reductions that pass tensors through shared memory
+from torch import multiprocessing as _multiprocessing
+from torch.nn import Module as _Module
 
 from papercandy import network as _network
-from papercandy.core import test as _test
+from papercandy.core import test as _test, dataloader as _dl, metrics as _metrics
 
 
 class Tester(_test.Tester):
+    def _share_network(self):
+        # the packed weights of quantized networks can't be shared, see `QuantizedNetworkC.__getstate__()`
+        if isinstance(self._nc, _network.QuantizedNetworkC):
+            return
+        # CUDA tensors are shared anyway
+        self._nc.get().share_memory()
+
+    def _prepare_process(self, num_processes: int):
+        _set_num_threads(max(1, (_cpu_count() or 1) // num_processes))
+
     def _test_one_batch(self, epoch: int, network: Any, data: _network.DataCompound) -> Any:
         with _no_grad():
             return network(data.data)
+
+
+class InferenceTester(Tester):
+    """
+    Test in `torch.inference_mode()` with the network in eval mode, which is restored when the testing finishes.
+    Optionally, the network is compiled with TorchScript on the first batch, frozen and optimized for inference,
+        and the compiled graph is reused for the later batches.
+    NOTICE: The outputs are inference tensors, which can't be used in autograd. A traced graph only records the path
+        taken by the first batch, and a frozen graph holds a copy of the weights, so call `clear_compiled()` after
+        the network is changed in place.
+    """
+    def __init__(self, dataloader: _dl.Dataloader, jit: Union[str, None] = None):
+        """
+        :param dataloader: the dataloader
+        :param jit: "trace", "script" or None not to compile
+        """
+        if jit not in (None, "trace", "script"):
+            raise ValueError("`jit` must be \"trace\", \"script\" or None.")
+        super(InferenceTester, self).__init__(dataloader)
+        self._jit: Union[str, None] = jit
+        # the network and its compiled graph
+        self._compiled: Union[tuple[_Module, Any], None] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # the compiled graph can't be pickled, so other processes compile their own
+        state["_compiled"] = None
+        return state
+
+    def get_jit(self) -> Union[str, None]:
+        return self._jit
+
+    def set_network(self, nc: _network.NetworkC):
+        super(InferenceTester, self).set_network(nc)
+        self.clear_compiled()
+
+    def clear_compiled(self):
+        """
+        Discard the compiled graph, so that the network is compiled again on the next batch.
+        """
+        self._compiled = None
+
+    def _stream(self, num_batches: int):
+        network = self._nc.get()
+        training = network.training
+        network.eval()
+        try:
+            yield from super(InferenceTester, self)._stream(num_batches)
+        finally:
+            network.train(training)
+
+    def _compile(self, network: _Module, data: Any) -> Any:
+        with _no_grad():
+            compiled = _jit.trace(network, data) if self._jit == "trace" else _jit.script(network)
+        return _jit.optimize_for_inference(_jit.freeze(compiled.eval()))
+
+    def _test_one_batch(self, epoch: int, network: Any, data: _network.DataCompound) -> Any:
+        if self._jit is not None:
+            if self._compiled is None or self._compiled[0] is not network:
+                self._compiled = (network, self._compile(network, data.data))
+            network = self._compiled[1]
+        with _inference_mode():
+            return network(data.data)
+
+    def compare_with_eager(self, num_batches: int = 10, repeat: int = 3) -> dict[str, float]:
+        """
+        Time the same batches in eager mode (`no_grad()` as `Tester` does) and in the optimized mode. The first
+            pass of each mode is a warm-up that isn't timed, which includes the compilation.
+        :param num_batches: the number of batches taken from the dataloader
+        :param repeat: the number of timed passes of each mode, of which the fastest is taken
+        :return: the seconds per batch of each mode, the speedup and the maximum absolute difference of the outputs
+        """
+        if repeat < 1:
+            raise ValueError("`repeat` must be at least 1.")
+        self._check_requirements_and_raise_exception()
+        self.refresh_config()
+        batches = list(_islice(self._dataloader, num_batches))
+        if len(batches) == 0:
+            raise ValueError("The dataloader is empty.")
+        if self._snapshot.gpu_acceleration:
+            batches = [data.gpu() for data in batches]
+        network = self._nc.get()
+        training = network.training
+        network.eval()
+        try:
+            synchronize = self._snapshot.gpu_acceleration
+            eager_outputs, eager = _time_batches(
+                lambda data: Tester._test_one_batch(self, self._epoch, network, data), batches, repeat, synchronize
+            )
+            outputs, optimized = _time_batches(lambda data: self._test_one_batch(self._epoch, network, data),
+                                               batches, repeat, synchronize)
+        finally:
+            network.train(training)
+        return {
+            "eager": eager / len(batches),
+            "optimized": optimized / len(batches),
+            "speedup": eager / optimized,
+            "max_abs_diff": _max_abs_diff(eager_outputs, outputs),
+        }
+
+
+def _time_batches(fn: Callable[[_network.DataCompound], Any], batches: list[_network.DataCompound], repeat: int,
+                  synchronize: bool) -> tuple[list, float]:
+    """
+    :param fn: the function that calculates the output of a batch
+    :param batches: batches
+    :param repeat: the number of timed passes after a warm-up pass
+    :param synchronize: whether to wait for the GPU before reading the clock
+    :return: the outputs of the warm-up pass and the seconds of the fastest pass
+    """
+    outputs = [fn(data) for data in batches]
+    best = None
+    for _ in range(repeat):
+        if synchronize:
+            _cuda.synchronize()
+        start = _perf_counter()
+        for data in batches:
+            fn(data)
+        if synchronize:
+            _cuda.synchronize()
+        duration = _perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return outputs, best
+
+
+def _max_abs_diff(outputs: list[_Tensor], other_outputs: list[_Tensor]) -> float:
+    return max(float((a.float() - b.float()).abs().max()) if a.numel() > 0 else 0
+               for a, b in zip(outputs, other_outputs))
+
+
+def compare_quantized(nc: _network.NetworkC, quantized: _network.QuantizedNetworkC, dataloader: _dl.Dataloader,
+                      metrics: Sequence[_metrics.Metric] = (), num_batches: int = 10,
+                      repeat: int = 3) -> dict[str, Any]:
+    """
+    Run the float network and its quantized copy (see `NetworkC.quantize()`) on the same batches on the CPU.
+    :param nc: the float network
+    :param quantized: the quantized network
+    :param dataloader: the dataloader
+    :param metrics: metrics, which are copied for each network, so they are left unchanged
+    :param num_batches: the number of batches taken from the dataloader
+    :param repeat: the number of timed passes of each network, of which the fastest is taken
+    :return: the seconds per batch and the metric results of each network ("float" and "quantized"), the speedup,
+        the maximum absolute difference of the outputs and the change of each metric ("delta")
+    """
+    if repeat < 1:
+        raise ValueError("`repeat` must be at least 1.")
+    batches = [data.cpu() for data in _islice(dataloader, num_batches)]
+    if len(batches) == 0:
+        raise ValueError("The dataloader is empty.")
+    report = {}
+    all_outputs = []
+    for name, network in (("float", nc.get()), ("quantized", quantized.get())):
+        if any(param.is_cuda for param in network.parameters()):
+            network = _deepcopy(network).cpu()
+        training = network.training
+        network.eval()
+        try:
+            with _inference_mode():
+                outputs, duration = _time_batches(lambda data: network(data.data), batches, repeat, False)
+        finally:
+            network.train(training)
+        copies = [_deepcopy(metric).reset() for metric in metrics]
+        for output, data in zip(outputs, batches):
+            for metric in copies:
+                metric.update(output, data.target)
+        report[name] = {"latency": duration / len(batches), **{m.get_name(): m.result() for m in copies}}
+        all_outputs.append(outputs)
+    report["speedup"] = report["float"]["latency"] / report["quantized"]["latency"]
+    report["max_abs_diff"] = _max_abs_diff(*all_outputs)
+    report["delta"] = {m.get_name(): report["quantized"][m.get_name()] - report["float"][m.get_name()]
+                       for m in metrics}
+    return report
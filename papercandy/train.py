@@ -1,26 +1,66 @@
-from typing import Any
+from os import PathLike
+from typing import Any, Union
+from torch import Tensor as _Tensor, stack as _stack
 from torch.nn import Module as _Module
+from torch.optim import Optimizer as _Optimizer
 
-from papercandy import network as _network
+from papercandy import network as _network, checkpoint as _checkpoint
 from papercandy.core import train as _train
 
+LossHistory = _train.LossHistory
+AsyncMonitor = _train.AsyncMonitor
+
 
 class Trainer(_train.Trainer):
-    def _train_one_batch(self, epoch: int, network: _Module, loss_function: _Module, optimizer: _Module,
+    def _train_one_batch(self, epoch: int, network: _Module, loss_function: _Module, optimizer: _Optimizer,
                          data: _network.DataCompound) -> [Any, float]:
-        optimizer.zero_grad()
+        output, current_loss = self._accumulate_one_batch(epoch, network, loss_function, optimizer, data, True, 1)
+        self._step_optimizer(epoch, network, optimizer, 1, 1)
+        return output, current_loss
+
+    def _accumulate_one_batch(self, epoch: int, network: _Module, loss_function: _Module, optimizer: _Optimizer,
+                              data: _network.DataCompound, first: bool, accumulation_steps: int) -> [Any, float]:
+        if first:
+            optimizer.zero_grad()
         output = network(data.data)
+        self._timer.lap("forward")
         current_loss = loss_function(output, data.target)
-        current_loss.backward()
+        self._timer.lap("loss")
+        (current_loss / accumulation_steps if accumulation_steps > 1 else current_loss).backward()
+        self._timer.lap("backward")
+        return output, current_loss.detach()
+
+    def _step_optimizer(self, epoch: int, network: _Module, optimizer: _Optimizer, num_micro_batches: int,
+                        accumulation_steps: int):
+        if num_micro_batches != accumulation_steps:
+            # the loss was divided by more micro-batches than there were
+            for group in optimizer.param_groups:
+                for param in group["params"]:
+                    if param.grad is not None:
+                        param.grad.mul_(accumulation_steps / num_micro_batches)
         optimizer.step()
-        return output, current_loss.item()
+
+    def _to_floats(self, losses: list[Any]) -> list[float]:
+        if all(isinstance(loss, _Tensor) for loss in losses):
+            # one synchronization for all the losses
+            return _stack(losses).cpu().tolist()
+        return super(Trainer, self)._to_floats(losses)
+
+    def _read_checkpoint(self, filename: Union[str, PathLike]) -> dict:
+        return _checkpoint.load_checkpoint(filename)
 
 
 class TrainingMonitor(_train.TrainingMonitor):
     def on_updated(self, trainer: Trainer, epoch: int, loss: float, result: _network.ResultCompound): pass
 
+    def on_losses_synchronized(self, trainer: Trainer, epoch: int, losses: list[float]): pass
+
     def on_batch_finished(self, trainer: Trainer, epoch: int): pass
 
+    def on_optimizer_step(self, trainer: Trainer, epoch: int, step: int): pass
+
+    def on_timing(self, trainer: Trainer, epoch: int, timings: dict[str, float]): pass
+
     def on_finished(self, trainer: Trainer, epoch: int): pass
 
 
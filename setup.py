@@ -13,5 +13,5 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/ATATC/PaperCandy",
     packages=setuptools.find_packages(),
-    install_requires=["torch", "opencv-python", "matplotlib"],
+    install_requires=["torch", "numpy", "opencv-python", "matplotlib"],
 )
@@ -0,0 +1,61 @@
+import pytest
+import torch
+from torch import nn
+
+from papercandy import CONFIG, Dataset, DatasetView, DataCompound, Dataloader, Trainer, NetworkC, LossFunctionC, \
+    OptimizerC
+
+
+class TensorDataset(Dataset):
+    def __init__(self, n: int = 64):
+        g = torch.Generator().manual_seed(0)
+        self.x = torch.randn(n, 4, generator=g)
+        self.y = (self.x.sum(1, keepdim=True) > 0).float()
+
+    def __len__(self):
+        return len(self.x)
+
+    def cut(self, i):
+        return DatasetView(self, range(len(self))[i])
+
+    def get(self, i):
+        return DataCompound(self.x[i], self.y[i])
+
+
+def build_trainer(dataloader=None, trainer_class=Trainer, **trainer_kwargs):
+    torch.manual_seed(0)
+    if dataloader is None:
+        dataloader = Dataloader(TensorDataset(), batch_size=8)
+    trainer = trainer_class(dataloader, **trainer_kwargs)
+    network = nn.Sequential(nn.Linear(4, 8), nn.ReLU(), nn.Linear(8, 1))
+    trainer.set_network(NetworkC(network))
+    trainer.set_loss_function(LossFunctionC(nn.BCEWithLogitsLoss()))
+    trainer.set_optimizer(OptimizerC(torch.optim.SGD(network.parameters(), lr=0.1)))
+    return trainer
+
+
+def parameters(trainer) -> list[torch.Tensor]:
+    return [p.detach().clone() for p in trainer.get_network().get().parameters()]
+
+
+@pytest.fixture
+def dataset() -> TensorDataset:
+    return TensorDataset()
+
+
+class LSTMNetwork(nn.Module):
+    def __init__(self):
+        super(LSTMNetwork, self).__init__()
+        self.lstm = nn.LSTM(4, 16, batch_first=True)
+        self.fc = nn.Linear(16, 1)
+
+    def forward(self, x):
+        return self.fc(self.lstm(x.unsqueeze(1))[0][:, -1])
+
+
+@pytest.fixture
+def config():
+    config = CONFIG().CURRENT
+    original = config.get("gpu_acceleration")
+    yield config
+    config.set("gpu_acceleration", original)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from papercandy import LossTracker
+from papercandy.core import analytics
+
+
+@pytest.fixture
+def losses() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return np.exp(-np.arange(2000) / 500) + rng.normal(0, 0.01, 2000)
+
+
+def test_ema_matches_the_recurrence(losses):
+    expected = [losses[0]]
+    for loss in losses[1:]:
+        expected.append(0.99 * expected[-1] + 0.01 * loss)
+    assert analytics.ema(losses, 0.99) == pytest.approx(expected)
+
+
+def test_slope_and_downsample(losses):
+    assert analytics.slope(losses) == pytest.approx(np.polyfit(np.arange(len(losses)), losses, 1)[0])
+    steps, averages = analytics.downsample(losses, 7)
+    assert len(steps) == 7 and averages.mean() == pytest.approx(losses.mean(), rel=1e-2)
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_loss_tracker_matches_numpy(losses, batched):
+    tracker = LossTracker(0.99, window=100)
+    if batched:
+        for chunk in np.array_split(losses, 13):
+            tracker.extend(chunk)
+    else:
+        for loss in losses:
+            tracker.update(loss)
+    assert tracker.count == len(losses)
+    assert tracker.mean == pytest.approx(losses.mean())
+    assert tracker.std() == pytest.approx(losses.std())
+    assert (tracker.min, tracker.max) == (losses.min(), losses.max())
+    assert tracker.ema == pytest.approx(analytics.ema(losses, 0.99)[-1])
+    assert tracker.slope() == pytest.approx(analytics.slope(losses[-100:]))
+    assert tracker.trend() == "decreasing"
@@ -0,0 +1,51 @@
+import pytest
+import torch
+
+from papercandy import CheckpointManager, CheckpointMonitor, Dataloader, RandomSampler
+from conftest import TensorDataset, build_trainer, parameters
+
+
+def assert_same_parameters(a, b):
+    assert all(torch.equal(x, y) for x, y in zip(parameters(a), parameters(b)))
+
+
+@pytest.mark.parametrize("first_batches", [8, 3])
+def test_resume_from_final_checkpoint(tmp_path, first_batches):
+    uninterrupted = build_trainer()
+    uninterrupted.train(first_batches)
+    uninterrupted.train(8)
+
+    with CheckpointManager(tmp_path) as manager:
+        build_trainer().train(first_batches, CheckpointMonitor(manager, interval=1000))
+        resumed = build_trainer().resume(manager.latest())
+    resumed.train(8)
+    assert resumed.get_epoch() == uninterrupted.get_epoch()
+    assert_same_parameters(resumed, uninterrupted)
+
+
+def test_resume_in_the_middle(tmp_path):
+    uninterrupted = build_trainer()
+    uninterrupted.train(8)
+
+    with CheckpointManager(tmp_path, keep_last=0) as manager:
+        build_trainer().train(8, CheckpointMonitor(manager, interval=5))
+        resumed = build_trainer().resume(manager.list()[0])
+    assert resumed.get_position() == 5
+    resumed.train(3)
+    assert_same_parameters(resumed, uninterrupted)
+    assert list(resumed.losses) == list(uninterrupted.losses)
+
+
+def test_resume_in_the_middle_of_a_random_order(tmp_path):
+    def random_trainer():
+        # a new seed in every process
+        return build_trainer(Dataloader(TensorDataset(), batch_size=8, sampler=RandomSampler(64)))
+
+    with CheckpointManager(tmp_path, keep_last=0) as manager:
+        interrupted = random_trainer()
+        interrupted.train(8)
+        interrupted.train(8, CheckpointMonitor(manager, interval=13))
+        resumed = random_trainer().resume(manager.list()[0])
+    resumed.train(3)
+    assert resumed.get_num_passes() == 2
+    assert list(resumed.losses) == list(interrupted.losses)
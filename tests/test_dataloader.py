@@ -0,0 +1,523 @@
+import gc
+import time
+import pickle
+from threading import Event
+from collections import namedtuple
+
+import numpy as np
+import pytest
+import torch
+
+from papercandy import Dataset, DatasetView, DataCompound, Dataloader, CachedDataset, BucketingDataloader, \
+    pad_collate, collate, StreamingDataset, StreamingDataloader, PackedDataset, pack_dataset, pack_directory, \
+    PreprocessedDataloader, ConcatDataset
+from papercandy.core import dataloader as core_dataloader
+from papercandy.core.dataloader import WorkerPool, EventLoopThread
+from conftest import TensorDataset
+
+
+def wait_until_stopped(processes, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while any(process.is_alive() for process in processes):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_dataloader_stops_workers_in_with_block(dataset):
+    with Dataloader(dataset, batch_size=8, num_works=2) as dataloader:
+        next(iter(dataloader))
+        pool = dataloader._pool
+        processes = list(pool.get()._pool)
+    assert not pool.is_started()
+    assert wait_until_stopped(processes)
+
+
+def test_worker_pool_stops_when_collected():
+    pool = WorkerPool(2)
+    processes = list(pool.get()._pool)
+    del pool
+    gc.collect()
+    assert wait_until_stopped(processes)
+
+
+async def _double(x):
+    return 2 * x
+
+
+def test_event_loop_stops_when_collected():
+    event_loop = EventLoopThread(2)
+    assert event_loop.run_all([_double(1), _double(2)]) == [2, 4]
+    thread, loop = event_loop._thread, event_loop._loop
+    del event_loop
+    gc.collect()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert loop.is_closed()
+
+
+def test_event_loop_stops_in_with_block():
+    with EventLoopThread(2) as event_loop:
+        event_loop.run_all([_double(1)])
+        thread = event_loop._thread
+    assert not thread.is_alive()
+
+
+def test_cached_dataset_releases_memory_tier(dataset):
+    cached = CachedDataset(dataset)
+    view = cached[:32]
+    view.get(0)
+    identity = cached.get_identity()
+    del cached
+    gc.collect()
+    # the view still holds the dataset
+    assert view.dataset.stats()["items"] == 1
+    del view
+    gc.collect()
+    assert identity not in core_dataloader._memory_tiers
+
+
+def test_cached_dataset_clear(dataset):
+    cached = CachedDataset(dataset)
+    cached.get(0)
+    cached.get(0)
+    cached.clear()
+    assert cached.stats() == {"hits": 0, "disk_hits": 0, "misses": 0, "items": 0, "bytes": 0}
+
+
+class SequenceDataset(Dataset):
+    """Item i is a sequence of `lengths[i]` copies of i + 1, with i as its target."""
+
+    def __init__(self, lengths):
+        self.lengths = list(lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def cut(self, i):
+        return DatasetView(self, range(len(self))[i])
+
+    def get(self, i):
+        return DataCompound(torch.full((self.lengths[i],), i + 1), torch.tensor(i))
+
+
+LENGTHS = [(7 * i) % 13 + 1 for i in range(60)]
+
+
+def batch_items(dataloader) -> list[list[int]]:
+    return [batch.target.tolist() for batch in dataloader]
+
+
+def test_bucketing_slice_survives_set_epoch():
+    dataloader = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, shuffle=True, seed=0)
+    sliced = dataloader[0:2]
+    sliced.set_epoch(5)
+    assert sliced.num_batches() == 2
+    assert batch_items(sliced) == batch_items(dataloader.set_epoch(5))[0:2]
+    # shards and slices are applied again in the order they were taken
+    sharded = dataloader.set_epoch(0)[1:].shard(0, 2).set_epoch(5)
+    assert batch_items(sharded) == batch_items(dataloader.set_epoch(5))[1:][0::2][:sharded.num_batches()]
+
+
+def test_bucketing_packs_within_the_bounds():
+    dataloader = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, batch_size=5)
+    batches = list(dataloader)
+    assert sorted(i for batch in batches for i in batch.target.tolist()) == list(range(len(LENGTHS)))
+    for batch in batches:
+        items = batch.target.tolist()
+        assert len(items) <= 5
+        assert max(LENGTHS[i] for i in items) * len(items) <= 32
+        # padded to the longest item in the batch
+        assert batch.data.shape == (len(items), max(LENGTHS[i] for i in items))
+
+
+def test_bucketing_item_longer_than_the_budget_forms_its_own_batch():
+    lengths = [3, 3, 40, 3]
+    batches = batch_items(BucketingDataloader(SequenceDataset(lengths), lengths, max_tokens=12))
+    assert [2] in batches
+    assert sorted(i for batch in batches for i in batch) == [0, 1, 2, 3]
+
+
+def test_bucketing_order_is_stable():
+    items = [i for batch in batch_items(BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32))
+             for i in batch]
+    # sorted by length, and equal lengths keep the dataset order
+    assert items == sorted(range(len(LENGTHS)), key=lambda i: LENGTHS[i])
+
+
+def test_bucketing_shuffles_inside_buckets():
+    def load(seed):
+        return batch_items(BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, shuffle=True,
+                                               seed=seed, bucket_width=4))
+
+    batches = load(0)
+    for batch in batches:
+        buckets = [LENGTHS[i] // 4 for i in batch]
+        assert buckets == sorted(buckets)
+    assert load(0) == batches
+    assert load(1) != batches
+
+
+def test_bucketing_pads_with_zeros():
+    lengths = [1, 3]
+    batch = next(iter(BucketingDataloader(SequenceDataset(lengths), lengths, max_tokens=8)))
+    assert batch.data.tolist() == [[1, 0, 0], [2, 2, 2]]
+    assert batch.data.dtype == torch.int64
+    assert batch.target.tolist() == [0, 1]
+
+
+def test_pad_collate_pads_every_dimension():
+    samples = [{"x": torch.ones(1, 3), "n": 1}, {"x": torch.ones(2, 2), "n": 2}]
+    batch = pad_collate(samples, padding_value=-1)
+    assert batch["x"].tolist() == [[[1, 1, 1], [-1, -1, -1]], [[1, 1, -1], [1, 1, -1]]]
+    assert batch["n"].tolist() == [1, 2]
+
+
+@pytest.mark.parametrize("even", [True, False])
+def test_bucketing_shard(even):
+    dataloader = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=20)
+    num_batches = dataloader.num_batches()
+    shards = [dataloader.shard(rank, 3, even) for rank in range(3)]
+    if even:
+        assert {shard.num_batches() for shard in shards} == {num_batches // 3}
+    else:
+        assert sum(shard.num_batches() for shard in shards) == num_batches
+    items = [i for shard in shards for batch in batch_items(shard) for i in batch]
+    assert len(items) == len(set(items))
+    if not even:
+        assert sorted(items) == list(range(len(LENGTHS)))
+
+
+def test_bucketing_load_state_checks_the_seed():
+    dataloader = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, shuffle=True, seed=1)
+    restored = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, shuffle=True, seed=1)
+    assert restored.load_state(dataloader.state()) is restored
+    other = BucketingDataloader(SequenceDataset(LENGTHS), LENGTHS, max_tokens=32, shuffle=True, seed=2)
+    with pytest.raises(ValueError):
+        other.load_state(dataloader.state())
+
+
+class CountingStream(StreamingDataset):
+    """Batch k is filled with k. Every batch after the first waits for the gate, if given."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.count = 0
+
+    def get(self, size):
+        k = self.count
+        self.count += 1
+        if k > 0 and self.gate is not None:
+            self.gate.wait(10)
+        return DataCompound(torch.full((size, 1), k), torch.full((size,), k))
+
+
+@pytest.mark.parametrize("prefetch_batches", [0, 3])
+def test_streaming_keeps_the_order(prefetch_batches):
+    dataloader = StreamingDataloader(CountingStream(), batch_size=2, prefetch_batches=prefetch_batches, num_batches=6)
+    assert [batch.target.tolist() for batch in dataloader] == [[k, k] for k in range(6)]
+    iterator = iter(dataloader)
+    for _ in range(6):
+        next(iterator)
+    with pytest.raises(StopIteration):
+        next(iterator)
+
+
+def test_streaming_stops_generating_when_the_iterator_is_dropped():
+    gate = Event()
+    iterator = iter(StreamingDataloader(CountingStream(gate), batch_size=2, prefetch_batches=4))
+    next(iterator)
+    pending = list(iterator._queue)
+    del iterator
+    gc.collect()
+    gate.set()
+    # all but the one being generated are cancelled
+    assert sum(future.cancelled() for future in pending) >= len(pending) - 1
+
+
+class RandomStream(StreamingDataset):
+    def __init__(self):
+        pass
+
+    def get(self, size):
+        return DataCompound(torch.rand(size, 4), torch.zeros(size))
+
+
+def test_streaming_workers_draw_different_data():
+    with StreamingDataloader(RandomStream(), batch_size=2, num_works=2, prefetch_batches=3,
+                             num_batches=8) as dataloader:
+        data = torch.cat([batch.data for batch in dataloader])
+    assert len(torch.unique(data, dim=0)) == len(data)
+
+
+def load_all(dataloader) -> list:
+    return [(batch.data.clone(), batch.target.clone()) for batch in dataloader]
+
+
+def assert_same_batches(a, b):
+    assert len(a) == len(b)
+    for (data_a, target_a), (data_b, target_b) in zip(a, b):
+        assert torch.equal(data_a, data_b) and torch.equal(target_a, target_b)
+
+
+@pytest.mark.parametrize("num_works", [1, 2])
+def test_prefetching_matches_synchronous_loading(num_works):
+    # the last batch is short
+    dataset = TensorDataset(60)
+    expected = load_all(Dataloader(dataset, batch_size=8))
+    with Dataloader(dataset, batch_size=8, num_works=num_works, prefetch_batches=3) as dataloader:
+        assert_same_batches(load_all(dataloader), expected)
+        iterator = iter(dataloader)
+        for _ in range(len(expected)):
+            next(iterator)
+        with pytest.raises(StopIteration):
+            next(iterator)
+
+
+class TypedDataset(Dataset):
+    """Items mix integer, boolean and half-precision tensors in a dict."""
+
+    def __init__(self, n: int = 20):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def cut(self, i):
+        return DatasetView(self, range(len(self))[i])
+
+    def get(self, i):
+        return DataCompound({"ids": torch.arange(i, i + 3), "mask": torch.arange(3) < i % 4},
+                            torch.tensor([i / 2], dtype=torch.float16))
+
+
+def test_collate_keeps_dtypes_and_structure():
+    batch = next(iter(Dataloader(TypedDataset(), batch_size=4)))
+    assert batch.data["ids"].dtype == torch.int64
+    assert batch.data["mask"].dtype == torch.bool
+    assert batch.target.dtype == torch.float16
+    assert batch.data["ids"].tolist() == [[i, i + 1, i + 2] for i in range(4)]
+    assert batch.target.tolist() == [[0], [0.5], [1], [1.5]]
+    Pair = namedtuple("Pair", ("a", "b"))
+    pairs = collate([Pair(torch.zeros(2, dtype=torch.int8), 1), Pair(torch.ones(2, dtype=torch.int8), 2)])
+    assert isinstance(pairs, Pair)
+    assert pairs.a.dtype == torch.int8 and pairs.a.tolist() == [[0, 0], [1, 1]]
+    assert pairs.b.tolist() == [1, 2]
+    with pytest.raises(TypeError):
+        collate([object()])
+
+
+@pytest.mark.parametrize("prefetch_batches", [0, 2])
+def test_shared_memory_matches_synchronous_loading(prefetch_batches):
+    dataset = TypedDataset(22)
+    expected = list(Dataloader(dataset, batch_size=4))
+    with Dataloader(dataset, batch_size=4, num_works=2, prefetch_batches=prefetch_batches,
+                    shared_memory=True) as dataloader:
+        batches = list(dataloader)
+    assert len(batches) == len(expected)
+    for batch, reference in zip(batches, expected):
+        for key in ("ids", "mask"):
+            assert batch.data[key].is_shared()
+            assert batch.data[key].dtype == reference.data[key].dtype
+            assert torch.equal(batch.data[key], reference.data[key])
+        assert batch.target.is_shared()
+        assert torch.equal(batch.target, reference.target)
+
+
+def assert_same_items(a, b):
+    assert len(a) == len(b)
+    for i in range(len(a)):
+        x, y = a[i], b[i]
+        assert x.data.dtype == y.data.dtype and torch.equal(x.data, y.data)
+        assert x.target.dtype == y.target.dtype and torch.equal(x.target, y.target)
+
+
+def test_packed_dataset_round_trip(tmp_path):
+    # includes an empty item
+    source = SequenceDataset([0] + LENGTHS)
+    packed = pack_dataset(source, tmp_path / "packed")
+    assert_same_items(packed, source)
+    assert_same_items(PackedDataset(tmp_path / "packed"), source)
+    # as passed to the worker processes
+    assert_same_items(pickle.loads(pickle.dumps(packed)), source)
+
+
+def test_packed_dataset_cut(tmp_path):
+    source = SequenceDataset(LENGTHS)
+    packed = pack_dataset(source, tmp_path / "packed")
+    view = packed[10:40][::-3]
+    assert isinstance(view, PackedDataset)
+    assert [view[i].target.item() for i in range(len(view))] == list(range(60))[10:40][::-3]
+
+
+def test_packed_dataset_views_the_mapping(tmp_path):
+    packed = pack_dataset(SequenceDataset(LENGTHS), tmp_path / "packed")
+    a, b = packed[5], packed[5]
+    assert a.data.data_ptr() == b.data.data_ptr()
+    # the mapping is copy-on-write: the change shows in this process but not in the file
+    a.data[0] = -1
+    assert packed[5].data[0].item() == -1
+    assert PackedDataset(tmp_path / "packed")[5].data[0].item() == 6
+
+
+def test_pack_directory(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "3.txt").write_text("[1.0, 2.0]")
+    (src / "7.txt").write_text("[3.0, 4.0]")
+    packed = pack_directory(src, tmp_path / "packed")
+    items = sorted((packed[i].data.tolist(), packed[i].target.tolist()) for i in range(len(packed)))
+    assert items == [([3.0], [1.0, 2.0]), ([7.0], [3.0, 4.0])]
+
+
+def test_pack_dataset_rejects_mixed_dtypes(tmp_path):
+    class Mixed(SequenceDataset):
+        def get(self, i):
+            item = super(Mixed, self).get(i)
+            return DataCompound(item.data.float(), item.target) if i == 1 else item
+
+    with pytest.raises(TypeError):
+        pack_dataset(Mixed([1, 2]), tmp_path / "packed")
+
+
+class MirroringDataloader(PreprocessedDataloader):
+    """Every item becomes itself and its negation."""
+
+    def preprocess(self, original_data):
+        return [original_data, DataCompound(-original_data.data, original_data.target)]
+
+
+class BatchMirroringDataloader(MirroringDataloader):
+    def preprocess_batch(self, original_data):
+        batch = self.combine_batch(original_data)
+        mirrored = torch.stack((batch.data, -batch.data), 1).flatten(0, 1)
+        return self.split_batch(DataCompound(mirrored, batch.target.repeat_interleave(2, 0)))
+
+
+class CountingMirroringDataloader(MirroringDataloader):
+    num_calls = 0
+
+    def preprocess(self, original_data):
+        CountingMirroringDataloader.num_calls += 1
+        return super(CountingMirroringDataloader, self).preprocess(original_data)
+
+
+def test_preprocessing_expands_every_batch(dataset):
+    batches = load_all(MirroringDataloader(dataset, batch_size=8))
+    assert len(batches) == 8
+    for k, (data, target) in enumerate(batches):
+        expected = dataset.x[8 * k: 8 * k + 8]
+        assert torch.equal(data[0::2], expected) and torch.equal(data[1::2], -expected)
+        assert torch.equal(target[0::2], target[1::2])
+
+
+def test_batch_preprocessing_matches_item_preprocessing(dataset):
+    assert_same_batches(load_all(BatchMirroringDataloader(dataset, batch_size=8)),
+                        load_all(MirroringDataloader(dataset, batch_size=8)))
+
+
+def test_split_batch_views_the_batch(dataset):
+    batch = next(iter(Dataloader(dataset, batch_size=4)))
+    items = PreprocessedDataloader.split_batch(batch)
+    assert len(items) == 4
+    assert items[2].data.data_ptr() == batch.data[2].data_ptr()
+
+
+def test_proportion_mismatch_raises(dataset):
+    dataloader = MirroringDataloader(dataset, batch_size=8, proportion=3)
+    with pytest.raises(ValueError):
+        next(iter(dataloader))
+
+
+def test_materialized_workers_match_a_single_process(dataset):
+    expected = load_all(MirroringDataloader(dataset, batch_size=8))
+    with MirroringDataloader(dataset, batch_size=8, num_works=2, materialize=True) as dataloader:
+        assert_same_batches(load_all(dataloader), expected)
+        # the second epoch comes from memory
+        assert_same_batches(load_all(dataloader), expected)
+
+
+def test_materialize_preprocesses_once(dataset):
+    # one call finds out the proportion
+    dataloader = CountingMirroringDataloader(dataset, batch_size=8, materialize=True)
+    CountingMirroringDataloader.num_calls = 0
+    first = load_all(dataloader)
+    second = load_all(dataloader)
+    assert CountingMirroringDataloader.num_calls == len(dataset)
+    assert_same_batches(first, second)
+    dataloader.clear_materialized()
+    load_all(dataloader)
+    assert CountingMirroringDataloader.num_calls == 2 * len(dataset)
+
+
+def targets(dataset) -> list[int]:
+    return [dataset[i].target.item() for i in range(len(dataset))]
+
+
+SLICES = [slice(None, None, -1), slice(3, 40, 2), slice(-2, 1, -3), slice(None, None, -1), slice(1, None)]
+
+
+def test_nested_slices_compose():
+    view, expected = SequenceDataset([1] * 50), list(range(50))
+    for item in SLICES:
+        view, expected = view[item], expected[item]
+        assert isinstance(view.get_indices(), range)
+        assert targets(view) == expected
+    assert isinstance(view, DatasetView) and not isinstance(view.dataset, DatasetView)
+
+
+def test_slices_of_an_array_view_compose():
+    indices = np.random.default_rng(0).permutation(50)
+    view, expected = SequenceDataset([1] * 50).subset(indices), indices.tolist()
+    for item in SLICES:
+        view, expected = view[item], expected[item]
+        assert targets(view) == expected
+
+
+def test_array_index_over_a_range_view():
+    view = SequenceDataset([1] * 20)[2:18:2]
+    assert targets(view.subset([0, 3, -1, -8])) == [2, 8, 16, 2]
+    assert targets(view[::-1].subset(np.array([1, -2]))) == [14, 4]
+    assert len(view.subset([])) == 0
+    for indices in ([8], [-9]):
+        with pytest.raises(IndexError):
+            view.subset(indices)
+
+
+def test_concat_boundaries():
+    a, b, c = SequenceDataset([1] * 3), SequenceDataset([1] * 4)[::-1], SequenceDataset([1] * 2)
+    concat = a + b + c
+    assert isinstance(concat, ConcatDataset) and len(concat) == 9
+    assert targets(concat) == [0, 1, 2, 3, 2, 1, 0, 0, 1]
+    assert concat[-1].target.item() == 1 and concat[-9].target.item() == 0
+    for i in (9, -10):
+        with pytest.raises(IndexError):
+            concat.get(i)
+    # a cut across the boundaries
+    assert targets(concat[2:8:2]) == [2, 2, 0]
+    assert targets(ConcatDataset(a, b)[::-1]) == [0, 1, 2, 3, 2, 1, 0]
+    with pytest.raises(TypeError):
+        a + [1]
+
+
+def test_split_sizes():
+    dataset = SequenceDataset([1] * 64)
+    train, validation, test = dataset.split(0.8, 0.1, 0.1)
+    assert (len(train), len(validation), len(test)) == (51, 6, 6)
+    assert targets(validation) == list(range(51, 57))
+    first, second = dataset.split(10, 0.5)
+    assert (len(first), len(second)) == (10, 32)
+    assert targets(second)[0] == 10
+    with pytest.raises(ValueError):
+        dataset.split(40, 25)
+
+
+def test_dataset_shards():
+    dataset = SequenceDataset([1] * 10)[::-1]
+    shards = [dataset.shard(rank, 3) for rank in range(3)]
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    assert sorted(i for shard in shards for i in targets(shard)) == list(range(10))
+    assert targets(shards[1]) == [8, 5, 2]
+    with pytest.raises(ValueError):
+        dataset.shard(3, 3)
@@ -0,0 +1,24 @@
+import pytest
+import torch
+
+from papercandy import Dataloader, DataParallelTrainer, launch
+from conftest import TensorDataset, build_trainer, parameters
+
+
+def _train(rank, world_size, filename):
+    trainer = build_trainer(Dataloader(TensorDataset(), batch_size=8), DataParallelTrainer)
+    trainer.train(4)
+    torch.save((parameters(trainer), list(trainer.losses)), f"{filename}.{rank}")
+
+
+def test_data_parallel_matches_a_larger_batch(tmp_path):
+    filename = str(tmp_path / "result")
+    launch(_train, 2, filename, num_threads=1)
+    (params_0, losses_0), (params_1, _) = (torch.load(f"{filename}.{rank}") for rank in range(2))
+    single = build_trainer(Dataloader(TensorDataset(), batch_size=16))
+    single.train(4)
+    # the shards interleave the items, so the two batches of 8 make the batch of 16
+    for a, b, c in zip(params_0, params_1, parameters(single)):
+        assert torch.equal(a, b)
+        assert torch.allclose(a, c, atol=1e-6)
+    assert losses_0 == pytest.approx(list(single.losses), abs=1e-6)
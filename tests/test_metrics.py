@@ -0,0 +1,122 @@
+import pytest
+import torch
+from torch.nn import functional
+
+import papercandy as pc
+from papercandy import MeanSquaredError, MeanAbsoluteError, Accuracy, TopKAccuracy, ConfusionMatrix, Dataloader, \
+    NetworkC
+
+
+@pytest.mark.parametrize("output_shape, target_shape", [((16, 1), (16,)), ((16,), (16, 1)), ((16, 1), (16, 1))])
+def test_regression_metrics_match_shapes(output_shape, target_shape):
+    g = torch.Generator().manual_seed(0)
+    output, target = torch.randn(16, generator=g), torch.randn(16, generator=g)
+    mse = MeanSquaredError().update(output.reshape(output_shape), target.reshape(target_shape)).result()
+    mae = MeanAbsoluteError().update(output.reshape(output_shape), target.reshape(target_shape)).result()
+    assert mse == pytest.approx(functional.mse_loss(output, target).item())
+    assert mae == pytest.approx(functional.l1_loss(output, target).item())
+
+
+def test_regression_metrics_reject_mismatched_shapes():
+    with pytest.raises(ValueError):
+        MeanSquaredError().update(torch.zeros(16, 2), torch.zeros(16))
+
+
+def classification(n: int = 40, num_classes: int = 4, seed: int = 0) -> tuple[torch.Tensor, torch.Tensor]:
+    g = torch.Generator().manual_seed(seed)
+    return torch.randn(n, num_classes, generator=g), torch.randint(num_classes, (n,), generator=g)
+
+
+def shards(output, target, sizes):
+    start = 0
+    for size in sizes:
+        yield output[start: start + size], target[start: start + size]
+        start += size
+
+
+def merged(metric_class, output, target, sizes=(7, 20, 13), **kwargs):
+    metrics = [metric_class(**kwargs).update(o, t) for o, t in shards(output, target, sizes)]
+    for metric in metrics[1:]:
+        metrics[0].merge(metric)
+    return metrics[0]
+
+
+def test_accuracy():
+    output, target = classification()
+    expected = (output.argmax(1) == target).double().mean().item()
+    assert Accuracy().update(output, target).result() == pytest.approx(expected)
+    # one-hot targets
+    assert Accuracy().update(output, functional.one_hot(target, 4)).result() == pytest.approx(expected)
+    metric = merged(Accuracy, output, target)
+    assert metric.result() == pytest.approx(expected)
+    assert metric.get_count() == 40
+    assert metric.reset().result() is None
+
+
+def test_binary_accuracy_threshold():
+    output, target = torch.tensor([[-1.], [0.2], [0.7], [3.]]), torch.tensor([0, 0, 1, 1])
+    assert Accuracy().update(output, target).result() == 0.75
+    assert Accuracy(threshold=0.5).update(output, target).result() == 1
+    assert Accuracy().update(output.reshape(-1), target.reshape(-1, 1)).result() == 0.75
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 10])
+def test_top_k_accuracy(k):
+    output, target = classification()
+    top = output.argsort(1, descending=True)[:, :k]
+    expected = (top == target.unsqueeze(1)).any(1).double().mean().item()
+    assert merged(TopKAccuracy, output, target, k=k).result() == pytest.approx(expected)
+    assert TopKAccuracy(k).get_name() == f"top_{k}_accuracy"
+    if k == 1:
+        assert expected == pytest.approx(Accuracy().update(output, target).result())
+
+
+def test_confusion_matrix():
+    output, target = classification()
+    expected = torch.zeros(4, 4, dtype=torch.int64)
+    for t, p in zip(target.tolist(), output.argmax(1).tolist()):
+        expected[t, p] += 1
+    assert torch.equal(ConfusionMatrix(4).update(output, target).result(), expected)
+    metric = merged(ConfusionMatrix, output, target, num_classes=4)
+    assert torch.equal(metric.result(), expected)
+    assert int(metric.reset().result().sum()) == 0
+    with pytest.raises(TypeError):
+        ConfusionMatrix(4).merge(ConfusionMatrix(3))
+
+
+def test_merging_other_kinds_raises():
+    with pytest.raises(TypeError):
+        Accuracy().merge(MeanSquaredError())
+
+
+class Classifier(torch.nn.Module):
+    def forward(self, x):
+        return torch.cat((x, -x), 1)
+
+
+def test_tester_streams_and_evaluates(dataset):
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    tester.set_network(NetworkC(Classifier()))
+    stream = tester.stream(3)
+    assert tester.get_epoch() == 0
+    results = list(stream)
+    assert len(results) == 3 and tester.get_epoch() == 3
+    output = torch.cat([result.output for result in results])
+    target = torch.cat([result.input_data.target for result in results])
+    expected_accuracy = Accuracy().update(output, target).result()
+    expected_matrix = ConfusionMatrix(8).update(output, target).result()
+    report = tester.evaluate([Accuracy(), ConfusionMatrix(8)], 3)
+    assert report["accuracy"] == pytest.approx(expected_accuracy)
+    assert torch.equal(report["confusion_matrix"], expected_matrix)
+
+
+def test_parallel_evaluation_merges_every_metric(dataset):
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    tester.set_network(NetworkC(Classifier()))
+    metrics = [Accuracy(), TopKAccuracy(3), ConfusionMatrix(8)]
+    expected = tester.evaluate(metrics, 100)
+    report = tester.evaluate_parallel([metric.reset() for metric in metrics], 3)
+    assert report.keys() == expected.keys()
+    for name in ("accuracy", "top_3_accuracy"):
+        assert report[name] == pytest.approx(expected[name])
+    assert torch.equal(report["confusion_matrix"], expected["confusion_matrix"])
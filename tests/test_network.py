@@ -0,0 +1,39 @@
+import warnings
+
+import pytest
+import torch
+
+import papercandy as pc
+from papercandy import Dataloader, NetworkC, QuantizedNetworkC, MeanSquaredError
+from conftest import TensorDataset, LSTMNetwork
+
+
+@pytest.fixture(autouse=True)
+def ignore_deprecation():
+    # torch.ao.quantization and quantized tensors are deprecated upstream
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+def test_quantized_lstm_reload(tmp_path):
+    torch.manual_seed(0)
+    quantized = NetworkC(LSTMNetwork()).quantize()
+    filename = tmp_path / "quantized.pth"
+    quantized.save(filename)
+    reloaded = NetworkC(LSTMNetwork()).quantize().load(filename)
+    x = torch.randn(8, 4)
+    assert isinstance(reloaded, QuantizedNetworkC)
+    assert torch.equal(quantized.get()(x), reloaded.get()(x))
+
+
+def test_quantized_evaluate_parallel(dataset):
+    torch.manual_seed(0)
+    quantized = NetworkC(LSTMNetwork()).quantize()
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    tester.set_network(quantized)
+    sequential = tester.evaluate([MeanSquaredError()], 100)["mse"]
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    tester.set_network(quantized)
+    # the activations are quantized per batch, and the shards make different batches
+    assert tester.evaluate_parallel([MeanSquaredError()], 2)["mse"] == pytest.approx(sequential, rel=1e-3)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from papercandy import RandomSampler, WeightedSampler, ShardedSampler, SequentialSampler
+
+
+def test_random_sampler_is_a_permutation_per_epoch():
+    sampler = RandomSampler(100, seed=0)
+    first = list(sampler)
+    second = list(sampler.set_epoch(1))
+    assert sorted(first) == sorted(second) == list(range(100))
+    assert first != second
+    assert list(sampler.set_epoch(0)) == first
+
+
+def test_random_sampler_state():
+    sampler = RandomSampler(100)
+    restored = RandomSampler(100).load_state(sampler.state())
+    assert list(sampler.set_epoch(3)) == list(restored.set_epoch(3))
+
+
+@pytest.mark.parametrize("even", [True, False])
+def test_shards_cover_the_sampler(even):
+    sampler = RandomSampler(103, seed=0)
+    shards = [list(ShardedSampler(sampler, rank, 4, even)) for rank in range(4)]
+    taken = sorted(i for shard in shards for i in shard)
+    if even:
+        assert {len(shard) for shard in shards} == {25}
+        assert len(set(taken)) == 100
+    else:
+        assert taken == list(range(103))
+
+
+def test_weighted_sampler_skips_zero_weights():
+    samples = np.asarray(list(WeightedSampler([0, 1, 3], num_samples=4000, seed=0)))
+    assert 0 not in samples
+    assert (samples == 2).mean() == pytest.approx(0.75, abs=0.03)
+
+
+def test_slices_compose():
+    sampler = SequentialSampler(100)[10:90][::3][2:5]
+    assert list(sampler) == list(range(100)[10:90][::3][2:5])
@@ -0,0 +1,96 @@
+import warnings
+
+import pytest
+import torch
+
+import papercandy as pc
+from papercandy import Dataloader, NetworkC, MeanSquaredError
+from conftest import LSTMNetwork
+
+
+@pytest.fixture(autouse=True)
+def ignore_deprecation():
+    # torch.jit is deprecated upstream
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+def test_tester_reads_the_current_config(config, dataset):
+    class RecordingNetworkC(NetworkC):
+        moved = False
+
+        def gpu(self):
+            self.moved = True
+            return self
+
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    config.set("gpu_acceleration", "True")
+    nc = RecordingNetworkC(torch.nn.Linear(4, 1))
+    tester.set_network(nc)
+    assert nc.moved
+
+
+@pytest.mark.parametrize("jit", ["trace", "script"])
+def test_compiled_inference_tester_evaluates_in_parallel(dataset, jit):
+    torch.manual_seed(0)
+    tester = pc.InferenceTester(Dataloader(dataset, batch_size=8), jit=jit)
+    tester.set_network(NetworkC(torch.nn.Sequential(torch.nn.Linear(4, 8), torch.nn.ReLU(), torch.nn.Linear(8, 1))))
+    sequential = tester.evaluate([MeanSquaredError()], 100)["mse"]
+    assert tester.evaluate_parallel([MeanSquaredError()], 2)["mse"] == pytest.approx(sequential)
+
+
+def test_evaluate_parallel_with_worker_processes(dataset):
+    torch.manual_seed(0)
+    network = NetworkC(torch.nn.Linear(4, 1))
+    sequential = pc.Tester(Dataloader(dataset, batch_size=8))
+    sequential.set_network(network)
+    expected = sequential.evaluate([MeanSquaredError(), pc.Accuracy()], 100)
+    # the dataloader's own pool is rebuilt in every process
+    with Dataloader(dataset, batch_size=8, num_works=2) as dataloader:
+        tester = pc.Tester(dataloader)
+        tester.set_network(network)
+        result = tester.evaluate_parallel([MeanSquaredError(), pc.Accuracy()], 2)
+    assert result["mse"] == pytest.approx(expected["mse"])
+    assert result["accuracy"] == expected["accuracy"]
+    assert tester.get_epoch() == 8
+
+
+def small_network() -> torch.nn.Module:
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Linear(4, 8), torch.nn.ReLU(), torch.nn.Linear(8, 1))
+
+
+@pytest.mark.parametrize("jit", [None, "trace", "script"])
+def test_compare_with_eager(dataset, jit):
+    tester = pc.InferenceTester(Dataloader(dataset, batch_size=8), jit=jit)
+    network = small_network()
+    tester.set_network(NetworkC(network))
+    report = tester.compare_with_eager(num_batches=4, repeat=2)
+    assert report.keys() == {"eager", "optimized", "speedup", "max_abs_diff"}
+    assert report["eager"] > 0 and report["optimized"] > 0
+    assert report["speedup"] == pytest.approx(report["eager"] / report["optimized"])
+    # the graph is frozen and optimized, which may reorder floating-point operations
+    assert report["max_abs_diff"] < 1e-5
+    # the mode of the network is restored
+    assert network.training
+    with pytest.raises(ValueError):
+        tester.compare_with_eager(repeat=0)
+
+
+def test_compare_quantized(dataset):
+    torch.manual_seed(0)
+    nc = NetworkC(LSTMNetwork())
+    quantized = nc.quantize()
+    metric = MeanSquaredError()
+    report = pc.compare_quantized(nc, quantized, Dataloader(dataset, batch_size=8), [metric], num_batches=4, repeat=2)
+    assert report.keys() == {"float", "quantized", "speedup", "max_abs_diff", "delta"}
+    for name in ("float", "quantized"):
+        assert report[name].keys() == {"latency", "mse"}
+        assert report[name]["latency"] > 0
+    assert report["delta"]["mse"] == pytest.approx(report["quantized"]["mse"] - report["float"]["mse"])
+    # int8 weights stay close to the float network
+    assert 0 < report["max_abs_diff"] < 0.05
+    assert abs(report["delta"]["mse"]) < 0.05
+    # the metrics passed in are left unchanged
+    assert metric.get_count() == 0
@@ -0,0 +1,99 @@
+import pytest
+import torch
+
+import papercandy as pc
+from papercandy import Dataloader, NetworkC, TrainingMonitor
+from papercandy.core import timing
+from papercandy.core.timing import PhaseTimer
+from conftest import build_trainer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(timing, "_perf_counter", clock)
+    return clock
+
+
+def test_phase_totals_and_counts_add_up(clock):
+    timer = PhaseTimer(window=2)
+    durations = [(0.001, 0.002), (0.003, 0.004), (0.005, 0.006)]
+    for data, forward in durations:
+        clock.advance(data)
+        timer.lap("data")
+        clock.advance(forward)
+        timer.lap("forward")
+        clock.advance(0.0005)
+        # laps of the same phase add up within a batch
+        timer.lap("data")
+        assert timer.commit() == pytest.approx({"data": data + 0.0005, "forward": forward})
+    summary = timer.summary()
+    assert timer.phases() == ["data", "forward"]
+    assert summary["forward"]["count"] == 3
+    assert summary["forward"]["total"] == pytest.approx(0.012)
+    assert summary["forward"]["mean"] == pytest.approx(0.004)
+    assert summary["forward"]["last"] == pytest.approx(0.006)
+    # the percentiles only cover the window of the latest batches
+    assert summary["forward"]["p50"] == pytest.approx(0.005)
+    assert summary["forward"]["max"] == pytest.approx(0.006)
+    assert summary["data"]["total"] == pytest.approx(0.0105)
+    assert sum(count for _, count in timer.histogram("forward")) == 3
+    assert timer.histogram("backward") == []
+
+
+def test_restart_and_disabling_discard_the_time(clock):
+    timer = PhaseTimer()
+    clock.advance(1)
+    timer.restart()
+    clock.advance(0.25)
+    timer.lap("data")
+    assert timer.commit() == {"data": 0.25}
+    timer.set_enabled(False)
+    clock.advance(1)
+    timer.lap("data")
+    assert timer.commit() == {}
+    assert timer.summary()["data"]["count"] == 1
+    timer.clear()
+    assert timer.summary() == {}
+
+
+class TimingMonitor(TrainingMonitor):
+    def __init__(self):
+        self.timings = []
+
+    def on_timing(self, trainer, epoch, timings):
+        self.timings.append((epoch, timings))
+
+
+def test_trainer_reports_the_timing_of_every_batch(dataset):
+    trainer = build_trainer(Dataloader(dataset, batch_size=8))
+    monitor = TimingMonitor()
+    trainer.train(5, monitor)
+    assert [epoch for epoch, _ in monitor.timings] == list(range(5))
+    for _, timings in monitor.timings:
+        assert {"data", "forward", "loss", "backward", "optimizer", "sync", "monitor"} <= timings.keys()
+        assert all(seconds >= 0 for seconds in timings.values())
+    summary = trainer.timing_summary()
+    for phase in ("data", "forward", "loss", "backward", "optimizer", "sync"):
+        assert summary[phase]["count"] == 5
+        assert summary[phase]["total"] == pytest.approx(sum(timings[phase] for _, timings in monitor.timings))
+
+
+def test_tester_times_every_batch(dataset):
+    tester = pc.Tester(Dataloader(dataset, batch_size=8))
+    tester.set_network(NetworkC(torch.nn.Linear(4, 1)))
+    tester.test(3)
+    summary = tester.timing_summary()
+    assert summary.keys() == {"data", "forward"}
+    assert all(stats["count"] == 3 for stats in summary.values())
@@ -0,0 +1,143 @@
+from threading import Event
+
+import pytest
+import torch
+from torch import nn
+
+from papercandy import Dataloader, TrainingMonitor, AsyncMonitor, Trainer, NetworkC, LossFunctionC, RandomSampler
+from conftest import TensorDataset, build_trainer, parameters
+
+
+class GatedMonitor(TrainingMonitor):
+    """Holds up every event until the gate opens, or until the wait times out."""
+
+    def __init__(self, gate: Event):
+        self.gate = gate
+        self.timed_out = False
+        self.losses = []
+
+    def _wait(self):
+        if not self.timed_out:
+            self.timed_out = not self.gate.wait(30)
+
+    def on_updated(self, trainer, epoch, loss, result):
+        self._wait()
+
+    def on_losses_synchronized(self, trainer, epoch, losses):
+        self._wait()
+        self.losses += losses
+
+    def on_batch_finished(self, trainer, epoch):
+        self._wait()
+
+
+class GateTrainer(Trainer):
+    """Opens the gate when it starts the last batch, which it only reaches if the monitor never held it up."""
+
+    def __init__(self, dataloader, gate: Event, num_batches: int, **kwargs):
+        super(GateTrainer, self).__init__(dataloader, **kwargs)
+        self.gate = gate
+        self.num_batches = num_batches
+
+    def _train_one_batch(self, epoch, network, loss_function, optimizer, data):
+        if epoch == self.num_batches - 1:
+            self.gate.set()
+        return super(GateTrainer, self)._train_one_batch(epoch, network, loss_function, optimizer, data)
+
+
+@pytest.mark.parametrize("policy", ["drop", "coalesce"])
+def test_async_monitor_does_not_hold_up_training(policy):
+    gate = Event()
+    trainer = build_trainer(Dataloader(TensorDataset(256), batch_size=8), GateTrainer, gate=gate, num_batches=32,
+                            loss_sync_interval=1)
+    monitor = GatedMonitor(gate)
+    async_monitor = AsyncMonitor(monitor, max_size=2, policy=policy)
+    trainer.train(32, async_monitor)
+    assert not monitor.timed_out
+    assert async_monitor.get_num_dropped() > 0
+    assert monitor.losses == list(trainer.losses)
+
+
+class RecordingNetworkC(NetworkC):
+    moved = False
+
+    def gpu(self):
+        self.moved = True
+        return self
+
+
+class RecordingLossFunctionC(LossFunctionC):
+    moved = False
+
+    def gpu(self):
+        self.moved = True
+        return self
+
+
+def test_setters_read_the_current_config(config, dataset):
+    trainer = Trainer(Dataloader(dataset, batch_size=8))
+    config.set("gpu_acceleration", "True")
+    nc, lfc = RecordingNetworkC(nn.Linear(4, 1)), RecordingLossFunctionC(nn.MSELoss())
+    trainer.set_network(nc)
+    trainer.set_loss_function(lfc)
+    assert nc.moved and lfc.moved
+
+
+class OrderMonitor(TrainingMonitor):
+    def __init__(self):
+        self.batches = []
+
+    def on_updated(self, trainer, epoch, loss, result):
+        self.batches.append(result.input_data.data)
+
+
+def test_random_order_changes_every_pass(dataset):
+    trainer = build_trainer(Dataloader(dataset, batch_size=8, sampler=RandomSampler(len(dataset), seed=0)))
+    first, second = OrderMonitor(), OrderMonitor()
+    trainer.train(8, first)
+    trainer.train(8, second)
+    assert trainer.get_num_passes() == 2
+    assert not all(torch.equal(a, b) for a, b in zip(first.batches, second.batches))
+
+
+def test_accumulation_matches_a_larger_batch(dataset):
+    accumulated = build_trainer(Dataloader(dataset, batch_size=8))
+    accumulated.train(8, accumulation_steps=2)
+    large = build_trainer(Dataloader(dataset, batch_size=16))
+    large.train(4)
+    assert accumulated.get_step() == large.get_step() == 4
+    for a, b in zip(parameters(accumulated), parameters(large)):
+        assert torch.allclose(a, b, atol=1e-6)
+
+
+def test_accumulation_steps_the_rest(dataset):
+    trainer = build_trainer(Dataloader(dataset, batch_size=8))
+    trainer.train(5, accumulation_steps=2)
+    assert trainer.get_step() == 3
+
+
+class SyncMonitor(TrainingMonitor):
+    def __init__(self):
+        self.synchronized = []
+
+    def on_losses_synchronized(self, trainer, epoch, losses):
+        self.synchronized.append((epoch, len(losses)))
+
+
+def test_deferred_loss_sync(dataset):
+    every_batch = build_trainer(Dataloader(dataset, batch_size=8))
+    every_batch.train(8)
+    deferred = build_trainer(Dataloader(dataset, batch_size=8), loss_sync_interval=3)
+    monitor = SyncMonitor()
+    deferred.train(8, monitor)
+    assert list(deferred.losses) == list(every_batch.losses)
+    assert monitor.synchronized == [(2, 3), (5, 3), (7, 2)]
+
+
+def test_bounded_loss_history(dataset):
+    trainer = build_trainer(Dataloader(dataset, batch_size=8), max_losses=3)
+    trainer.train(8)
+    full = build_trainer(Dataloader(dataset, batch_size=8))
+    full.train(8)
+    assert list(trainer.losses) == list(full.losses)[-3:]
+    assert trainer.losses.get_num_seen() == 8